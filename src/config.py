@@ -7,46 +7,106 @@ ETF監視Bot設定ファイル（最終版）
 - 前年の利回り = その年の分配金総額 ÷ 年末の株価
 - 欠落期間がある場合は自動補完（初回起動時も対応）
 - 週次リマインダーは毎週土曜日に送信
+- 監視対象ETFは UNIVERSE_FILE（data/universe.toml）で管理
 """
 
-# 監視対象ETF
-ETFS = {
-    "VYM": {
-        "name": "Vanguard High Dividend Yield ETF",
-        "inception_date": "2006-11-10",
-        "baseline_years": 18,         # 2007-2024年
-        "baseline_yield": 3.03,       # 2007-2024年の平均利回り（%）
-        "baseline_year_end": 2024,    # baselineの最終年
-        "threshold_offset": 0.0,      # baseline + 0.0%で通知
-    },
-    "HDV": {
-        "name": "iShares Core High Dividend ETF",
-        "inception_date": "2011-03-29",
-        "baseline_years": 14,         # 2011-2024年
-        "baseline_yield": 3.55,
-        "baseline_year_end": 2024,
-        "threshold_offset": 0.0,
-    },
-    "SPYD": {
-        "name": "SPDR Portfolio S&P 500 High Dividend ETF",
-        "inception_date": "2015-10-21",
-        "baseline_years": 9,          # 2016-2024年
-        "baseline_yield": 4.58,
-        "baseline_year_end": 2024,
-        "threshold_offset": 0.0,
-    },
-    "SCHD": {
-        "name": "Schwab U.S. Dividend Equity ETF",
-        "inception_date": "2011-10-20",
-        "baseline_years": 14,         # 2011-2024年
-        "baseline_yield": 3.50,
-        "baseline_year_end": 2024,
-        "threshold_offset": 0.0,
-    },
+# 監視対象ETF（ユニバース）ファイル: .toml / .yaml / .csv
+UNIVERSE_FILE = "data/universe.toml"
+
+# ユニバースファイルで省略されたキーのデフォルト値
+UNIVERSE_DEFAULTS = {
+    "threshold_offset": 0.0,
+    "percentile_alert": 0.0,   # 利回りパーセンタイルがこの値以上で通知（0で無効）
+    "zscore_alert": 0.0,       # 利回りZスコアがこの値以上で通知（0で無効）
 }
 
+# デーモンモード（python etf_monitor.py --daemon）の実行間隔
+DAEMON_INTERVAL_SECONDS = 3600
+
 # データファイルパス
 STATE_FILE = "data/state.json"
 
 # Discord Webhook URL（環境変数から取得）
-# GitHub Actionsで DISCORD_WEBHOOK_URL をSecretに設定すること
\ No newline at end of file
+# GitHub Actionsで DISCORD_WEBHOOK_URL をSecretに設定すること
+
+# 利回り履歴キャッシュ（スイープ・バックテスト用）
+CACHE_DIR = "data/cache"
+CACHE_MAX_AGE_HOURS = 20      # これより古いキャッシュは再取得
+
+# 分配金スケジュール（過去のex-dateから次回の時期を推定し、その前後だけ全期間の履歴を再取得）
+# それ以外の実行は直近の株価だけを取得し、キャッシュの分配金でTTMを計算する
+DIVIDEND_SCHEDULE_MIN_PAYOUTS = 4   # 分配金履歴がこれより少ない銘柄は毎回再取得
+DIVIDEND_SCHEDULE_LOOKBACK = 8      # 支払い間隔の推定に使う直近の回数
+DIVIDEND_WINDOW_BEFORE_DAYS = 5     # 想定ex-dateの何日前から再取得するか
+DIVIDEND_WINDOW_AFTER_DAYS = 7      # 想定ex-dateの何日後まで再取得するか（過ぎても分配金がなければ遅延）
+DIVIDEND_REFRESH_MAX_DAYS = 14      # 想定時期以外でも、前回の全期間取得からこの日数が経ったら再取得
+
+# threshold_offset スイープのデフォルト設定
+SWEEP_OFFSETS = (-0.5, 1.5, 0.1)          # (開始, 終了, 刻み) ※終了を含む
+SWEEP_BASELINE_METHODS = ("monitor", "expanding", "rolling5")
+SWEEP_FORWARD_DAYS = 60                   # 上抜け後のフォワードリターン計測期間（営業日）
+SWEEP_MIN_ALERTS = 3                      # 採用に必要な最低上抜け回数
+
+# 状態ファイルの保存形式: "json"（indent=2）/ "compact_json" / "msgpack"
+# 形式を変えたら `python state_store.py migrate --to <形式>` で変換する
+STATE_FORMAT = "json"
+STATE_VIEW_FILE = "data/state.view.json"   # `python state_store.py view` の出力先（git管理外）
+
+# 通知モード
+# - "per_event": 通知ごとに1回送信（従来どおり）
+# - "digest":    1回の実行分をまとめ、閾値からの乖離順に並べてページ分割して送信
+NOTIFY_MODE = "per_event"
+
+# 通知先（URL・SMTP設定などの秘密情報は *_env で指定した環境変数から取得）
+# 未設定の通知先は警告を出してスキップされる
+NOTIFIERS = [
+    {"type": "discord", "url_env": "DISCORD_WEBHOOK_URL"},
+    # {"type": "slack", "url_env": "SLACK_WEBHOOK_URL", "currency": "EUR"},
+    # {"type": "webhook", "url_env": "GENERIC_WEBHOOK_URL", "headers": {"X-Source": "etf-monitor"}},
+    # {"type": "email", "host_env": "SMTP_HOST", "port_env": "SMTP_PORT", "user_env": "SMTP_USER",
+    #  "password_env": "SMTP_PASSWORD", "from_env": "ALERT_EMAIL_FROM", "to_env": "ALERT_EMAIL_TO"},
+]
+
+# 通知先ごとの送信設定のデフォルト（各エントリで上書き可能）
+NOTIFIER_DEFAULTS = {
+    "timeout": 10,        # 1回の送信のタイムアウト（秒）
+    "retries": 3,         # 失敗時のリトライ回数（429・5xx・通信エラー）
+    "backoff": 2.0,       # リトライ間隔の基準（秒、指数的に増加）
+    "concurrency": 1,     # 同時送信数（1なら送信順を保持）
+    "currency": "JPY",    # 表示通貨（"JPY" / "EUR" / "GBP" / "USD"）。通知先ごとに "currency" で上書き可能
+}
+
+# 為替レート（表示通貨のUSDレートを1回のリクエストでまとめて取得し CACHE_DIR にキャッシュ）
+FX_CACHE_MAX_AGE_MINUTES = 60
+FX_FALLBACK_RATES = {"JPY": 150.0, "EUR": 0.92, "GBP": 0.79}   # 取得失敗時の固定レート（1 USDあたり）
+
+# データソース（yfinance）のサーキットブレーカー
+# この銘柄数連続でデータ取得に失敗したら（各銘柄はリトライを使い切って1回と数える）、
+# その実行中は残りの銘柄の取得を止めて前回データで判定する
+DATA_SOURCE_BREAKER_THRESHOLD = 3
+
+# NYSE取引カレンダー（`python market_calendar.py build` で生成）
+MARKET_CALENDAR_FILE = "data/nyse_calendar.json"
+MARKET_DATA_DELAY_MINUTES = 30   # 引け（16:00 ET）から日足データが出揃うまでの猶予
+
+# 銘柄間の利回りスプレッドアラート（利回り[long] − 利回り[short] が条件を満たした時に通知）
+# "*" は全銘柄（例: {"long": "*", "short": "*", "above": 2.5} で2.5%以上開いた全ペア）
+SPREAD_ALERTS = [
+    # {"long": "SPYD", "short": "VYM", "above": 1.5},
+    # {"long": "SPYD", "short": "VYM", "below": 0.5},
+]
+
+# 実行ごとのヘルス記録（`python health.py summary` で集計）
+HEALTH_LOG_FILE = "data/health.jsonl"
+HEALTH_LOG_MAX_RECORDS = 1000   # これより古い記録は削除
+
+# シャード実行（`python etf_monitor.py --shard I/N` の結果の置き場所。`--merge-shards` で状態ファイルへ反映）
+SHARD_DIR = "data/shards"
+
+# 記録・再生モード（`python etf_monitor.py --record DIR` / `--replay DIR`）
+FIXTURE_LATENCY_MS = 0   # 再生時に各呼び出しへ加える待ち時間（ミリ秒）。"recorded" なら記録時の所要時間
+
+# 利回りの統計シグナル（パーセンタイル＝全履歴、Zスコア＝直近 INDICATOR_ZSCORE_WINDOW 営業日）
+INDICATOR_ZSCORE_WINDOW = 1260     # 約5年
+INDICATOR_BUCKET_WIDTH = 0.01      # パーセンタイル計算の利回りの刻み（%）
+INDICATOR_MAX_YIELD = 25.0         # これ以上の利回りは最上位の刻みに含める（%）
@@ -0,0 +1,118 @@
+"""
+日次ダイジェスト（NOTIFY_MODE = "digest"）
+
+1回の実行で発生した通知（初回・上抜け/下抜け・リマインダー・Baseline更新・エラー）を
+銘柄ごとに送らずに集め、実行の最後にまとめて送信する。
+
+- 閾値からの乖離（利回り - 閾値）の大きい順に並べる（エラー等の乖離なしは末尾）
+- 1イベント = 1フィールドとして、Discordの上限に収まるようにページ（Embed）分割
+- 1ページ = 1回のWebhook送信
+- 表示通貨ごとに要約を作り、通知先の表示通貨のページを送る
+"""
+
+from embeds import DIGEST_FIELD_NAMES, DETAIL_FIELD_NAME, FOOTER, localize
+
+# Discord Embed の上限
+MAX_FIELDS_PER_EMBED = 25
+MAX_EMBED_CHARS = 6000
+MAX_FIELD_NAME_CHARS = 256
+MAX_FIELD_VALUE_CHARS = 1024
+
+DIGEST_COLOR = 0x0099FF
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _summarize(embed):
+    """個別通知のEmbedから、ダイジェスト用の1フィールドを作る"""
+    fields = embed.get("fields", [])
+    parts = [f"{f['name']} {f['value']}" for f in fields if f["name"] in DIGEST_FIELD_NAMES]
+    details = [f["value"] for f in fields if f["name"] == DETAIL_FIELD_NAME]
+    lines = [" · ".join(parts)] if parts else []
+    lines.extend(details or [embed.get("description", "")])
+    return {
+        "name": _truncate(embed["title"], MAX_FIELD_NAME_CHARS),
+        "value": _truncate("\n".join(lines) or "-", MAX_FIELD_VALUE_CHARS),
+        "inline": False,
+    }
+
+
+class Digest:
+    """
+    1回の実行中に発生した通知の収集
+
+    Args:
+        currencies: 通知先の表示通貨
+    """
+
+    def __init__(self, currencies=("JPY",)):
+        self.currencies = tuple(currencies)
+        self._events = []
+
+    def __len__(self):
+        return len(self._events)
+
+    def events(self):
+        """溜めた通知（シャード実行の結果としてそのまま保存できる形式）"""
+        return [[margin, fields] for margin, fields in self._events]
+
+    def extend(self, events):
+        """events() の内容を追加（シャードの結果をマージする際に使用）"""
+        self._events.extend((margin, fields) for margin, fields in events)
+
+    def add(self, embed, margin=None):
+        """
+        通知を追加
+
+        Args:
+            embed: 個別通知として送るはずだったEmbed（または CurrencyEmbeds）
+            margin: 利回り - 閾値（並び順に使用。エラー等は None）
+        """
+        self._events.append((margin, {c: _summarize(localize(embed, c)) for c in self.currencies}))
+
+    def pages(self, title, timestamp, currency=None):
+        """
+        Discordの上限内に収まるEmbedのリストを作成（1要素 = 1ページ = 1回の送信）
+
+        Args:
+            currency: 表示通貨（省略時は先頭の通貨）
+        """
+        currency = currency or self.currencies[0]
+        # 乖離の大きい順（None は末尾、同順位は発生順）
+        events = sorted(
+            self._events,
+            key=lambda e: (e[0] is None, -(e[0] or 0.0)),
+        )
+
+        footer_chars = len(FOOTER["text"])
+        description = f"{len(events)}件の通知（閾値からの乖離が大きい順）"
+        # ページ番号（「 (10/10)」程度）の分を見込んでおく
+        base_chars = len(title) + 10 + len(description) + footer_chars
+
+        pages = []
+        fields, chars = [], base_chars
+        for _, fields_by_currency in events:
+            field = fields_by_currency[currency]
+            field_chars = len(field["name"]) + len(field["value"])
+            if fields and (len(fields) >= MAX_FIELDS_PER_EMBED or chars + field_chars > MAX_EMBED_CHARS):
+                pages.append(fields)
+                fields, chars = [], base_chars
+            fields.append(field)
+            chars += field_chars
+        if fields:
+            pages.append(fields)
+
+        total = len(pages)
+        return [
+            {
+                "title": f"{title} ({i}/{total})" if total > 1 else title,
+                "description": description,
+                "color": DIGEST_COLOR,
+                "fields": page_fields,
+                "timestamp": timestamp,
+                "footer": FOOTER,
+            }
+            for i, page_fields in enumerate(pages, start=1)
+        ]
@@ -0,0 +1,302 @@
+"""
+Discord Embed テンプレート
+
+- タイトル・色・フィールド名などの静的部分はモジュール読み込み時に1回だけ構築
+- 銘柄ごとのタイトル・説明文は EmbedRenderer 内でキャッシュ（1回の実行中は使い回す）
+- timestamp・次回リマインダー日は実行開始時に1回だけ計算
+- render_* では利回り・価格・通貨換算などの変化する値だけを埋め込む
+- 価格を含む通知は表示通貨ごとに1つずつ作成（CurrencyEmbeds）し、通知先の通貨で選ぶ
+"""
+
+import numpy as np
+
+# 通知種別 → (タイトル, 色)
+NORMAL_STYLES = {
+    "crossed_above": ("🚀 利回り閾値上抜け！", 0x00FF00),
+    "crossed_below": ("📉 利回り閾値下抜け", 0xFF0000),
+    "reminder":      ("📌 週次リマインダー", 0xFFFF00),
+    "initial":       ("✅ 監視開始", 0x0099FF),
+    "initial_above": ("⚠️ 監視開始（閾値超過中）", 0xFF6600),
+    "signal":        ("📐 利回り統計シグナル", 0x00CCCC),
+}
+ERROR_STYLES = {
+    "error_etf_data": ("❌ データ取得失敗", 0xFF0000),
+    "error_baseline": ("❌ Baseline更新失敗", 0xFF9900),
+}
+BASELINE_UPDATED_STYLE = ("📊 Baseline自動更新", 0x9966FF)
+OUTAGE_STYLE = ("❌ データソース障害", 0xFF0000)
+LAGGING_STYLE = ("⚠️ 株価データ遅延", 0xFF9900)
+SPREAD_STYLE = ("📏 利回りスプレッド", 0x3366FF)
+PAYOUT_OVERDUE_STYLE = ("⏰ 分配金の遅延", 0xFF9900)
+
+FOOTER = {"text": "ETF利回り監視Bot"}
+ERROR_FOOTER = {"text": "ETF利回り監視Bot (エラー)"}
+
+DETAIL_FIELD_NAME = "📝 詳細"
+MAX_FIELD_LINES = 20   # 1フィールドに並べる行数の上限（Discordの1024文字制限対策）
+
+# 表示通貨 → (記号, 絵文字, 小数桁数)
+CURRENCY_FORMATS = {
+    "JPY": ("¥", "💴", 0),
+    "EUR": ("€", "💶", 2),
+    "GBP": ("£", "💷", 2),
+    "USD": ("$", "💵", 2),
+}
+
+# ダイジェスト（digest.py）で1行要約に残すフィールド
+DIGEST_FIELD_NAMES = frozenset({
+    "📊 配当利回り (TTM)",
+    "🎯 閾値",
+    "ℹ️ 現在のBaseline",
+    "📈 更新前",
+    "📈 更新後",
+    "🎯 新しい閾値",
+    "📐 パーセンタイル",
+    "📐 Zスコア",
+    *(f"{emoji} 現在価格（{currency}）" for currency, (_, emoji, _) in CURRENCY_FORMATS.items()
+      if currency != "USD"),
+})
+
+
+class CurrencyEmbeds(dict):
+    """表示通貨 → Embed（価格を含む通知。通知先の表示通貨のものを送る）"""
+
+
+def localize(embed, currency):
+    """通知先の表示通貨に合わせたEmbed（通貨によらない通知はそのまま）"""
+    if isinstance(embed, CurrencyEmbeds):
+        return embed[currency]
+    return embed
+
+
+def _field(name, value, inline):
+    return {"name": name, "value": value, "inline": inline}
+
+
+def _money(currency, amount):
+    symbol, _, digits = CURRENCY_FORMATS[currency]
+    return f"{symbol}{amount:,.{digits}f}"
+
+
+class EmbedRenderer:
+    """
+    1回の実行中に使い回すEmbedテンプレート
+
+    Args:
+        etfs: ユニバース（ticker → 設定）
+        timestamp: Embedに載せる時刻（ISO形式、実行開始時に1回だけ計算）
+        next_reminder: 初回above時に表示する次回リマインダー日（ISO形式）
+        currencies: 価格を表示する通貨（通知先の表示通貨）
+    """
+
+    def __init__(self, etfs, timestamp, next_reminder, currencies=("JPY",)):
+        self.etfs = etfs
+        self.timestamp = timestamp
+        self.currencies = tuple(currencies)
+        self._next_reminder_field = _field("📅 次回リマインダー", f"{next_reminder} (土曜日)", False)
+        self._headers = {}
+
+    def _header(self, ticker, title, color):
+        """銘柄・通知種別ごとのタイトル/説明文/色（キャッシュ）"""
+        key = (ticker, title)
+        header = self._headers.get(key)
+        if header is None:
+            header = (f"{title} - {ticker}", f"**{self.etfs[ticker]['name']}**", color)
+            self._headers[key] = header
+        return header
+
+    def _embed(self, ticker, style, fields, footer):
+        title, description, color = self._header(ticker, *style)
+        return {
+            "title": title,
+            "description": description,
+            "color": color,
+            "fields": fields,
+            "timestamp": self.timestamp,
+            "footer": footer,
+        }
+
+    def render_error(self, notification_type, ticker, reason, baseline_data=None):
+        """エラー通知用のEmbed"""
+        fields = [_field(DETAIL_FIELD_NAME, reason, False)]
+
+        # Baseline更新失敗時は追加情報
+        if notification_type == "error_baseline" and baseline_data:
+            fields.insert(0, _field(
+                "ℹ️ 現在のBaseline", f"{baseline_data['yield']}% ({baseline_data['years']}年)", False
+            ))
+        return self._embed(ticker, ERROR_STYLES[notification_type], fields, ERROR_FOOTER)
+
+    def render_baseline_updated(self, ticker, threshold, reason, baseline_data, old_baseline):
+        """Baseline更新通知用のEmbed"""
+        fields = [
+            _field("📈 更新前", f"{old_baseline['yield']}% ({old_baseline['years']}年)", True),
+            _field("📈 更新後", f"**{baseline_data['yield']}%** ({baseline_data['years']}年)", True),
+            _field("🎯 新しい閾値", f"{threshold}%", True),
+            _field(DETAIL_FIELD_NAME, reason, False),
+        ]
+        return self._embed(ticker, BASELINE_UPDATED_STYLE, fields, FOOTER)
+
+    def render_normal(self, notification_type, ticker, etf_data, fx, threshold, reason,
+                      baseline_data=None, comparison_data=None, prices=None):
+        """
+        通常通知用のEmbed（上抜け・下抜け・リマインダー・初回・統計シグナル）
+
+        価格・分配金は全表示通貨へ換算し、通貨ごとのEmbedを返す。
+        リマインダーの比較価格は円で保存しているため、他の通貨へは現在のレートで換算する。
+
+        Args:
+            prices: [価格, 分配金] × 表示通貨 の換算済み配列（run_once で全銘柄分を1回で換算した行）。
+                    省略時はこの銘柄分だけ換算する
+
+        Returns:
+            CurrencyEmbeds: 表示通貨 → Embed
+        """
+        current_yield = etf_data["yield"]
+        currencies = self.currencies
+
+        if prices is None:
+            prices = fx.convert([etf_data["price_usd"], etf_data["dividend_usd"]], currencies)
+        converted = np.round(prices, 2)
+
+        head = [
+            _field("📊 配当利回り (TTM)", f"**{current_yield}%**", True),
+            _field("🎯 閾値", f"{threshold}%", True),
+        ]
+
+        # 初回起動時はBaseline情報を追加
+        if notification_type in ("initial", "initial_above") and baseline_data:
+            head.append(_field("ℹ️ Baseline", f"{baseline_data['yield']}% ({baseline_data['years']}年)", True))
+
+            # initial_aboveの場合は次回リマインダー日を追加
+            if notification_type == "initial_above":
+                head.append(self._next_reminder_field)
+
+        # 初回起動・統計シグナルは利回りの統計指標を追加
+        if notification_type in ("initial", "initial_above", "signal"):
+            if etf_data.get("percentile") is not None:
+                head.append(_field("📐 パーセンタイル", f"{etf_data['percentile']}%", True))
+            if etf_data.get("zscore") is not None:
+                head.append(_field("📐 Zスコア", f"{etf_data['zscore']:+.2f}", True))
+
+        c_yield = c_price = r_yield = r_price = None
+        if notification_type == "reminder" and comparison_data:
+            c_yield = comparison_data.get("crossed_above_yield")
+            r_yield = comparison_data.get("last_reminded_yield")
+            # 比較価格（円）→ 各表示通貨
+            saved = [comparison_data.get("crossed_above_price_jpy"), comparison_data.get("last_reminded_price_jpy")]
+            saved_converted = fx.convert([np.nan if p is None else p for p in saved], currencies, from_currency="JPY")
+            c_price, r_price = [None if p is None else row for p, row in zip(saved, saved_converted)]
+
+        embeds = CurrencyEmbeds()
+        for i, currency in enumerate(currencies):
+            price, dividend = float(converted[0, i]), float(converted[1, i])
+            fields = [dict(f) for f in head]
+
+            # リマインダーの場合は比較データを追加
+            if c_yield is not None:
+                fields.append(_field(
+                    "📊 上抜け時比（利回り）",
+                    f"{c_yield}% → {current_yield}%（{current_yield - c_yield:+.2f}%）", True
+                ))
+            if c_price is not None:
+                fields.append(self._price_change_field("📊 上抜け時比（価格）", currency, float(c_price[i]), price))
+            if r_yield is not None:
+                fields.append(_field(
+                    "📅 前週比（利回り）",
+                    f"{r_yield}% → {current_yield}%（{current_yield - r_yield:+.2f}%）", True
+                ))
+            if r_price is not None:
+                fields.append(self._price_change_field("📅 前週比（価格）", currency, float(r_price[i]), price))
+
+            # 価格情報（USD表示の通知先には換算欄を付けない）
+            fields.append(_field("💵 現在価格（USD）", f"${etf_data['price_usd']}", True))
+            if currency != "USD":
+                fields.append(_field(f"{CURRENCY_FORMATS[currency][1]} 現在価格（{currency}）", _money(currency, price), True))
+            fields.append(_field("💰 年間配当（USD）", f"${etf_data['dividend_usd']}", True))
+            if currency != "USD":
+                fields.append(_field(f"💰 年間配当（{currency}）", _money(currency, dividend), True))
+                fields.append(_field(
+                    "🌐 為替レート", f"1 USD = {CURRENCY_FORMATS[currency][0]}{fx.rate(currency)}", False
+                ))
+            fields.append(_field(DETAIL_FIELD_NAME, reason, False))
+
+            embeds[currency] = self._embed(ticker, NORMAL_STYLES[notification_type], fields, FOOTER)
+        return embeds
+
+    @staticmethod
+    def _price_change_field(name, currency, before, after):
+        digits = CURRENCY_FORMATS[currency][2]
+        return _field(name, f"{_money(currency, before)} → {_money(currency, after)}（{after - before:+,.{digits}f}）", True)
+
+    def render_outage(self, failed_tickers, stale_tickers, reason):
+        """データソース障害のまとめ通知（銘柄ごとのエラー通知の代わりに1件だけ送る）"""
+        title, color = OUTAGE_STYLE
+        fields = []
+        if failed_tickers:
+            fields.append(_field("⚠️ 取得失敗（監視スキップ）", ", ".join(failed_tickers), False))
+        if stale_tickers:
+            fields.append(_field("🧊 前回データで判定", ", ".join(stale_tickers), False))
+        fields.append(_field(DETAIL_FIELD_NAME, reason, False))
+        return {
+            "title": title,
+            "description": f"**{len(failed_tickers) + len(stale_tickers)}銘柄に影響**",
+            "color": color,
+            "fields": fields,
+            "timestamp": self.timestamp,
+            "footer": ERROR_FOOTER,
+        }
+
+    def render_lagging(self, lagging_tickers, expected_session):
+        """取引カレンダー上の想定より古い株価しか取得できなかった銘柄のまとめ通知"""
+        title, color = LAGGING_STYLE
+        lines = [f"{ticker}: {last_trade_date}" for ticker, last_trade_date in lagging_tickers]
+        return {
+            "title": title,
+            "description": f"**想定の最新取引日: {expected_session}**",
+            "color": color,
+            "fields": [
+                _field("🐢 取得できた最新取引日", "\n".join(lines), False),
+                _field(DETAIL_FIELD_NAME, "yfinanceの株価が更新されていない可能性があります。次回実行時に再取得します。", False),
+            ],
+            "timestamp": self.timestamp,
+            "footer": ERROR_FOOTER,
+        }
+
+    def render_payout_overdue(self, ticker, payout):
+        """想定時期を過ぎても新しい分配金が確認できない銘柄の通知"""
+        months = "・".join(str(m) for m in payout["months"])
+        fields = [
+            _field("📅 想定ex-date", payout["next_ex_date"], True),
+            _field("📅 前回ex-date", payout["last_ex_date"], True),
+            _field("🔁 支払い間隔", f"約{payout['spacing_days']}日（{months}月）", True),
+            _field(DETAIL_FIELD_NAME, "想定時期を過ぎても新しい分配金が確認できません。"
+                                      "減配・支払い停止、またはyfinanceへの反映遅れの可能性があります。", False),
+        ]
+        return self._embed(ticker, PAYOUT_OVERDUE_STYLE, fields, ERROR_FOOTER)
+
+    def render_spread_alerts(self, alerts, ranking):
+        """新しく成立した銘柄間スプレッドアラートと利回り順位のまとめ通知"""
+        title, color = SPREAD_STYLE
+        lines = [
+            f"{a['long']} − {a['short']}: **{a['spread']:+.2f}%**（条件 {a['condition']}）" for a in alerts
+        ]
+        ranks = [f"{rank}. {ticker} {value:.2f}%" for ticker, value, rank in ranking]
+        return {
+            "title": title,
+            "description": f"**{len(alerts)}ペアで条件成立**",
+            "color": color,
+            "fields": [
+                _field(DETAIL_FIELD_NAME, _limit_lines(lines), False),
+                _field("🏅 利回り順位", _limit_lines(ranks), False),
+            ],
+            "timestamp": self.timestamp,
+            "footer": FOOTER,
+        }
+
+
+def _limit_lines(lines):
+    """行数が多い場合は先頭 MAX_FIELD_LINES 行＋残り件数"""
+    if len(lines) <= MAX_FIELD_LINES:
+        return "\n".join(lines)
+    return "\n".join(lines[:MAX_FIELD_LINES] + [f"…他{len(lines) - MAX_FIELD_LINES}件"])
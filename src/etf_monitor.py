@@ -9,13 +9,13 @@ ETF配当利回り監視Bot（円建て）- 最終版
 - 取引なしの日はstate更新をスキップ（配当落ち異常値の回避）
 """
 
-import os
+import argparse
+import signal
 import sys
-import json
 import shutil
 import time
-import yfinance as yf
-import requests
+import traceback
+import numpy as np
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
@@ -23,22 +23,140 @@ from pathlib import Path
 script_dir = Path(__file__).parent
 sys.path.insert(0, str(script_dir))
 
-from config import ETFS, STATE_FILE
+from config import (
+    STATE_FORMAT, DAEMON_INTERVAL_SECONDS, NOTIFY_MODE, NOTIFIERS, NOTIFIER_DEFAULTS,
+    DATA_SOURCE_BREAKER_THRESHOLD, FX_FALLBACK_RATES, SPREAD_ALERTS, HEALTH_LOG_FILE, FIXTURE_LATENCY_MS,
+)
+import state_store
+from ticker_state import StateTable, StateSchemaError, TickerState
+from universe import load_universe
+from embeds import CurrencyEmbeds, EmbedRenderer, localize
+from digest import Digest
+from notifiers import build_delivery_queue
+from yield_history import load_history, load_cached_history, extend_history, dividend_series, ttm_dividends
+from payout_schedule import PayoutSchedule, refresh_reason
+from market_calendar import load_calendar
+from fx import FxMatrix, fetch_usd_rates
+from indicators import update_indicators
+from portfolio import PortfolioSnapshot, validate_spread_rules
+import fixtures
+import health
+import shards
+
+# 監視対象ETF（data/universe.toml から読み込み。デーモンモードでは更新時に再読み込み）
+ETFS = load_universe()
+validate_spread_rules(SPREAD_ALERTS)
+
+# 実行中に使い回すEmbedテンプレート（run_once の開始時に構築）
+_embed_renderer = None
+
+# ダイジェストモードの実行中のみ通知を溜める
+_digest = None
+
+# シャード実行中（NOTIFY_MODE = "per_event"）の個別通知（表示通貨 → Embed。送信はマージ時にまとめて行う）
+_held = None
+
+# 実行中の共通送信キュー（run_once の開始時に構築）
+_delivery = None
+
+# 実行中のデータソース用サーキットブレーカー（run_once の開始時に構築）
+_breaker = None
+
+# 実行中のシャード (番号, シャード数)。None なら全銘柄を処理（run_once の開始時に設定）
+_shard = None
+
+# NYSE取引カレンダー（data/nyse_calendar.json）と、実行中に想定する最新取引日
+MARKET_CALENDAR = load_calendar()
+_expected_session = None
 
 # 日本時間タイムゾーン
 JST = timezone(timedelta(hours=9))
 
 
-def _with_retry(fn, *args, retries=3, delay=5):
-    """None以外の結果が得られるまでリトライ"""
-    for attempt in range(retries):
-        result = fn(*args)
-        if result is not None:
-            return result
-        if attempt < retries - 1:
-            print(f"  ⏳ {delay}秒後にリトライ ({attempt + 1}/{retries - 1})...")
-            time.sleep(delay)
-    return None
+class DataSourceBreaker:
+    """
+    データソース（yfinance）のサーキットブレーカー（1回の実行内で有効）
+
+    連続 threshold 銘柄の取得失敗（リトライを使い切った銘柄を1回と数える）で開き、
+    以降の実行中はデータ取得を行わない。
+    停止後の銘柄は前回保存データ（stale）で判定し、障害通知は実行の最後に1回だけ送る。
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.consecutive_failures = 0
+        self.is_open = False
+        self.failed_tickers = []   # 取得失敗した銘柄（個別のエラー通知対象）
+        self.stale_tickers = []    # 停止後に前回データで判定した銘柄
+        self.lagging_tickers = []  # (銘柄, 取得できた最新取引日)：取引カレンダー上の想定より古い
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def to_dict(self):
+        """シャードの結果に書き出す内容（通知はマージ時に全シャード分まとめて1回）"""
+        return {
+            "open": self.is_open,
+            "failed": self.failed_tickers,
+            "stale": self.stale_tickers,
+            "lagging": [list(item) for item in self.lagging_tickers],
+        }
+
+    @classmethod
+    def merged(cls, threshold, results):
+        """
+        全シャードの to_dict() をまとめたブレーカー
+
+        いずれかのシャードで開いていれば開いたものとして扱う
+        （シャードごとに担当銘柄の連続失敗を数えるため、個別銘柄の失敗では開かない）
+        """
+        breaker = cls(threshold)
+        for result in results:
+            breaker.is_open = breaker.is_open or result["open"]
+            breaker.failed_tickers.extend(result["failed"])
+            breaker.stale_tickers.extend(result["stale"])
+            breaker.lagging_tickers.extend(tuple(item) for item in result["lagging"])
+        return breaker
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if not self.is_open and self.consecutive_failures >= self.threshold:
+            self.is_open = True
+            print(f"  🔌 データ取得が{self.consecutive_failures}銘柄連続で失敗 - この実行中のデータ取得を停止します")
+
+
+def _with_retry(fn, *args, retries=3, delay=5, breaker=None, label=None):
+    """
+    None以外の結果が得られるまでリトライ（ブレーカーが開いていれば取得しない）
+
+    ブレーカーへの成功・失敗の記録は呼び出し側で銘柄ごとに1回だけ行う（fetch_etf_data）。
+    label を指定すると、試行回数・結果・所要時間をヘルス記録に残す
+    （ブレーカーが開いていて1回も取得しなかった場合は skipped）。
+    """
+    started = time.perf_counter()
+    attempts = 0
+    result = None
+    try:
+        for attempt in range(retries):
+            if breaker is not None and breaker.is_open:
+                return None
+            attempts += 1
+            result = fn(*args)
+            if result is not None:
+                return result
+            if attempt < retries - 1:
+                print(f"  ⏳ {delay}秒後にリトライ ({attempt + 1}/{retries - 1})...")
+                time.sleep(delay)
+        return None
+    finally:
+        if label is not None:
+            if result is not None:
+                status = "ok"
+            elif attempts == 0:
+                status = "skipped"
+            else:
+                status = "failed"
+            health.record_fetch(label, status, attempts, time.perf_counter() - started)
 
 
 def iso_to_date(s):
@@ -49,21 +167,21 @@ def iso_to_date(s):
 def _etf_data_from_state(prev_state):
     """保存された状態からETFデータを復元"""
     return {
-        "yield": prev_state.get("current_yield", 0),
-        "price_usd": prev_state.get("price_usd", 0),
-        "dividend_usd": prev_state.get("dividend_usd", 0),
-        "last_trade_date": prev_state.get("last_trade_date"),
+        "yield": prev_state.current_yield,
+        "price_usd": prev_state.price_usd,
+        "dividend_usd": prev_state.dividend_usd,
+        "last_trade_date": prev_state.last_trade_date,
     }
 
 
 def _build_comparison_data(prev_state):
     """リマインダー通知用の比較データを構築"""
-    is_first = prev_state.get("last_reminded") == prev_state.get("crossed_above_date")
+    is_first = prev_state.last_reminded == prev_state.crossed_above_date
     return {
-        "crossed_above_yield":     prev_state.get("crossed_above_yield"),
-        "crossed_above_price_jpy": prev_state.get("crossed_above_price_jpy"),
-        "last_reminded_yield":     None if is_first else prev_state.get("last_reminded_yield"),
-        "last_reminded_price_jpy": None if is_first else prev_state.get("last_reminded_price_jpy"),
+        "crossed_above_yield":     prev_state.crossed_above_yield,
+        "crossed_above_price_jpy": prev_state.crossed_above_price_jpy,
+        "last_reminded_yield":     None if is_first else prev_state.last_reminded_yield,
+        "last_reminded_price_jpy": None if is_first else prev_state.last_reminded_price_jpy,
     }
 
 
@@ -76,49 +194,106 @@ def _check_saturday_reminder(prev_state, today):
     """
     if today.weekday() != 5:
         return False, 0
-    if prev_state.get("status") != "above":
+    if prev_state.status != "above":
         return False, 0
 
-    crossed_above_date = prev_state.get("crossed_above_date")
+    crossed_above_date = prev_state.crossed_above_date
     days_above = (today - iso_to_date(crossed_above_date)).days if crossed_above_date else 0
 
     return True, days_above
 
 
-def get_etf_data(ticker):
-    """ETFの配当利回りと価格を取得（TTM方式 - 信頼性高）"""
+def _load_adjusted_history(ticker, recent_history):
+    """
+    分割・分配金を考慮した履歴キャッシュを取得
+
+    分配金の想定時期（PayoutSchedule）以外は全期間を再取得せず、キャッシュに直近の日足を追加して使う
+    （TTM分配金はキャッシュの分配金から計算）。
+    直近の日足に株式分割・キャッシュにない分配金がある場合は再取得する
+    （分割前の分配金と分割後の株価が混ざらないように）。
+
+    Returns:
+        tuple: (日次系列, PayoutSchedule or None)
+    """
+    refresh = False
+    cached = load_cached_history(ticker)
+    if cached is not None:
+        frame, fetched_at = cached
+        schedule = PayoutSchedule.from_dividends(dividend_series(frame))
+        session_date = recent_history.index[-1].date()
+        reason = refresh_reason(schedule, session_date, fetched_at, fixtures.now(timezone.utc))
+        if reason is None:
+            extended = extend_history(ticker, frame, recent_history)
+            if extended is not None:
+                health.count("dividend_refresh_skipped")
+                return extended, schedule
+            reason = "直近の日足にキャッシュにない分配金・株式分割、または欠落"
+        print(f"  💰 {ticker}: 分配金を再取得（{reason}）")
+        health.count("dividend_refresh")
+        refresh = True
+
+    frame = load_history(ticker, refresh=refresh)
+    if not refresh and "Stock Splits" in recent_history:
+        split_days = recent_history.index[recent_history["Stock Splits"] > 0]
+        if len(split_days) and split_days[-1].date() > frame.index[-1].date():
+            print(f"  ✂️ {ticker}: 株式分割を検知 - 履歴キャッシュを再取得")
+            frame = load_history(ticker, refresh=True)
+    return frame, PayoutSchedule.from_dividends(dividend_series(frame))
+
+
+def _filter_sessions(history, expected_session):
+    """
+    日足から確定済みの取引日の行だけを残す
+
+    取引カレンダーがない・範囲外の場合は従来どおり Volume=0 の行を除外する。
+    """
+    if MARKET_CALENDAR is None or expected_session is None:
+        return history[history["Volume"] > 0]
+    keep = [
+        MARKET_CALENDAR.is_trading_day(d) is not False and d <= expected_session
+        for d in history.index.date
+    ]
+    return history[keep]
+
+
+def get_etf_data(ticker, expected_session=None):
+    """
+    ETFの配当利回りと価格を取得（TTM方式 - 信頼性高）
+
+    Args:
+        ticker: ETFティッカーシンボル
+        expected_session: 最新データが出ているはずの取引日（これより新しい行は無視）
+    """
     try:
-        etf = yf.Ticker(ticker)
+        etf = fixtures.ticker(ticker)
 
-        # historyから価格を取得
-        history = etf.history(period="5d")
+        # historyから価格を取得（配当調整なしの終値。株式分割は反映済み）
+        history = etf.history(period="5d", auto_adjust=False, actions=True)
 
         if history.empty:
             print(f"{ticker} 履歴データなし")
             return None
 
-        # Volume=0のエントリを除外（週末実行時に翌営業日の幽霊エントリが混入する対策）
-        history = history[history["Volume"] > 0]
+        # 取引カレンダー上の確定済み取引日の行だけに絞る（週末実行時に翌営業日の幽霊エントリが混入する対策）
+        history = _filter_sessions(history, expected_session)
 
         if history.empty:
-            print(f"{ticker} 有効な取引データなし（Volume=0のみ）")
+            print(f"{ticker} 有効な取引データなし（確定済みの取引日なし）")
             return None
 
         # 最新の価格
         current_price = history["Close"].iloc[-1]
         last_trade_date = history.index[-1].date().isoformat()
 
-        # 配当情報を取得（TTM方式）
+        # 配当情報を取得（TTM方式・分割調整済みの履歴キャッシュから）
+        frame = dividends = schedule = None
         try:
-            dividends = etf.dividends
+            frame, schedule = _load_adjusted_history(ticker, history)
+            dividends = dividend_series(frame)
             if not dividends.empty:
                 # 400日ウィンドウで取得して直近4回分に絞る
                 # （365日境界で四半期配当が脱落する誤検知を防ぐ）
-                four_hundred_days_ago = history.index[-1] - timedelta(days=400)
-                recent_dividends = dividends[dividends.index > four_hundred_days_ago]
-                if len(recent_dividends) > 4:
-                    recent_dividends = recent_dividends.iloc[-4:]
-                annual_dividend = recent_dividends.sum()
+                annual_dividend = ttm_dividends([np.datetime64(last_trade_date)], dividends)[0]
                 dividend_yield = (annual_dividend / current_price) * 100
             else:
                 # 配当データがない場合はinfoから取得（fallback）
@@ -130,17 +305,61 @@ def get_etf_data(ticker):
             dividend_yield = 0
             annual_dividend = 0
 
-        return {
-            "yield": round(dividend_yield, 2),
-            "price_usd": round(current_price, 2),
-            "dividend_usd": round(annual_dividend, 2),
+        etf_data = {
+            "yield": round(float(dividend_yield), 2),
+            "price_usd": round(float(current_price), 2),
+            "dividend_usd": round(float(annual_dividend), 2),
             "last_trade_date": last_trade_date,
         }
+
+        # 分配金スケジュール（次回の想定ex-date・遅延）
+        if schedule is not None:
+            etf_data["payout"] = schedule.summary(history.index[-1].date())
+
+        # 利回りの統計指標（履歴キャッシュの新しい日だけを反映して更新）
+        if dividends is not None and not dividends.empty:
+            try:
+                indicators = update_indicators(ticker, frame, dividends)
+                percentile = indicators.percentile(float(dividend_yield))
+                zscore = indicators.zscore(float(dividend_yield))
+                etf_data["percentile"] = None if percentile is None else round(percentile, 1)
+                etf_data["zscore"] = None if zscore is None else round(zscore, 2)
+            except Exception as e:
+                print(f"  ⚠️ {ticker}: 利回り指標の計算失敗: {e}")
+
+        return etf_data
     except Exception as e:
         print(f"{ticker} データ取得エラー: {e}")
         return None
 
 
+def evaluate_signals(config, etf_data):
+    """
+    統計シグナル（利回りパーセンタイル・Zスコア）のうち成立しているもの
+
+    Returns:
+        list: 成立しているシグナル名（"percentile" / "zscore"）
+    """
+    signals = []
+    percentile = etf_data.get("percentile")
+    zscore = etf_data.get("zscore")
+    if config["percentile_alert"] > 0 and percentile is not None and percentile >= config["percentile_alert"]:
+        signals.append("percentile")
+    if config["zscore_alert"] > 0 and zscore is not None and zscore >= config["zscore_alert"]:
+        signals.append("zscore")
+    return signals
+
+
+def _signal_reason(signals, config, etf_data):
+    """統計シグナル通知の詳細文"""
+    parts = []
+    if "percentile" in signals:
+        parts.append(f"利回りパーセンタイル {etf_data['percentile']}%（条件: {config['percentile_alert']}%以上）")
+    if "zscore" in signals:
+        parts.append(f"利回りZスコア {etf_data['zscore']:+.2f}（条件: +{config['zscore_alert']}以上）")
+    return "統計シグナル成立: " + " / ".join(parts)
+
+
 def get_current_threshold(ticker, config, state):
     """
     現在の閾値を取得（baselineから計算）
@@ -151,9 +370,10 @@ def get_current_threshold(ticker, config, state):
     threshold_offset = config["threshold_offset"]
 
     # state.jsonからbaselineを取得
-    if ticker in state and "baseline" in state[ticker]:
-        baseline_years = state[ticker]["baseline"]["years"]
-        baseline_yield = state[ticker]["baseline"]["yield"]
+    prev_state = state.get(ticker)
+    if prev_state is not None and prev_state.has_baseline:
+        baseline_years = prev_state.baseline_years
+        baseline_yield = prev_state.baseline_yield
         print(f"  📊 Baseline読み込み: {baseline_yield:.2f}% ({baseline_years}年)")
     else:
         # 初回はconfigから取得
@@ -179,10 +399,11 @@ def should_update_baseline(ticker, state, config):
         tuple: (should_update: bool, last_year: int, is_initial: bool)
     """
 
-    current_year = datetime.now(JST).year
+    current_year = fixtures.now(JST).year
 
     # 初回起動の場合
-    if ticker not in state or "last_year" not in state[ticker]:
+    prev_state = state.get(ticker)
+    if prev_state is None or prev_state.last_year is None:
         # config.pyの baseline_year_end（baselineの最終年）を取得
         baseline_year_end = config.get("baseline_year_end", current_year - 1)
 
@@ -194,7 +415,7 @@ def should_update_baseline(ticker, state, config):
 
         return False, None, True  # 初回起動だが補完不要
 
-    last_year = state[ticker]["last_year"]
+    last_year = prev_state.last_year
 
     # すでに今年のデータで更新済み（年度更新の重複実行を防ぐ）
     if last_year == current_year:
@@ -239,7 +460,7 @@ def get_year_average_from_history(ticker, year):
     """
     過去の年度の平均利回りを取得（年度更新時・欠落データ補完用）
 
-    計算方法: その年の分配金総額 ÷ 年末の株価
+    計算方法: その年の分配金総額 ÷ 年末の株価（どちらも分割調整済み・配当調整なし）
 
     Args:
         ticker: ETFティッカーシンボル
@@ -249,28 +470,22 @@ def get_year_average_from_history(ticker, year):
         float or None: 年間平均利回り
     """
     try:
+        print(f"    📊 {year}年のデータを取得中... ({year}-01-01 ～ {year}-12-31)")
 
-        etf = yf.Ticker(ticker)
-
-        start = f"{year}-01-01"
-        end = f"{year}-12-31"
-        end_for_history = f"{year+1}-01-01"
-
-        print(f"    📊 {year}年のデータを取得中... ({start} ～ {end})")
+        # 分割・分配金を考慮した履歴キャッシュ（全期間を1回だけ取得して各年で使い回す）
+        frame = load_history(ticker)
+        year_frame = frame[frame.index.year == year]
 
-        # 履歴データ取得（end は翌年1/1を指定して年末最終営業日を確実に含める）
-        history = etf.history(start=start, end=end_for_history)
-
-        if history.empty:
+        if year_frame.empty:
             print(f"    ⚠️ 履歴データ取得失敗")
             return None
 
-        # 年末の株価を取得
-        year_end_price = history["Close"].iloc[-1]
+        # 年末の株価を取得（分割調整済み・配当調整なし）
+        year_end_price = year_frame["Close"].iloc[-1]
 
-        # その年の分配金総額を取得
+        # その年の分配金総額を取得（分割調整済み）
         try:
-            dividends = etf.dividends
+            dividends = dividend_series(frame)
             if not dividends.empty:
                 # その年の配当を取得
                 year_dividends = dividends[dividends.index.year == year]
@@ -283,7 +498,7 @@ def get_year_average_from_history(ticker, year):
                     dividend_yield = (annual_dividend / year_end_price) * 100
 
                     print(f"    ✅ {year}年: 分配金 ${annual_dividend:.2f}, 年末株価 ${year_end_price:.2f}, 利回り {dividend_yield:.2f}%")
-                    return round(dividend_yield, 2)
+                    return round(float(dividend_yield), 2)
                 else:
                     print(f"    ⚠️ {year}年: 分配金データなし")
                     return None
@@ -315,12 +530,13 @@ def update_baseline(ticker, last_year, state, config, is_initial=False):
                errors_list = [{"reason": "...", "baseline_data": {...}}, ...]
     """
     errors = []
-    current_year = datetime.now(JST).year
+    current_year = fixtures.now(JST).year
 
     # 現在のbaselineを取得
-    if ticker in state and "baseline" in state[ticker]:
-        baseline_years = state[ticker]["baseline"]["years"]
-        baseline_yield = state[ticker]["baseline"]["yield"]
+    prev_state = state.get(ticker)
+    if prev_state is not None and prev_state.has_baseline:
+        baseline_years = prev_state.baseline_years
+        baseline_yield = prev_state.baseline_yield
     else:
         baseline_years = config["baseline_years"]
         baseline_yield = config["baseline_yield"]
@@ -338,7 +554,7 @@ def update_baseline(ticker, last_year, state, config, is_initial=False):
         start_year = last_year
         # 前年の実績を計算（通常の年度更新）
         print(f"  📅 前年({last_year}年)の実績を計算中...")
-        last_year_avg = _with_retry(get_year_average_from_history, ticker, last_year)
+        last_year_avg = _with_retry(get_year_average_from_history, ticker, last_year, breaker=_breaker)
 
         if last_year_avg is None:
             print(f"  ⚠️ 前年データ取得失敗 - baseline更新をスキップ")
@@ -375,7 +591,7 @@ def update_baseline(ticker, last_year, state, config, is_initial=False):
         for year in range(start_year, current_year):
             print(f"  📅 {year}年のデータを補完中...")
 
-            year_avg = _with_retry(get_year_average_from_history, ticker, year)
+            year_avg = _with_retry(get_year_average_from_history, ticker, year, breaker=_breaker)
 
             if year_avg is not None:
                 # baselineを更新
@@ -419,90 +635,87 @@ def update_baseline(ticker, last_year, state, config, is_initial=False):
         }, errors
 
 
-def get_exchange_rate():
-    """USD/JPY為替レートを取得（複数の方法でフォールバック）"""
-
-    # 方法1: USDJPY=X で取得
-    try:
-        usdjpy = yf.Ticker("USDJPY=X")
-        history = usdjpy.history(period="5d")
-        if not history.empty:
-            rate = history["Close"].iloc[-1]
-            print(f"  為替レート取得成功 (USDJPY=X): ¥{rate:.2f}")
-            return round(rate, 2)
-    except Exception as e:
-        print(f"  ⚠️ USDJPY=X での取得失敗: {e}")
+def get_exchange_rates(currencies=("JPY",), notify_fallback=True):
+    """
+    表示通貨の為替レートをまとめて取得（取得できなかった通貨は固定レートでフォールバック）
 
-    # 方法2: JPY=X で取得（逆数）
-    try:
-        jpyusd = yf.Ticker("JPY=X")
-        history = jpyusd.history(period="5d")
-        if not history.empty:
-            jpy_rate = history["Close"].iloc[-1]
-            rate = 1 / jpy_rate
-            print(f"  為替レート取得成功 (JPY=X): ¥{rate:.2f}")
-            return round(rate, 2)
-    except Exception as e:
-        print(f"  ⚠️ JPY=X での取得失敗: {e}")
+    Args:
+        notify_fallback: 固定レートを使った場合に通知する（シャード実行ではマージ時にまとめて通知）
 
-    # 方法3: 固定レート（最終手段）
-    print(f"  ⚠️ 為替レート自動取得失敗、固定レートを使用します")
-    default_rate = 150.0
+    Returns:
+        FxMatrix: 通貨間のレート行列（固定レートで補った通貨は fallback）
+    """
+    currencies = [c for c in dict.fromkeys(currencies) if c != "USD"]
+    rates = fetch_usd_rates(currencies)
+    missing = [c for c in currencies if c not in rates]
+    if not missing:
+        return FxMatrix(rates)
+
+    # 固定レート（最終手段）
+    print(f"  ⚠️ 為替レート自動取得失敗（{', '.join(missing)}）、固定レートを使用します")
+    health.annotate("fx_fallback", missing)
+    for currency in missing:
+        rates[currency] = FX_FALLBACK_RATES[currency]
+    if notify_fallback:
+        notify_fx_fallback(missing)
+    return FxMatrix(rates, fallback=missing)
+
+
+def notify_fx_fallback(missing):
+    """為替レートの固定レート使用を通知"""
+    pairs = "、".join(f"USD/{c}" for c in missing)
+    fallback = "、".join(f"1 USD = {FX_FALLBACK_RATES[c]} {c}" for c in missing)
     try:
         error_embed = {
             "title": "❌ 為替レート取得失敗",
-            "description": "USD/JPY および JPY=X の両方の取得に失敗しました。\n処理は固定レート (¥150.0) で続行されます。",
+            "description": f"{pairs} の取得に失敗しました。\n処理は固定レート ({fallback}) で続行されます。",
             "color": 0xFF0000,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": fixtures.now(timezone.utc).isoformat(),
             "footer": {"text": "ETF利回り監視Bot (エラー)"}
         }
-        send_discord_notification(error_embed)
+        notify(error_embed)
         print("  ✅ 為替レート取得失敗をDiscordに通知しました。")
     except Exception as e:
         print(f"  ❌ Discordへのエラー通知送信にも失敗: {e}")
-    print(f"  デフォルト為替レート: ¥{default_rate}")
-    return default_rate
+    print(f"  固定レート: {fallback}")
 
 
 def load_state():
-    """状態ファイルを読み込み（エラー保護付き）"""
-    if not STATE_FILE.startswith('/'):
-        state_path = script_dir.parent / STATE_FILE
-    else:
-        state_path = Path(STATE_FILE)
+    """状態ファイルを読み込み（エラー保護付き。再生モードでは記録開始時の状態）"""
+    state_path, fmt = fixtures.state_input() or state_store.find_state_file()
 
-    if state_path.exists():
+    if state_path is not None:
         try:
-            with open(state_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError as e:
-            print(f"⚠️ state.jsonが壊れています: {e}")
+            return state_store.read_state(state_path, fmt)
+        except state_store.StateDecodeError as e:
+            print(f"⚠️ {state_path.name}が壊れています: {e}")
             print(f"   バックアップを作成して初期化します...")
 
-            backup_path = state_path.with_suffix(".json.backup")
+            backup_path = state_path.with_suffix(state_path.suffix + ".backup")
             shutil.copy(state_path, backup_path)
             print(f"   バックアップ: {backup_path}")
 
-            return {}
+            return StateTable()
+        except StateSchemaError as e:
+            # 新しい版で保存されたファイル（上書きすると新しいキーが失われるため実行しない）
+            raise SystemExit(f"❌ {state_path.name}: {e}。Botを更新してから実行してください（状態ファイルは変更していません）")
         except Exception as e:
-            print(f"⚠️ state.json読み込みエラー: {e}")
-            return {}
-    return {}
+            # 初期化して保存するとbaseline・通知履歴がすべて失われるため実行しない
+            raise SystemExit(f"❌ {state_path.name}読み込みエラー: {e}（状態ファイルは変更していません）")
+    return StateTable()
 
 
 def save_state(state):
-    """状態ファイルを保存"""
-    if not STATE_FILE.startswith('/'):
-        state_path = script_dir.parent / STATE_FILE
-    else:
-        state_path = Path(STATE_FILE)
-
-    state_path.parent.mkdir(parents=True, exist_ok=True)
+    """状態ファイルを保存（形式は config.STATE_FORMAT。再生モードではフィクスチャの replay/ に保存）"""
+    state_path = state_store.state_path()
+    replay_path = fixtures.replay_path(state_path.name)
     try:
-        with open(state_path, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
+        state_store.write_state(state, replay_path or state_path, STATE_FORMAT)
     except Exception as e:
-        print(f"❌ state.json保存エラー: {e}")
+        print(f"❌ {state_path.name}保存エラー: {e}")
+        return
+    if replay_path is None:
+        state_store.remove_other_formats(STATE_FORMAT)
 
 
 def should_notify(ticker, current_yield, threshold, state, etf_data):
@@ -513,7 +726,7 @@ def should_notify(ticker, current_yield, threshold, state, etf_data):
         tuple: (should_notify: bool, notification_type: str, reason: str)
     """
 
-    today = datetime.now(JST).date()
+    today = fixtures.now(JST).date()
     last_trade_date = etf_data.get("last_trade_date")
 
     # 初回実行
@@ -525,9 +738,9 @@ def should_notify(ticker, current_yield, threshold, state, etf_data):
             return True, "initial", "初回起動"
 
     prev_state = state[ticker]
-    prev_status = prev_state.get("status", "below")
-    prev_yield = prev_state.get("current_yield", 0)
-    last_update_date = prev_state.get("last_trade_date")
+    prev_status = prev_state.status
+    prev_yield = prev_state.current_yield
+    last_update_date = prev_state.last_trade_date
 
     # 閾値超過中の週次リマインダー（土曜日のみ）
     if prev_status == "above" and current_yield >= threshold:
@@ -551,246 +764,237 @@ def should_notify(ticker, current_yield, threshold, state, etf_data):
     return False, None, "通知不要"
 
 
-def _create_error_embed(notification_type, ticker, reason, baseline_data=None):
-    """エラー通知用のEmbed作成"""
-    color_map = {
-        "error_etf_data": 0xFF0000,
-        "error_baseline": 0xFF9900,
-    }
-    title_map = {
-        "error_etf_data": "❌ データ取得失敗",
-        "error_baseline": "❌ Baseline更新失敗",
-    }
-    etf_name = ETFS[ticker]["name"]
-    embed = {
-        "title": f"{title_map[notification_type]} - {ticker}",
-        "description": f"**{etf_name}**",
-        "color": color_map[notification_type],
-        "fields": [
-            {
-                "name": "📝 詳細",
-                "value": reason,
-                "inline": False
-            }
-        ],
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "footer": {"text": "ETF利回り監視Bot (エラー)"}
-    }
+def begin_embed_run(now_utc=None, currencies=("JPY",)):
+    """実行開始時にEmbedテンプレートを構築（timestamp・次回リマインダー日はここで1回だけ計算）"""
+    global _embed_renderer
+    now_utc = now_utc or fixtures.now(timezone.utc)
+    next_reminder = get_next_reminder_saturday(now_utc.astimezone(JST).date())
+    _embed_renderer = EmbedRenderer(ETFS, now_utc.isoformat(), next_reminder, currencies)
+    return _embed_renderer
 
-    # Baseline更新失敗時は追加情報
-    if notification_type == "error_baseline" and baseline_data:
-        embed["fields"].insert(0, {
-            "name": "ℹ️ 現在のBaseline",
-            "value": f"{baseline_data['yield']}% ({baseline_data['years']}年)",
-            "inline": False
-        })
-
-    return embed
-
-
-def _create_baseline_updated_embed(ticker, threshold, reason, baseline_data, old_baseline):
-    """Baseline更新通知用のEmbed作成"""
-    etf_name = ETFS[ticker]["name"]
-    embed = {
-        "title": f"📊 Baseline自動更新 - {ticker}",
-        "description": f"**{etf_name}**",
-        "color": 0x9966FF,
-        "fields": [
-            {
-                "name": "📈 更新前",
-                "value": f"{old_baseline['yield']}% ({old_baseline['years']}年)",
-                "inline": True
-            },
-            {
-                "name": "📈 更新後",
-                "value": f"**{baseline_data['yield']}%** ({baseline_data['years']}年)",
-                "inline": True
-            },
-            {
-                "name": "🎯 新しい閾値",
-                "value": f"{threshold}%",
-                "inline": True
-            },
-            {
-                "name": "📝 詳細",
-                "value": reason,
-                "inline": False
-            }
-        ],
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "footer": {"text": "ETF利回り監視Bot"}
-    }
-    return embed
-
-
-def _create_normal_embed(notification_type, ticker, etf_data, exchange_rate, threshold, reason,
-                         baseline_data=None, comparison_data=None):
-    """通常通知用のEmbed作成（上抜け・下抜け・リマインダー・初回）"""
-    color_map = {
-        "crossed_above": 0x00FF00,
-        "crossed_below": 0xFF0000,
-        "reminder": 0xFFFF00,
-        "initial": 0x0099FF,
-        "initial_above": 0xFF6600,
-    }
-    title_map = {
-        "crossed_above": "🚀 利回り閾値上抜け！",
-        "crossed_below": "📉 利回り閾値下抜け",
-        "reminder": "📌 週次リマインダー",
-        "initial": "✅ 監視開始",
-        "initial_above": "⚠️ 監視開始（閾値超過中）",
-    }
 
-    etf_name = ETFS[ticker]["name"]
-    price_jpy = round(etf_data["price_usd"] * exchange_rate, 2)
-    dividend_jpy = round(etf_data["dividend_usd"] * exchange_rate, 2)
-
-    fields = [
-        {
-            "name": "📊 配当利回り (TTM)",
-            "value": f"**{etf_data['yield']}%**",
-            "inline": True
-        },
-        {
-            "name": "🎯 閾値",
-            "value": f"{threshold}%",
-            "inline": True
-        }
-    ]
+def create_discord_embed(notification_type, ticker, etf_data, fx, threshold, reason,
+                         baseline_data=None, old_baseline=None, comparison_data=None, prices=None):
+    """
+    Discord埋め込みメッセージを作成（価格を含む通知は表示通貨ごとの CurrencyEmbeds）
 
-    # 初回起動時はBaseline情報を追加
-    if notification_type in ["initial", "initial_above"] and baseline_data:
-        fields.append({
-            "name": "ℹ️ Baseline",
-            "value": f"{baseline_data['yield']}% ({baseline_data['years']}年)",
-            "inline": True
-        })
-
-        # initial_aboveの場合は次回リマインダー日を追加
-        if notification_type == "initial_above":
-            today = datetime.now(JST).date()
-            next_saturday = get_next_reminder_saturday(today)
-            fields.append({
-                "name": "📅 次回リマインダー",
-                "value": f"{next_saturday} (土曜日)",
-                "inline": False
-            })
+    prices: 換算済みの [価格, 分配金] × 表示通貨（convert_prices の1銘柄分）
+    """
+    renderer = _embed_renderer or begin_embed_run()
+    if notification_type in ("error_etf_data", "error_baseline"):
+        return renderer.render_error(notification_type, ticker, reason, baseline_data=baseline_data)
+    if notification_type == "baseline_updated":
+        return renderer.render_baseline_updated(ticker, threshold, reason, baseline_data, old_baseline)
+    return renderer.render_normal(notification_type, ticker, etf_data, fx, threshold, reason,
+                                  baseline_data=baseline_data, comparison_data=comparison_data, prices=prices)
 
-    # リマインダーの場合は比較データを追加
-    if notification_type == "reminder" and comparison_data:
-        c_yield = comparison_data.get("crossed_above_yield")
-        c_price = comparison_data.get("crossed_above_price_jpy")
-        r_yield = comparison_data.get("last_reminded_yield")
-        r_price = comparison_data.get("last_reminded_price_jpy")
-
-        if c_yield is not None:
-            fields.append({
-                "name": "📊 上抜け時比（利回り）",
-                "value": f"{c_yield}% → {etf_data['yield']}%（{etf_data['yield'] - c_yield:+.2f}%）",
-                "inline": True
-            })
-        if c_price is not None:
-            fields.append({
-                "name": "📊 上抜け時比（価格）",
-                "value": f"¥{c_price:,.0f} → ¥{price_jpy:,.0f}（{price_jpy - c_price:+,.0f}）",
-                "inline": True
-            })
-        if r_yield is not None:
-            fields.append({
-                "name": "📅 前週比（利回り）",
-                "value": f"{r_yield}% → {etf_data['yield']}%（{etf_data['yield'] - r_yield:+.2f}%）",
-                "inline": True
-            })
-        if r_price is not None:
-            fields.append({
-                "name": "📅 前週比（価格）",
-                "value": f"¥{r_price:,.0f} → ¥{price_jpy:,.0f}（{price_jpy - r_price:+,.0f}）",
-                "inline": True
-            })
 
-    # 価格情報
-    fields.extend([
-        {
-            "name": "💵 現在価格（USD）",
-            "value": f"${etf_data['price_usd']}",
-            "inline": True
-        },
-        {
-            "name": "💴 現在価格（JPY）",
-            "value": f"¥{price_jpy:,.0f}",
-            "inline": True
-        },
-        {
-            "name": "💰 年間配当（USD）",
-            "value": f"${etf_data['dividend_usd']}",
-            "inline": True
-        },
-        {
-            "name": "💰 年間配当（JPY）",
-            "value": f"¥{dividend_jpy:,.0f}",
-            "inline": True
-        },
-        {
-            "name": "🌐 為替レート",
-            "value": f"1 USD = ¥{exchange_rate}",
-            "inline": False
-        },
-        {
-            "name": "📝 詳細",
-            "value": reason,
-            "inline": False
-        }
-    ])
-
-    embed = {
-        "title": f"{title_map[notification_type]} - {ticker}",
-        "description": f"**{etf_name}**",
-        "color": color_map[notification_type],
-        "fields": fields,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "footer": {"text": "ETF利回り監視Bot"}
+def send_notification(embed, currency=None):
+    """
+    全通知先（Discord・Slack・メール等）へ送信
+
+    実行中は共通の送信キューに投入するだけで、完了は run_once の最後にまとめて待つ。
+    currency を指定した場合はその表示通貨の通知先にだけ送る。
+    """
+    if _delivery is not None:
+        return _delivery.submit(embed, currency)
+
+    # run_once 外からの単発送信
+    queue = build_delivery_queue(NOTIFIERS, NOTIFIER_DEFAULTS)
+    queue.submit(embed, currency)
+    sent, failed = queue.flush()
+    queue.close()
+    return sent > 0 and failed == 0
+
+
+def notify(embed, margin=None):
+    """
+    通知を送信（ダイジェストモードでは実行の最後にまとめて送るため溜める）
+
+    Args:
+        embed: Discord Embed
+        margin: 利回り - 閾値（ダイジェストの並び順に使用。エラー等は None）
+    """
+    if _digest is not None:
+        _digest.add(embed, margin)
+        return True
+    if _held is not None:
+        _held.append({c: localize(embed, c) for c in (_delivery.currencies or ("JPY",))})
+        return True
+    return send_notification(embed)
+
+
+def flush_digest(today_str):
+    """溜めた通知をページ分割して送信"""
+    global _digest
+    digest, _digest = _digest, None
+    if not digest:
+        return
+    renderer = _embed_renderer or begin_embed_run()
+    for currency in digest.currencies:
+        pages = digest.pages(f"📋 日次ダイジェスト ({today_str})", renderer.timestamp, currency)
+        print(f"📋 ダイジェスト送信（{currency}）: {len(digest)}件 → {len(pages)}ページ")
+        for page in pages:
+            send_notification(page, currency)
+
+
+def _etf_data_error_embed(ticker):
+    """データ取得失敗（個別銘柄）の通知"""
+    return create_discord_embed(
+        "error_etf_data",
+        ticker,
+        None,
+        0,
+        0,
+        f"{ETFS[ticker]['name']} のデータ取得に失敗しました。yfinance APIの問題、またはティッカーシンボルの変更が考えられます。この銘柄の監視をスキップします。"
+    )
+
+
+def process_portfolio(state):
+    """
+    全銘柄の処理後に銘柄間の利回りスプレッド・順位を集計し、新しく成立したスプレッドアラートを通知
+
+    取得に失敗した銘柄は前回保存した利回りで集計する。
+    """
+    tickers = np.array(state.tickers(), dtype=object)
+    # ユニバース内で一度でも取得できた銘柄だけを集計
+    traded = np.array([d is not None for d in state.column("last_trade_date")], dtype=bool)
+    in_universe = np.array([t in ETFS for t in tickers], dtype=bool) & traded
+    if in_universe.sum() < 2:
+        return
+    yields = state.column("current_yield", dtype=float)[in_universe]
+    snapshot = PortfolioSnapshot(tickers[in_universe], yields)
+
+    print("🏅 利回り順位: " + " / ".join(f"{rank}. {t} {y:.2f}%" for t, y, rank in snapshot.ranking()))
+
+    alerts = snapshot.evaluate(SPREAD_ALERTS)
+    prev_keys = set(state.portfolio.get("active_spread_alerts", []))
+    new_alerts = [a for a in alerts if a["key"] not in prev_keys]
+    if new_alerts:
+        print(f"📏 スプレッドアラート: {len(new_alerts)}件（成立中 {len(alerts)}件）")
+        notify((_embed_renderer or begin_embed_run()).render_spread_alerts(new_alerts, snapshot.ranking()))
+
+    state.portfolio = {
+        **state.portfolio,
+        "ranks": {t: rank for t, _, rank in snapshot.ranking()},
+        "active_spread_alerts": [a["key"] for a in alerts],
     }
+    print()
 
-    return embed
 
+def report_data_source_failures():
+    """データ取得失敗・株価遅延の通知（障害でブレーカーが開いた場合は1件にまとめる）"""
+    breaker = _breaker
+    if breaker is None:
+        return
 
-def create_discord_embed(notification_type, ticker, etf_data, exchange_rate, threshold, reason,
-                         baseline_data=None, old_baseline=None, comparison_data=None):
-    """Discord埋め込みメッセージを作成"""
-    if notification_type in ("error_etf_data", "error_baseline"):
-        return _create_error_embed(notification_type, ticker, reason, baseline_data=baseline_data)
-    if notification_type == "baseline_updated":
-        return _create_baseline_updated_embed(ticker, threshold, reason, baseline_data, old_baseline)
-    return _create_normal_embed(notification_type, ticker, etf_data, exchange_rate, threshold, reason,
-                                baseline_data=baseline_data, comparison_data=comparison_data)
+    # 取引カレンダー上の想定より古い株価（障害時は障害通知に含まれるため省略）
+    if breaker.lagging_tickers and not breaker.is_open and _expected_session is not None:
+        notify((_embed_renderer or begin_embed_run()).render_lagging(breaker.lagging_tickers, _expected_session))
+
+    if not (breaker.failed_tickers or breaker.stale_tickers):
+        return
+
+    if breaker.is_open:
+        embed = (_embed_renderer or begin_embed_run()).render_outage(
+            breaker.failed_tickers, breaker.stale_tickers,
+            f"yfinanceからのデータ取得が{breaker.threshold}銘柄連続で失敗したため、"
+            f"この実行中のデータ取得を停止しました。次回実行時に自動で再試行します。"
+        )
+        notify(embed)
+        return
 
+    for ticker in breaker.failed_tickers:
+        notify(_etf_data_error_embed(ticker))
 
-def send_discord_notification(embed):
-    """Discord Webhookで通知を送信"""
-    webhook_url = os.environ.get("DISCORD_WEBHOOK_URL")
 
-    if not webhook_url:
-        print("⚠️ DISCORD_WEBHOOK_URL が設定されていません")
-        return False
+def fetch_etf_data(ticker, expected_session=None):
+    """
+    1銘柄分のETFデータ取得（TTM方式・リトライあり）
 
-    payload = {"embeds": [embed]}
+    ブレーカーにはリトライを使い切った後の結果を銘柄ごとに1回だけ記録する
+    （上場廃止などの個別銘柄の失敗でリトライ回数分数えて、健全な銘柄まで停止しないように）。
+    """
+    breaker = _breaker
+    etf_data = _with_retry(get_etf_data, ticker, expected_session, breaker=breaker, label=ticker)
+    if breaker is not None and not breaker.is_open:
+        if etf_data:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    return etf_data
 
-    try:
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()
-        print("✅ Discord通知送信成功")
-        return True
-    except Exception as e:
-        print(f"❌ Discord通知送信失敗: {e}")
-        return False
 
+def load_ticker_data(ticker, config, state, expected_session=None):
+    """
+    1銘柄分のETFデータを用意（取得・取引日なしのスキップ・データソース停止中の前回データ）
+
+    expected_session: 取引カレンダー上で最新データが出ているはずの取引日（不明なら None）
 
-def process_ticker(ticker, config, state, exchange_rate, today, today_str, current_year):
-    """1銘柄分の監視処理。state を直接変更する。"""
+    Returns:
+        dict or None: ETFデータ（取得失敗なら None）
+    """
+    print(f"--- {ticker} ({config['name']}) ---")
+
+    prev = state.get(ticker)
+    if (expected_session is not None and prev is not None and prev.last_trade_date
+            and prev.last_trade_date >= expected_session.isoformat()):
+        # 前回以降に新しい取引日がないので取得しても新しいデータは得られない
+        print(f"  📅 新しい取引日なし（最新: {prev.last_trade_date}）- データ取得をスキップ")
+        etf_data = _etf_data_from_state(prev)
+        health.record_fetch(ticker, "skipped")
+    else:
+        etf_data = fetch_etf_data(ticker, expected_session)
+        if etf_data and expected_session is not None and etf_data["last_trade_date"] < expected_session.isoformat():
+            print(f"  🐢 株価が想定より古い（取得: {etf_data['last_trade_date']} / 想定: {expected_session}）")
+            if _breaker is not None:
+                _breaker.lagging_tickers.append((ticker, etf_data["last_trade_date"]))
+
+    # データソース停止中は前回保存データで判定（stale）
+    if not etf_data and _breaker is not None and _breaker.is_open and ticker in state:
+        print(f"  🧊 データソース停止中 - 前回データ（{state[ticker].last_trade_date}）で判定")
+        etf_data = {**_etf_data_from_state(state[ticker]), "stale": True}
+        _breaker.stale_tickers.append(ticker)
+        health.record_fetch(ticker, "stale")
+    print()
+    return etf_data
+
+
+def convert_prices(loaded, state, fx, currencies):
+    """
+    全銘柄の [価格, 分配金] を全表示通貨へ1回の行列演算で換算
+
+    Args:
+        loaded: [(ticker, etf_data or None), ...]（取得失敗の銘柄は前回保存データの価格）
+
+    Returns:
+        dict: ticker → np.ndarray (2, 表示通貨数)。価格が分からない銘柄は含まない
+    """
+    rows = {}
+    for ticker, etf_data in loaded:
+        source = etf_data or state.get(ticker)
+        if source is None:
+            continue
+        if isinstance(source, TickerState):
+            rows[ticker] = (source.price_usd, source.dividend_usd)
+        else:
+            rows[ticker] = (source["price_usd"], source["dividend_usd"])
+    if not rows:
+        return {}
+    converted = fx.convert(np.array(list(rows.values()), dtype=float), currencies)   # (銘柄, 2, 通貨)
+    return dict(zip(rows, converted))
+
+
+def process_ticker(ticker, config, state, fx, today, today_str, current_year, etf_data, prices=None):
+    """
+    1銘柄分の監視処理（load_ticker_data で用意したデータで判定・通知）。state を直接変更する。
+
+    fx: 為替レート行列（FxMatrix）
+    etf_data: load_ticker_data の結果（取得失敗なら None）
+    prices: convert_prices で換算した [価格, 分配金] × 表示通貨
+    """
     print(f"--- {ticker} ({config['name']}) ---")
 
-    # ETFデータ取得（TTM方式・リトライあり）
-    etf_data = _with_retry(get_etf_data, ticker)
     if not etf_data:
         print(f"⚠️ {ticker} のデータ取得失敗\n")
 
@@ -804,28 +1008,22 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
                 comparison_data = _build_comparison_data(prev)
                 remind_embed = create_discord_embed(
                     "reminder", ticker, _etf_data_from_state(prev),
-                    exchange_rate,
-                    prev.get("threshold", 0),
+                    fx,
+                    prev.threshold,
                     f"週次リマインダー（土曜日、継続{days_above}日目）※前営業日データ",
-                    comparison_data=comparison_data
+                    comparison_data=comparison_data, prices=prices
                 )
-                send_discord_notification(remind_embed)
-                state[ticker]["last_reminded"]           = today_str
-                state[ticker]["last_reminded_yield"]     = prev.get("current_yield")
-                state[ticker]["last_reminded_price_jpy"] = round(prev.get("price_usd", 0) * exchange_rate, 0)
+                notify(remind_embed, margin=prev.current_yield - prev.threshold)
+                prev.mark_reminded(today_str, prev.current_yield, round(prev.price_usd * fx.rate("JPY"), 0))
                 print(f"  📌 土曜日リマインダー送信（前回データ使用）")
 
         # 土日はデータ取得失敗通知を送らない（市場休場のため想定内）
+        # 通知は実行の最後にまとめて判断（データソース障害なら1件の障害通知にまとめる）
         if not is_weekend:
-            error_embed = create_discord_embed(
-                "error_etf_data",
-                ticker,
-                None,
-                0,
-                0,
-                f"{ETFS[ticker]['name']} のデータ取得に失敗しました。yfinance APIの問題、またはティッカーシンボルの変更が考えられます。この銘柄の監視をスキップします。"
-            )
-            send_discord_notification(error_embed)
+            if _breaker is not None:
+                _breaker.failed_tickers.append(ticker)
+            else:
+                notify(_etf_data_error_embed(ticker))
         return
 
     current_yield = etf_data["yield"]
@@ -835,6 +1033,9 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
     baseline_update_success = False
     new_baseline = None
     should_update, last_year, is_initial = should_update_baseline(ticker, state, config)
+    if should_update and etf_data.get("stale"):
+        print("  ⏭️ データソース停止中のためBaseline更新は次回に延期")
+        should_update = False
     if should_update:
         new_baseline, baseline_errors = update_baseline(ticker, last_year, state, config, is_initial)
 
@@ -844,18 +1045,16 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
                 "error_baseline", ticker, None, 0, 0,
                 err["reason"], baseline_data=err["baseline_data"]
             )
-            send_discord_notification(embed)
+            notify(embed)
 
         if new_baseline:
             # baselineを即座に反映
             if ticker not in state:
-                state[ticker] = {}
-            state[ticker]["baseline"] = {
-                "years": new_baseline["years"],
-                "yield": new_baseline["yield"]
-            }
+                state[ticker] = TickerState()
+            state[ticker].baseline_years = new_baseline["years"]
+            state[ticker].baseline_yield = new_baseline["yield"]
             # last_yearを今年に更新（年度更新の重複を防ぐ）
-            state[ticker]["last_year"] = current_year
+            state[ticker].last_year = current_year
             baseline_update_success = True
 
     # 閾値を取得（更新されたbaselineを使用）
@@ -864,7 +1063,9 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
 
     print(f"配当利回り: {current_yield}% (TTM方式)")
     print(f"閾値: {threshold}% (Baseline: {threshold_data['baseline_yield']}%, {threshold_data['baseline_years']}年)")
-    print(f"価格: ${etf_data['price_usd']} (¥{etf_data['price_usd'] * exchange_rate:,.0f})")
+    print(f"価格: ${etf_data['price_usd']} (¥{etf_data['price_usd'] * fx.rate('JPY'):,.0f})")
+    if etf_data.get("percentile") is not None:
+        print(f"統計: パーセンタイル {etf_data['percentile']}% / Zスコア {etf_data.get('zscore')}")
 
     # Baseline更新成功の通知（初回起動の欠落補完を含む）
     if baseline_update_success:
@@ -879,7 +1080,7 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
             "baseline_updated",
             ticker,
             etf_data,
-            exchange_rate,
+            fx,
             threshold,
             update_message,
             baseline_data={
@@ -888,13 +1089,15 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
             },
             old_baseline=new_baseline["old_baseline"]
         )
-        send_discord_notification(update_embed)
+        notify(update_embed, margin=current_yield - threshold)
 
     # 通知判定
     should_send, notification_type, reason = should_notify(
         ticker, current_yield, threshold, state, etf_data
     )
 
+    if etf_data.get("stale"):
+        reason += " ※データソース障害のため前回データ"
     print(f"判定: {reason}")
 
     # 取引日なしの場合はstate更新をスキップ
@@ -908,108 +1111,366 @@ def process_ticker(ticker, config, state, exchange_rate, today, today_str, curre
             notification_type,
             ticker,
             etf_data,
-            exchange_rate,
+            fx,
             threshold,
             reason if notification_type == "initial_above" else "初回起動。この閾値で監視を開始します。",
             baseline_data={
                 "years": threshold_data["baseline_years"],
                 "yield": threshold_data["baseline_yield"]
-            }
+            },
+            prices=prices
         )
-        send_discord_notification(initial_embed)
+        notify(initial_embed, margin=current_yield - threshold)
     elif should_send:
         # 通常の通知（上抜け・下抜け・リマインダー）
         comparison_data = None
         if notification_type == "reminder":
-            comparison_data = _build_comparison_data(state.get(ticker, {}))
+            comparison_data = _build_comparison_data(state.get(ticker) or TickerState())
         embed = create_discord_embed(
-            notification_type, ticker, etf_data, exchange_rate,
-            threshold, reason, comparison_data=comparison_data
+            notification_type, ticker, etf_data, fx,
+            threshold, reason, comparison_data=comparison_data, prices=prices
         )
-        send_discord_notification(embed)
+        notify(embed, margin=current_yield - threshold)
+
+    # 統計シグナル（新しく成立したものだけ通知。指標がない場合＝前回データでの判定時は前回の状態を維持）
+    indicator_state = {}
+    if "percentile" in etf_data:
+        signals = evaluate_signals(config, etf_data)
+        prev_signals = (state.get(ticker) or TickerState()).active_signals
+        new_signals = [s for s in signals if s not in prev_signals]
+        if new_signals and notification_type not in ("initial", "initial_above"):
+            print(f"  📐 統計シグナル: {', '.join(new_signals)}")
+            signal_embed = create_discord_embed(
+                "signal", ticker, etf_data, fx, threshold, _signal_reason(new_signals, config, etf_data),
+                prices=prices
+            )
+            notify(signal_embed, margin=current_yield - threshold)
+        indicator_state = {
+            "yield_percentile": etf_data["percentile"],
+            "yield_zscore": etf_data.get("zscore"),
+            "active_signals": signals,
+        }
+
+    # 分配金の遅延（想定時期を過ぎても新しい分配金がない。新しく遅延になった時だけ通知）
+    payout_state = {}
+    payout = etf_data.get("payout")
+    if payout is not None:
+        overdue = payout["next_ex_date"] if payout["status"] == "overdue" else None
+        prev_overdue = (state.get(ticker) or TickerState()).payout_overdue
+        if overdue and overdue != prev_overdue:
+            print(f"  ⏰ 分配金の遅延: 想定ex-date {overdue}（前回 {payout['last_ex_date']}）")
+            notify((_embed_renderer or begin_embed_run()).render_payout_overdue(ticker, payout))
+        payout_state = {"next_ex_date": payout["next_ex_date"], "payout_overdue": overdue}
 
     # 状態更新
     new_status = "above" if current_yield >= threshold else "below"
 
-    # 状態オブジェクト作成
-    new_state = {
-        "status": new_status,
-        "current_yield": current_yield,
-        "price_usd": etf_data["price_usd"],
-        "dividend_usd": etf_data["dividend_usd"],
-        "threshold": threshold,
-        "last_trade_date": last_trade_date,
-        "last_year": current_year,  # 年度追跡用
-        "baseline": {
-            "years": threshold_data["baseline_years"],
-            "yield": threshold_data["baseline_yield"],
-        },
-        "last_checked": today_str,
-    }
-
-    # 前回の状態を引き継ぐ
-    if ticker in state:
-        prev_state = state[ticker]
-        new_state["last_notified"]           = prev_state.get("last_notified")
-        new_state["last_reminded"]           = prev_state.get("last_reminded")
-        new_state["crossed_above_date"]      = prev_state.get("crossed_above_date")
-        new_state["crossed_above_yield"]     = prev_state.get("crossed_above_yield")
-        new_state["crossed_above_price_jpy"] = prev_state.get("crossed_above_price_jpy")
-        new_state["last_reminded_yield"]     = prev_state.get("last_reminded_yield")
-        new_state["last_reminded_price_jpy"] = prev_state.get("last_reminded_price_jpy")
+    # 状態オブジェクト作成（通知履歴は前回の状態から引き継ぐ）
+    new_state = (state.get(ticker) or TickerState()).updated(
+        status=new_status,
+        current_yield=current_yield,
+        price_usd=etf_data["price_usd"],
+        dividend_usd=etf_data["dividend_usd"],
+        threshold=threshold,
+        last_trade_date=last_trade_date,
+        last_year=current_year,  # 年度追跡用
+        baseline_years=threshold_data["baseline_years"],
+        baseline_yield=threshold_data["baseline_yield"],
+        last_checked=today_str,
+        **indicator_state,
+        **payout_state,
+    )
 
     # 通知を送った場合の更新（初回起動も含む）
     if should_send:
-        new_state["last_notified"] = today_str
+        new_state.last_notified = today_str
 
-        price_jpy_int = round(etf_data["price_usd"] * exchange_rate, 0)
+        price_jpy_int = round(etf_data["price_usd"] * fx.rate("JPY"), 0)
         if notification_type in ("crossed_above", "initial_above"):
-            new_state["crossed_above_date"]      = today_str
-            new_state["last_reminded"]           = today_str
-            new_state["crossed_above_yield"]     = current_yield
-            new_state["crossed_above_price_jpy"] = price_jpy_int
-            new_state["last_reminded_yield"]     = current_yield
-            new_state["last_reminded_price_jpy"] = price_jpy_int
+            new_state.mark_crossed_above(today_str, current_yield, price_jpy_int)
         elif notification_type == "reminder":
-            new_state["last_reminded"]           = today_str
-            new_state["last_reminded_yield"]     = current_yield
-            new_state["last_reminded_price_jpy"] = price_jpy_int
+            new_state.mark_reminded(today_str, current_yield, price_jpy_int)
         elif notification_type == "crossed_below":
-            new_state["crossed_above_date"]      = None
-            new_state["last_reminded"]           = None
-            new_state["crossed_above_yield"]     = None
-            new_state["crossed_above_price_jpy"] = None
-            new_state["last_reminded_yield"]     = None
-            new_state["last_reminded_price_jpy"] = None
+            new_state.clear_crossing()
 
     state[ticker] = new_state
     print()
 
 
-def main():
-    """メイン処理"""
-    now_jst = datetime.now(JST)
+def _flush_delivery():
+    """送信キューの完了待ち（送信数はヘルス記録に残す）"""
+    global _delivery
+    with health.stage("delivery"):
+        delivery, _delivery = _delivery, None
+        sent, failed = delivery.flush()
+        delivery.close()
+    health.annotate("notifications", {"sent": sent, "failed": failed})
+    if sent or failed:
+        print(f"📨 通知送信: 成功 {sent}件 / 失敗 {failed}件")
+
+
+def run_once(shard=None):
+    """
+    1回分の監視処理
+
+    Args:
+        shard: (番号, シャード数)。指定時は担当銘柄だけを処理して結果を SHARD_DIR に書き出す
+               （通知の送信・銘柄間の集計・状態ファイルの保存は merge_shards で行う）
+    """
+    now_jst = fixtures.now(JST)
     today = now_jst.date()
     today_str = today.isoformat()
     current_year = now_jst.year
 
     print(f"=== ETF利回り監視開始: {now_jst.strftime('%Y-%m-%d %H:%M:%S JST')} ===\n")
 
-    # 為替レート取得
-    exchange_rate = get_exchange_rate()
-    print(f"\n💱 USD/JPY: ¥{exchange_rate}\n")
+    # ヘルス記録（ステージごとの所要時間・取得結果・キャッシュヒット数）
+    health.begin_run()
+
+    global _digest, _held, _delivery, _breaker, _expected_session, _shard
+    _shard = shard
+    targets = list(ETFS.items())
+    if shard is not None:
+        index, count = shard
+        tickers = shards.shard_tickers(ETFS.keys(), index, count)
+        targets = [(t, ETFS[t]) for t in tickers]
+        health.annotate("shard", f"{index}/{count}")
+        print(f"🧩 シャード {index}/{count}: {len(targets)}/{len(ETFS)}銘柄\n")
+
+    # 通知先ごとの送信キュー（送信は処理と並行して行い、最後に完了を待つ）
+    _delivery = build_delivery_queue(NOTIFIERS, NOTIFIER_DEFAULTS)
+    fixtures.note_notifiers(n.name for n in _delivery.notifiers)
+    currencies = _delivery.currencies or ("JPY",)
+
+    # Embedテンプレート構築（銘柄名・タイトル等は以降キャッシュを使用）
+    begin_embed_run(currencies=currencies)
+
+    # ダイジェストモード: 通知を溜めて最後にまとめて送信
+    _digest = Digest(currencies) if NOTIFY_MODE == "digest" else None
+    # シャード実行ではどちらのモードでも送信せず、結果に書き出してマージ時に1回だけ送る
+    _held = [] if shard is not None and _digest is None else None
+
+    # データソース障害時に残りの銘柄の取得を止めるブレーカー
+    _breaker = DataSourceBreaker(DATA_SOURCE_BREAKER_THRESHOLD)
+
+    # 取引カレンダー上の最新取引日（これ以降のデータがある銘柄は取得をスキップ）
+    _expected_session = MARKET_CALENDAR.expected_last_session(now_jst) if MARKET_CALENDAR else None
+    if _expected_session is not None:
+        print(f"📅 最新取引日（NYSE）: {_expected_session}\n")
+
+    # 為替レート取得（状態ファイルの円建て価格用に JPY は常に取得）
+    with health.stage("fx"):
+        fx = get_exchange_rates(("JPY",) + currencies, notify_fallback=shard is None)
+    print(f"\n💱 {' / '.join(f'USD/{c}: {fx.rate(c)}' for c in fx.currencies[1:])}\n")
 
     # 状態ファイル読み込み
-    state = load_state()
+    with health.stage("load_state"):
+        state = load_state()
 
     # 各ETFを監視
-    for ticker, config in ETFS.items():
-        process_ticker(ticker, config, state, exchange_rate, today, today_str, current_year)
+    with health.stage("tickers"):
+        loaded = [(ticker, load_ticker_data(ticker, config, state, _expected_session)) for ticker, config in targets]
+        # 全銘柄の価格・分配金を全表示通貨へまとめて換算（Embedは換算済みの行を使う）
+        prices = convert_prices(loaded, state, fx, currencies)
+        for (ticker, config), (_, etf_data) in zip(targets, loaded):
+            process_ticker(ticker, config, state, fx, today, today_str, current_year, etf_data,
+                           prices=prices.get(ticker))
+
+    if shard is not None:
+        # シャードの結果（担当銘柄の状態・溜めた通知・データ取得と為替の状況）を書き出し
+        # 通知・データソース障害・為替の固定レートの通知はマージ時に全シャード分まとめて1回だけ送る
+        digest, _digest = _digest, None
+        held, _held = _held, None
+        _flush_delivery()
+        with health.stage("save_state"):
+            path = shards.write_shard(index, count, tickers, state,
+                                      digest.events() if digest else None,
+                                      notifications=held,
+                                      data_source=_breaker.to_dict(), fx_fallback=fx.fallback,
+                                      expected_session=_expected_session)
+        print(f"🧩 シャード結果: {path}")
+        _finish_health()
+        print("=== 監視完了 ===")
+        return
+
+    report_data_source_failures()
+
+    # 銘柄間の集計（スプレッド・順位）
+    with health.stage("portfolio"):
+        process_portfolio(state)
+
+    flush_digest(today_str)
+
+    # 送信キューの完了待ち
+    _flush_delivery()
 
     # 状態保存
-    save_state(state)
+    with health.stage("save_state"):
+        save_state(state)
+    _finish_health()
     print("=== 監視完了 ===")
 
 
+def merge_shards():
+    """
+    全シャードの結果を状態ファイルへ1回で反映し、銘柄間の集計とダイジェスト送信を行う
+
+    結果が届かなかったシャードの担当銘柄は前回の状態のまま。
+    """
+    now_jst = fixtures.now(JST)
+    today_str = now_jst.date().isoformat()
+    print(f"=== シャード結果のマージ: {now_jst.strftime('%Y-%m-%d %H:%M:%S JST')} ===\n")
+
+    global _digest, _held, _delivery, _breaker, _expected_session, _shard
+    _shard = None
+    _held = None
+    count, payloads, missing, paths = shards.load_shards()
+    if not payloads:
+        print("⚠️ マージするシャード結果がありません")
+        return
+
+    health.begin_run()
+    health.annotate("shard", "merge")
+    if missing:
+        health.annotate("missing_shards", missing)
+        print(f"⚠️ シャード {', '.join(map(str, missing))}（{count}分割）の結果がありません（担当銘柄は前回の状態を維持）")
+
+    _delivery = build_delivery_queue(NOTIFIERS, NOTIFIER_DEFAULTS)
+    fixtures.note_notifiers(n.name for n in _delivery.notifiers)
+    currencies = _delivery.currencies or ("JPY",)
+    begin_embed_run(currencies=currencies)
+    _digest = Digest(currencies) if NOTIFY_MODE == "digest" else None
+    if _digest is not None:
+        for payload in payloads:
+            _digest.extend(payload["digest"])
+
+    with health.stage("load_state"):
+        state = load_state()
+    with health.stage("merge"):
+        merged = shards.merge_into(state, payloads)
+    print(f"🧩 {len(payloads)}/{count}シャード・{merged}銘柄を反映\n")
+
+    # シャードが溜めた個別通知（per_event）を送信（ダイジェストモードならダイジェストに追加）
+    for embed in shards.held_notifications(payloads):
+        notify(CurrencyEmbeds(embed))
+
+    # 各シャードのデータ取得失敗・為替の固定レート使用を1回だけ通知
+    _breaker = DataSourceBreaker.merged(DATA_SOURCE_BREAKER_THRESHOLD, shards.data_source_results(payloads))
+    _expected_session = shards.expected_session(payloads)
+    report_data_source_failures()
+    fx_fallback = shards.fx_fallback(payloads)
+    if fx_fallback:
+        notify_fx_fallback(fx_fallback)
+
+    with health.stage("portfolio"):
+        process_portfolio(state)
+
+    flush_digest(today_str)
+    _flush_delivery()
+
+    # 状態ファイルへの書き込みはここだけ（一時ファイル経由で置き換え）
+    with health.stage("save_state"):
+        save_state(state)
+    shards.collect_health(count)
+    shards.clear(paths)
+    _finish_health()
+    print("=== マージ完了 ===")
+
+
+def _finish_health(status="ok"):
+    """ヘルス記録を確定（再生モードではフィクスチャの replay/、シャード実行ではシャードの結果と一緒に書き出す）"""
+    path = fixtures.replay_path("health.jsonl")
+    if path is None and _shard is not None:
+        path = shards.health_path(*_shard)
+    health.finish_run(status, path=path or HEALTH_LOG_FILE)
+
+
+def _run_recorded(fn=run_once, **kwargs):
+    """run_once / merge_shards を実行（途中で例外になった場合もヘルス記録を残す）"""
+    try:
+        fn(**kwargs)
+    except BaseException:
+        _finish_health(status="error")
+        raise
+
+
+def _latency(value):
+    """--latency の値（ミリ秒 または "recorded"）"""
+    return value if value == "recorded" else float(value)
+
+
+def _shard_arg(value):
+    """--shard の値（"I/N"）"""
+    try:
+        return shards.parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ETF配当利回り監視Bot")
+    parser.add_argument("--daemon", action="store_true", help="一定間隔で繰り返し実行する")
+    parser.add_argument("--interval", type=int, default=DAEMON_INTERVAL_SECONDS, help="実行間隔（秒）")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="DIR", help="データソース・通知先の応答をフィクスチャとして記録")
+    mode.add_argument("--replay", metavar="DIR", help="記録したフィクスチャから再生（ネットワーク接続なし）")
+    parser.add_argument("--latency", type=_latency, default=FIXTURE_LATENCY_MS,
+                        help='再生時に各呼び出しへ加える待ち時間（ミリ秒。"recorded" なら記録時の所要時間）')
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument("--shard", type=_shard_arg, metavar="I/N",
+                          help="銘柄を N 分割した I 番目（0 始まり）だけを処理し、結果を SHARD_DIR に書き出す")
+    sharding.add_argument("--merge-shards", action="store_true",
+                          help="シャードの結果を状態ファイルへ反映し、銘柄間の集計・ダイジェスト送信を行う")
+    args = parser.parse_args()
+
+    if args.daemon and (args.record or args.replay or args.shard or args.merge_shards):
+        parser.error("--record / --replay / --shard / --merge-shards は --daemon と同時に指定できません")
+    # シャード実行・マージは data/shards/ と状態ファイルに書き込むため、フィクスチャの記録・再生とは併用しない
+    if (args.record or args.replay) and (args.shard or args.merge_shards):
+        parser.error("--record / --replay は --shard / --merge-shards と同時に指定できません")
+    job = {"fn": merge_shards} if args.merge_shards else {"fn": run_once, "shard": args.shard}
+
+    if args.record or args.replay:
+        fixtures.start("record" if args.record else "replay", args.record or args.replay, args.latency)
+        try:
+            _run_recorded(**job)
+        finally:
+            fixtures.finish()
+        return
+
+    if not args.daemon:
+        _run_recorded(**job)
+        return
+
+    run_daemon(args.interval)
+
+
+def run_daemon(interval):
+    """
+    一定間隔で run_once を繰り返す（1回の実行の例外はログに残して次の実行へ）
+
+    終了するのは Ctrl+C・SIGTERM・状態ファイルのスキーマ不一致（SystemExit）の場合だけ。
+    """
+    global _delivery
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"🔁 デーモンモード: {interval}秒間隔で実行（{ETFS.path.name} の更新を自動反映）\n")
+    try:
+        while True:
+            try:
+                ETFS.reload_if_changed()
+                _run_recorded()
+            except Exception as e:
+                print(f"❌ 実行エラー（{interval}秒後に再実行）: {type(e).__name__}: {e}")
+                traceback.print_exc()
+                if _delivery is not None:
+                    # 途中で止まった実行の送信キューを閉じる（送信スレッドを残さない）
+                    _delivery.close()
+                    _delivery = None
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n🛑 デーモンモードを終了します")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,411 @@
+"""
+記録・再生モード（ネットワークなしで決定的に実行するためのフィクスチャ）
+
+- record: 通常どおり実行しつつ、データソースと通知先の応答をフィクスチャディレクトリに保存
+- replay: 保存した応答を返す（yfinance・Webhook・SMTPには一切接続しない）
+- 対象の境界
+    yf.Ticker(...).history() / .dividends / .info と yf.download()（fixtures.ticker / fixtures.download 経由）
+    通知先の1回の送信（Notifier.deliver。429・5xx などの失敗も含めて記録どおりに再現）
+- 実行中の時刻（fixtures.now）は記録開始時刻に固定（再生しても日付判定・Embedのタイムスタンプが同じ）
+- 記録・再生中は履歴・為替のキャッシュを読まない（毎回データソースを呼ぶので記録漏れが起きない）
+- 再生時は状態ファイル・ヘルス記録・送信内容を <dir>/replay/ に書き出し、data/ のファイルは変更しない
+- 応答はJSONで保存（DataFrame / Series は列・インデックス・dtype・タイムゾーンごと復元）。
+  pickle を使わないので、他人から受け取ったフィクスチャを再生してもコードは実行されない
+
+ディレクトリ構成:
+    manifest.json            記録時刻・通知先・開始時の状態ファイル
+    state_before.<拡張子>    記録開始時の状態ファイル（再生はここから始める）
+    yfinance/<シンボル>/<呼び出し>-<連番>.json
+    notifications.jsonl      送信内容と結果
+    replay/                  再生結果（state・health.jsonl・notifications.jsonl）
+
+使い方:
+    cd src
+    python etf_monitor.py --record ../data/fixtures/sample
+    python etf_monitor.py --replay ../data/fixtures/sample --latency 200
+    diff ../data/fixtures/sample/notifications.jsonl ../data/fixtures/sample/replay/notifications.jsonl
+"""
+
+import builtins
+import hashlib
+import json
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import FIXTURE_LATENCY_MS
+from paths import resolve_path
+import state_store
+
+MANIFEST = "manifest.json"
+NOTIFICATIONS = "notifications.jsonl"
+REPLAY_DIR = "replay"
+DOWNLOAD_SYMBOL = "_download"
+
+
+class FixtureMissing(LookupError):
+    """再生時に対応する記録がない"""
+
+
+def _call_key(name, args, kwargs):
+    """呼び出し名＋引数のハッシュ（引数なしのプロパティは名前だけ）"""
+    if not args and not kwargs:
+        return name
+    spec = json.dumps([list(args), kwargs], sort_keys=True, default=str)
+    return f"{name}-{hashlib.sha1(spec.encode()).hexdigest()[:10]}"
+
+
+def _encode_index(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return {"type": "datetime", "values": [ts.isoformat() for ts in index],
+                "tz": str(index.tz) if index.tz is not None else None, "name": index.name}
+    if isinstance(index, pd.MultiIndex):
+        return {"type": "multi", "values": [list(v) for v in index], "names": list(index.names)}
+    return {"type": "plain", "values": index.tolist(), "name": index.name}
+
+
+def _decode_index(spec):
+    if spec["type"] == "datetime":
+        if spec["tz"] is None:
+            return pd.DatetimeIndex(pd.to_datetime(spec["values"]), name=spec["name"])
+        # 夏時間でオフセットが混在するため、いったんUTCで読んでから元のタイムゾーンに戻す
+        return pd.DatetimeIndex(pd.to_datetime(spec["values"], utc=True), name=spec["name"]).tz_convert(spec["tz"])
+    if spec["type"] == "multi":
+        return pd.MultiIndex.from_tuples([tuple(v) for v in spec["values"]], names=spec["names"])
+    return pd.Index(spec["values"], name=spec["name"])
+
+
+def _jsonable(value):
+    """json.dumps の default（numpy のスカラー・Timestamp など）"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_value(value):
+    """データソースの応答 → JSONに保存できる形（DataFrame / Series は dtype ごと）"""
+    if isinstance(value, pd.DataFrame):
+        return {
+            "type": "frame",
+            "index": _encode_index(value.index),
+            "columns": _encode_index(value.columns),
+            "dtypes": [str(t) for t in value.dtypes],
+            "data": [value.iloc[:, i].tolist() for i in range(value.shape[1])],
+        }
+    if isinstance(value, pd.Series):
+        return {"type": "series", "index": _encode_index(value.index), "name": value.name,
+                "dtype": str(value.dtype), "data": value.tolist()}
+    return {"type": "json", "value": value}
+
+
+def _decode_value(entry):
+    if entry["type"] == "frame":
+        index = _decode_index(entry["index"])
+        columns = _decode_index(entry["columns"])
+        frame = pd.DataFrame(
+            {i: pd.Series(data, index=index, dtype=dtype)
+             for i, (data, dtype) in enumerate(zip(entry["data"], entry["dtypes"]))},
+            index=index, columns=range(len(columns)),
+        )
+        frame.columns = columns
+        return frame
+    if entry["type"] == "series":
+        return pd.Series(entry["data"], index=_decode_index(entry["index"]), name=entry["name"], dtype=entry["dtype"])
+    return entry["value"]
+
+
+def _encode_error(exc):
+    return {"type": type(exc).__name__, "message": str(exc)}
+
+
+def _decode_error(error):
+    """記録した例外を再現（組み込みの例外はその型で、それ以外は RuntimeError として）"""
+    cls = getattr(builtins, error["type"], None)
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(error["message"])
+        except Exception:
+            pass
+    return RuntimeError(f"{error['type']}: {error['message']}")
+
+
+class FixtureSession:
+    """
+    記録・再生の1セッション
+
+    Args:
+        mode: "record" / "replay"
+        directory: フィクスチャディレクトリ
+        latency_ms: 再生時に各呼び出しへ加える待ち時間（ミリ秒）。"recorded" なら記録時の所要時間
+    """
+
+    def __init__(self, mode, directory, latency_ms=FIXTURE_LATENCY_MS):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知のモード: {mode}（record / replay）")
+        self.mode = mode
+        self.directory = resolve_path(directory)
+        self.latency_ms = latency_ms
+        self._calls = Counter()
+        self._lock = threading.Lock()
+
+        if mode == "record":
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.clock = datetime.now(timezone.utc)
+            self.manifest = {"recorded_at": self.clock.isoformat(), "notifiers": [], "state": None}
+            self._snapshot_state()
+            (self.directory / NOTIFICATIONS).write_text("", encoding="utf-8")
+            self._notifications = None
+        else:
+            manifest_path = self.directory / MANIFEST
+            if not manifest_path.exists():
+                raise FileNotFoundError(f"{manifest_path} がありません（先に --record で記録してください）")
+            self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            self.clock = datetime.fromisoformat(self.manifest["recorded_at"])
+            self._notifications = self._load_notifications()
+            replay_dir = self.directory / REPLAY_DIR
+            replay_dir.mkdir(exist_ok=True)
+            (replay_dir / NOTIFICATIONS).write_text("", encoding="utf-8")
+
+    # ---- 状態ファイル ----
+
+    def _snapshot_state(self):
+        path, fmt = state_store.find_state_file()
+        if path is None:
+            return
+        name = f"state_before{path.suffix}"
+        shutil.copy(path, self.directory / name)
+        self.manifest["state"] = {"file": name, "format": fmt}
+
+    def state_input(self):
+        state = self.manifest.get("state")
+        if not state:
+            return None, None
+        return self.directory / state["file"], state["format"]
+
+    # ---- 呼び出しの記録・再生 ----
+
+    def _next_path(self, symbol, key):
+        with self._lock:
+            seq = self._calls[(symbol, key)]
+            self._calls[(symbol, key)] += 1
+        return self.directory / "yfinance" / symbol / f"{key}-{seq}.json"
+
+    def _wait(self, elapsed):
+        if self.latency_ms == "recorded":
+            time.sleep(elapsed)
+        elif self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def call(self, symbol, name, fn, args=(), kwargs=None):
+        """データソースの1回の呼び出し（record: 実行して保存 / replay: 保存した結果を返す）"""
+        kwargs = kwargs or {}
+        path = self._next_path(symbol, _call_key(name, args, kwargs))
+
+        if self.mode == "replay":
+            if not path.exists():
+                raise FixtureMissing(f"{symbol}.{name} の記録がありません（{path.name}）")
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            self._wait(entry["elapsed"])
+            if "error" in entry:
+                raise _decode_error(entry["error"])
+            return _decode_value(entry["value"])
+
+        started = time.perf_counter()
+        try:
+            value = fn()
+        except Exception as e:
+            self._save_call(path, {"error": _encode_error(e)}, started)
+            raise
+        self._save_call(path, {"value": _encode_value(value)}, started)
+        return value
+
+    def _save_call(self, path, entry, started):
+        entry["elapsed"] = round(time.perf_counter() - started, 3)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, default=_jsonable)
+
+    # ---- 通知 ----
+
+    def _load_notifications(self):
+        entries = {}
+        path = self.directory / NOTIFICATIONS
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries.setdefault(entry["notifier"], []).append(entry)
+        return entries
+
+    def _append_notification(self, path, entry):
+        with self._lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def deliver(self, name, fn, payload):
+        """通知先への1回の送信（失敗は DeliveryError として記録・再現）"""
+        from notifiers import DeliveryError
+
+        body = payload if isinstance(payload, (dict, list)) else str(payload)
+        if self.mode == "replay":
+            with self._lock:
+                seq = self._calls[("notify", name)]
+                self._calls[("notify", name)] += 1
+            recorded = self._notifications.get(name, [])
+            entry = recorded[seq] if seq < len(recorded) else {"notifier": name}
+            # 記録と同じ形式で書き出す（diff で送信内容の違いだけが出る）
+            self._append_notification(self.directory / REPLAY_DIR / NOTIFICATIONS, {**entry, "payload": body})
+            if seq >= len(recorded):
+                raise DeliveryError(f"送信の記録がありません（{name} #{seq}）", retryable=False)
+            self._wait(entry["elapsed"])
+            if entry.get("error"):
+                raise DeliveryError(entry["error"], retryable=entry["retryable"], retry_after=entry["retry_after"])
+            return
+
+        entry = {"notifier": name, "payload": body}
+        started = time.perf_counter()
+        try:
+            fn(payload)
+        except DeliveryError as e:
+            entry.update(error=str(e), retryable=e.retryable, retry_after=e.retry_after)
+            raise
+        finally:
+            entry["elapsed"] = round(time.perf_counter() - started, 3)
+            self._append_notification(self.directory / NOTIFICATIONS, entry)
+
+    # ---- 終了 ----
+
+    def finish(self):
+        if self.mode == "record":
+            with open(self.directory / MANIFEST, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+
+
+class _FixtureTicker:
+    """yf.Ticker の代わり（history / dividends / info を記録・再生）"""
+
+    def __init__(self, session, symbol):
+        self._session = session
+        self.symbol = symbol
+        self._ticker = None
+
+    def _live(self):
+        # 再生時は作らない（yf.Ticker 自体は通信しないが念のため）
+        if self._ticker is None:
+            self._ticker = yf.Ticker(self.symbol)
+        return self._ticker
+
+    def history(self, *args, **kwargs):
+        return self._session.call(self.symbol, "history", lambda: self._live().history(*args, **kwargs),
+                                  args, kwargs)
+
+    @property
+    def dividends(self):
+        return self._session.call(self.symbol, "dividends", lambda: self._live().dividends)
+
+    @property
+    def info(self):
+        return self._session.call(self.symbol, "info", lambda: self._live().info)
+
+
+# 実行中のセッション（start ～ finish の間だけ有効。None なら通常の実行）
+_session = None
+
+
+def start(mode, directory, latency_ms=FIXTURE_LATENCY_MS):
+    global _session
+    _session = FixtureSession(mode, directory, latency_ms)
+    print(f"🎞️ {'記録' if mode == 'record' else '再生'}モード: {_session.directory}")
+    return _session
+
+
+def finish():
+    global _session
+    session, _session = _session, None
+    if session is not None:
+        session.finish()
+
+
+def active():
+    """記録・再生中か（キャッシュを読まずにデータソースを呼ぶ）"""
+    return _session is not None
+
+
+def replaying():
+    """再生中か（data/ のキャッシュ・状態ファイルへ書き込まない）"""
+    return _session is not None and _session.mode == "replay"
+
+
+def now(tz=None):
+    """現在時刻（記録・再生中は記録開始時刻に固定）"""
+    if _session is None:
+        return datetime.now(tz)
+    return _session.clock.astimezone(tz) if tz else _session.clock
+
+
+def ticker(symbol):
+    """yf.Ticker(symbol) の代わり"""
+    if _session is None:
+        return yf.Ticker(symbol)
+    return _FixtureTicker(_session, symbol)
+
+
+def download(symbols, **kwargs):
+    """yf.download(symbols, ...) の代わり"""
+    if _session is None:
+        return yf.download(symbols, **kwargs)
+    return _session.call(DOWNLOAD_SYMBOL, "download", lambda: yf.download(symbols, **kwargs),
+                         (sorted(symbols),), kwargs)
+
+
+def deliver(name, fn, payload):
+    """通知先の1回の送信（fn = Notifier.deliver）"""
+    if _session is None:
+        return fn(payload)
+    return _session.deliver(name, fn, payload)
+
+
+def note_notifiers(names):
+    """記録時に有効だった通知先（再生時はこの通知先だけを環境変数なしで作成する）"""
+    if _session is not None and _session.mode == "record":
+        _session.manifest["notifiers"] = list(names)
+
+
+def recorded_notifier(name):
+    """再生中で、記録時にその通知先が有効だったか"""
+    return replaying() and name in _session.manifest.get("notifiers", [])
+
+
+def state_input():
+    """
+    再生時に読み込む状態ファイル
+
+    Returns:
+        tuple or None: 再生中なら (path, fmt)（記録開始時に状態がなければ (None, None)）、それ以外は None
+    """
+    if not replaying():
+        return None
+    return _session.state_input()
+
+
+def replay_path(name):
+    """再生時の出力先（<dir>/replay/<name>）。再生中でなければ None"""
+    if not replaying():
+        return None
+    return _session.directory / REPLAY_DIR / name
@@ -0,0 +1,170 @@
+"""
+為替レート（表示通貨ごとの換算）
+
+- 必要な通貨ペア（USDJPY=X, USDEUR=X, ...）を yfinance の1回のリクエストでまとめて取得
+  取得できなかった通貨は別表記のシンボル（JPY=X, EUR=X, ...）でもう1回まとめて取得
+- 取得結果は CACHE_DIR/fx_rates.json にキャッシュ（FX_CACHE_MAX_AGE_MINUTES 以内なら再利用）
+- FxMatrix: 通貨×通貨のレート行列（matrix[i, j] = 通貨i 1単位あたりの通貨j）
+    convert(amounts) で価格・分配金を全表示通貨へまとめて換算（ベクトル演算）
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import CACHE_DIR, FX_CACHE_MAX_AGE_MINUTES
+from paths import resolve_path
+import fixtures
+import health
+
+BASE_CURRENCY = "USD"
+
+# レートの丸め桁数（円は従来どおり小数2桁）
+RATE_DIGITS = {"JPY": 2}
+DEFAULT_RATE_DIGITS = 4
+
+
+def _cache_path():
+    return resolve_path(CACHE_DIR) / "fx_rates.json"
+
+
+def fx_symbol(currency):
+    """USD→通貨 のyfinanceシンボル"""
+    return f"{BASE_CURRENCY}{currency}=X"
+
+
+def fx_alt_symbol(currency):
+    """USD→通貨 の別表記シンボル（JPY=X など。こちらも 1 USD あたりの通貨で、逆数ではない）"""
+    return f"{currency}=X"
+
+
+class FxMatrix:
+    """
+    通貨間のレート行列
+
+    Args:
+        usd_rates: 通貨 → 1 USDあたりのレート（USD自身は不要）
+        fallback: 取得できず固定レートで補った通貨
+    """
+
+    def __init__(self, usd_rates, fallback=()):
+        self.fallback = list(fallback)
+        self.currencies = (BASE_CURRENCY,) + tuple(c for c in usd_rates if c != BASE_CURRENCY)
+        self.index = {c: i for i, c in enumerate(self.currencies)}
+        rates = np.array([1.0] + [usd_rates[c] for c in self.currencies[1:]], dtype=float)
+        self.usd_rates = rates
+        self.matrix = rates[np.newaxis, :] / rates[:, np.newaxis]
+
+    def __contains__(self, currency):
+        return currency in self.index
+
+    def rate(self, to_currency, from_currency=BASE_CURRENCY):
+        """from_currency 1単位あたりの to_currency"""
+        return float(self.matrix[self.index[from_currency], self.index[to_currency]])
+
+    def convert(self, amounts, currencies=None, from_currency=BASE_CURRENCY):
+        """
+        金額をまとめて換算
+
+        Args:
+            amounts: 金額の配列（任意の形状）
+            currencies: 換算先の通貨（省略時は全通貨）
+            from_currency: 金額の通貨
+
+        Returns:
+            np.ndarray: amounts の形状 + (通貨数,)
+        """
+        row = self.matrix[self.index[from_currency]]
+        if currencies is not None:
+            row = row[[self.index[c] for c in currencies]]
+        return np.multiply.outer(np.asarray(amounts, dtype=float), row)
+
+
+def _read_cache(currencies):
+    path = _cache_path()
+    if fixtures.active() or not path.exists():
+        return None
+    age_minutes = (time.time() - path.stat().st_mtime) / 60
+    if age_minutes >= FX_CACHE_MAX_AGE_MINUTES:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            rates = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not all(c in rates for c in currencies):
+        return None
+    return {c: rates[c] for c in currencies}
+
+
+def _write_cache(rates):
+    if fixtures.replaying():
+        return
+    path = _cache_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rates, f)
+
+
+def fetch_usd_rates(currencies):
+    """
+    表示通貨のUSDレートを1回のリクエストでまとめて取得（キャッシュ優先）
+
+    Returns:
+        dict: 通貨 → 1 USDあたりのレート（取得できなかった通貨は含まない）
+    """
+    currencies = [c for c in dict.fromkeys(currencies) if c != BASE_CURRENCY]
+    if not currencies:
+        return {}
+
+    cached = _read_cache(currencies)
+    if cached is not None:
+        health.count("fx_cache_hit")
+        print(f"  為替レート（キャッシュ）: {', '.join(currencies)}")
+        return cached
+    health.count("fx_cache_miss")
+
+    rates = _download_rates(currencies, fx_symbol)
+    missing = [c for c in currencies if c not in rates]
+    if missing:
+        rates.update(_download_rates(missing, fx_alt_symbol))
+
+    if len(rates) == len(currencies):
+        _write_cache(rates)
+    return rates
+
+
+def _download_rates(currencies, symbol_of):
+    """指定シンボル表記のレートを1回のリクエストでまとめて取得（取得できた通貨だけ返す）"""
+    symbols = [symbol_of(c) for c in currencies]
+    try:
+        data = fixtures.download(symbols, period="5d", progress=False, auto_adjust=False, threads=False)
+    except Exception as e:
+        print(f"  ⚠️ 為替レート一括取得失敗 ({', '.join(symbols)}): {e}")
+        return {}
+    if data is None or data.empty:
+        print(f"  ⚠️ 為替レート一括取得失敗: データなし ({', '.join(symbols)})")
+        return {}
+
+    close = data["Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(symbols[0])
+
+    rates = {}
+    for currency, symbol in zip(currencies, symbols):
+        if symbol not in close:
+            continue
+        series = close[symbol].dropna()
+        if series.empty:
+            continue
+        rates[currency] = round(float(series.iloc[-1]), RATE_DIGITS.get(currency, DEFAULT_RATE_DIGITS))
+        print(f"  為替レート取得成功 ({symbol}): {rates[currency]}")
+    return rates
@@ -0,0 +1,238 @@
+"""
+実行ごとのヘルス記録（HEALTH_LOG_FILE = data/health.jsonl）
+
+- 1回の実行 = 1行のJSON（直近 HEALTH_LOG_MAX_RECORDS 件だけ保持）
+- 記録内容: 実行時間・ステージごとの所要時間・銘柄ごとの取得結果（試行回数・所要時間）・
+  キャッシュのヒット/ミス数・為替の固定レート使用・通知の成功/失敗数
+- run_once が begin_run() / finish_run() を呼び、各モジュールは count() などで加算するだけ
+  （実行中でなければ何もしない）
+- summary コマンドで実行をまたいだパーセンタイルを集計（前半・後半の比較で悪化傾向を確認）
+
+使い方:
+    cd src
+    python health.py summary             # 全記録
+    python health.py summary --last 30   # 直近30回
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timezone
+from pathlib import Path
+
+import numpy as np
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import HEALTH_LOG_FILE, HEALTH_LOG_MAX_RECORDS
+from paths import resolve_path
+import fixtures
+
+PERCENTILES = (50, 90, 99)
+
+
+class RunHealth:
+    """1回の実行分のヘルス記録"""
+
+    def __init__(self):
+        # 記録・再生中は記録開始時刻（再生結果のヘルス記録も記録時と同じ日時になる）
+        self.started_at = fixtures.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.tickers = {}
+        self.counters = Counter()
+        self.extra = {}
+
+    def to_record(self, status):
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "status": status,
+            "duration": round(time.perf_counter() - self._started, 3),
+            "stages": {k: round(v, 3) for k, v in self.stages.items()},
+            "tickers": self.tickers,
+            "counters": dict(self.counters),
+            **self.extra,
+        }
+
+
+# 実行中の記録（begin_run ～ finish_run の間だけ有効）
+_current = None
+
+
+def begin_run():
+    global _current
+    _current = RunHealth()
+    return _current
+
+
+@contextmanager
+def stage(name):
+    """ステージの所要時間を記録"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _current is not None:
+            _current.stages[name] = _current.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def count(name, n=1):
+    """カウンタを加算（キャッシュは <名前>_hit / <名前>_miss の組で記録）"""
+    if _current is not None:
+        _current.counters[name] += n
+
+
+def record_fetch(ticker, status, attempts=0, seconds=0.0):
+    """銘柄ごとのデータ取得結果（status: ok / failed / skipped / stale）"""
+    if _current is not None:
+        _current.tickers[ticker] = {"status": status, "attempts": attempts, "seconds": round(seconds, 3)}
+
+
+def annotate(key, value):
+    """記録に任意の項目を追加（為替の固定レート使用・通知の送信数など）"""
+    if _current is not None:
+        _current.extra[key] = value
+
+
+def append_record(record, path=HEALTH_LOG_FILE):
+    """1行追記し、上限を超えたら直近分だけを残して書き直す"""
+    path = resolve_path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    if len(lines) > HEALTH_LOG_MAX_RECORDS:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines[-HEALTH_LOG_MAX_RECORDS:])
+        os.replace(tmp, path)
+
+
+def finish_run(status="ok", path=HEALTH_LOG_FILE):
+    """
+    実行の記録を確定してログに追記（begin_run していなければ何もしない）
+
+    Returns:
+        dict or None: 追記した記録
+    """
+    global _current
+    current, _current = _current, None
+    if current is None:
+        return None
+    record = current.to_record(status)
+    try:
+        append_record(record, path)
+    except OSError as e:
+        print(f"⚠️ ヘルス記録を保存できません: {e}")
+    return record
+
+
+def load_records(path=HEALTH_LOG_FILE, last=None):
+    """ログを読み込み（壊れた行は読み飛ばす）"""
+    path = resolve_path(path)
+    if not path.exists():
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records[-last:] if last else records
+
+
+def _percentiles(values):
+    if not values:
+        return "-"
+    p = np.percentile(np.asarray(values, dtype=float), PERCENTILES)
+    return " / ".join(f"p{q} {v:.3f}s" for q, v in zip(PERCENTILES, p))
+
+
+def _trend(values):
+    """前半 → 後半の中央値（記録が4件以上ある場合）"""
+    if len(values) < 4:
+        return ""
+    half = len(values) // 2
+    before, after = np.median(values[:half]), np.median(values[half:])
+    change = (after - before) / before * 100 if before else 0.0
+    return f"  （中央値 前半 {before:.3f}s → 後半 {after:.3f}s, {change:+.0f}%）"
+
+
+def summarize(records):
+    """実行をまたいだ集計の各行"""
+    if not records:
+        return ["ヘルス記録がありません"]
+
+    lines = [
+        f"📋 {len(records)}回分（{records[0]['started_at']} ～ {records[-1]['started_at']}）",
+        f"失敗した実行: {sum(r.get('status') != 'ok' for r in records)}回",
+        "",
+        "⏱️ 実行時間",
+    ]
+    durations = [r["duration"] for r in records]
+    lines.append(f"  全体: {_percentiles(durations)}{_trend(durations)}")
+    stage_names = list(dict.fromkeys(name for r in records for name in r.get("stages", {})))
+    for name in stage_names:
+        values = [r["stages"][name] for r in records if name in r.get("stages", {})]
+        lines.append(f"  {name}: {_percentiles(values)}{_trend(values)}")
+
+    lines.extend(["", "📈 銘柄ごとのデータ取得"])
+    tickers = list(dict.fromkeys(t for r in records for t in r.get("tickers", {})))
+    for ticker in tickers:
+        entries = [r["tickers"][ticker] for r in records if ticker in r.get("tickers", {})]
+        fetched = [e for e in entries if e["status"] in ("ok", "failed")]
+        ok = sum(e["status"] == "ok" for e in fetched)
+        skipped = sum(e["status"] == "skipped" for e in entries)
+        stale = sum(e["status"] == "stale" for e in entries)
+        rate = f"{ok / len(fetched) * 100:.1f}%" if fetched else "-"
+        retries = np.mean([max(e["attempts"] - 1, 0) for e in fetched]) if fetched else 0.0
+        lines.append(
+            f"  {ticker}: 成功率 {rate}（{ok}/{len(fetched)}）, 平均リトライ {retries:.2f}回, "
+            f"取得時間 {_percentiles([e['seconds'] for e in fetched])}, スキップ {skipped}回, 前回データ {stale}回"
+        )
+
+    lines.extend(["", "🗄️ キャッシュヒット率"])
+    totals = Counter()
+    for r in records:
+        totals.update(r.get("counters", {}))
+    caches = sorted({name.rsplit("_", 1)[0] for name in totals if name.endswith(("_hit", "_miss"))})
+    for cache in caches:
+        hit, miss = totals[f"{cache}_hit"], totals[f"{cache}_miss"]
+        lines.append(f"  {cache}: {hit / (hit + miss) * 100:.1f}%（{hit}/{hit + miss}）")
+    others = {k: v for k, v in totals.items() if not k.endswith(("_hit", "_miss"))}
+    for name, value in sorted(others.items()):
+        lines.append(f"  {name}: 合計 {value}")
+
+    fallback_runs = sum(bool(r.get("fx_fallback")) for r in records)
+    sent = sum(r.get("notifications", {}).get("sent", 0) for r in records)
+    failed = sum(r.get("notifications", {}).get("failed", 0) for r in records)
+    lines.extend([
+        "",
+        f"💱 為替の固定レート使用: {fallback_runs}回（{fallback_runs / len(records) * 100:.1f}%）",
+        f"📨 通知: 成功 {sent}件 / 失敗 {failed}件",
+    ])
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="実行ヘルス記録の集計")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_summary = sub.add_parser("summary", help="実行をまたいだパーセンタイルを表示")
+    p_summary.add_argument("--last", type=int, default=None, help="直近N回分だけ集計")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        print("\n".join(summarize(load_records(last=args.last))))
+
+
+if __name__ == "__main__":
+    main()
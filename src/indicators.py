@@ -0,0 +1,245 @@
+"""
+利回りの統計指標（インクリメンタル更新）
+
+- パーセンタイル: 全履歴の日次TTM利回りに対する現在の利回りの順位
+    利回りを INDICATOR_BUCKET_WIDTH 刻みの度数にしてフェニック木（BIT）で保持
+    追加・順位計算とも O(log 刻み数)
+- Zスコア: 直近 INDICATOR_ZSCORE_WINDOW 営業日の平均・標準偏差
+    Welford法で平均・偏差平方和を保持し、ウィンドウから外れた値を取り除く（O(1)）
+- 状態は CACHE_DIR/{ticker}_indicators.json に保存し、次回は前回以降に追加された日だけを反映
+  （初回・設定変更時・履歴の開始日が変わった時は履歴キャッシュから一括で再構築）
+  （再生モードでは状態を読み書きせず毎回構築）
+- 利回り = TTM分配金 ÷ 終値 はどちらも分割調整済みのため、株式分割後も過去の値は変わらない
+"""
+
+import json
+import math
+import sys
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import CACHE_DIR, INDICATOR_ZSCORE_WINDOW, INDICATOR_BUCKET_WIDTH, INDICATOR_MAX_YIELD
+from paths import resolve_path
+from yield_history import dividend_series, ttm_dividends
+import fixtures
+import health
+
+
+def _state_path(ticker):
+    return resolve_path(CACHE_DIR) / f"{ticker}_indicators.json"
+
+
+class FenwickTree:
+    """度数のフェニック木（点加算・累積和とも O(log n)）"""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """度数配列から O(n) で構築"""
+        fenwick = cls(len(counts))
+        tree = fenwick.tree
+        for i, c in enumerate(counts, start=1):
+            tree[i] += int(c)
+            parent = i + (i & -i)
+            if parent <= fenwick.size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def add(self, index, delta=1):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """0～index の度数の合計"""
+        total = 0
+        i = index + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class YieldIndicators:
+    """
+    1銘柄分の利回り統計
+
+    Args:
+        window: Zスコアのウィンドウ（営業日数）
+        bucket_width: パーセンタイルの利回りの刻み（%）
+        max_yield: 最上位の刻みの下限（%）
+    """
+
+    def __init__(self, window=INDICATOR_ZSCORE_WINDOW, bucket_width=INDICATOR_BUCKET_WIDTH,
+                 max_yield=INDICATOR_MAX_YIELD):
+        self.window = window
+        self.bucket_width = bucket_width
+        self.max_yield = max_yield
+        self.buckets = int(round(max_yield / bucket_width)) + 1
+        self.fenwick = FenwickTree(self.buckets)
+        self.total = 0
+        self.first_date = None
+        self.last_date = None
+        # Zスコア用（Welford法）
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @property
+    def params(self):
+        return {"window": self.window, "bucket_width": self.bucket_width, "max_yield": self.max_yield}
+
+    def _bucket(self, value):
+        return min(max(int(round(value / self.bucket_width)), 0), self.buckets - 1)
+
+    def push(self, value):
+        """1日分の利回りを追加"""
+        self.fenwick.add(self._bucket(value))
+        self.total += 1
+
+        self.values.append(value)
+        delta = value - self.mean
+        self.mean += delta / len(self.values)
+        self.m2 += delta * (value - self.mean)
+
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            n = len(self.values)
+            delta = old - self.mean
+            self.mean -= delta / n
+            self.m2 = max(self.m2 - delta * (old - self.mean), 0.0)
+
+    def percentile(self, value):
+        """全履歴のうち value 以下だった日の割合（%）"""
+        if self.total == 0:
+            return None
+        return self.fenwick.prefix(self._bucket(value)) / self.total * 100
+
+    def zscore(self, value):
+        """直近ウィンドウの平均・標準偏差に対するZスコア"""
+        n = len(self.values)
+        if n < 2:
+            return None
+        std = math.sqrt(self.m2 / (n - 1))
+        if std == 0:
+            return None
+        return (value - self.mean) / std
+
+    @classmethod
+    def build(cls, values, **params):
+        """履歴全体から一括で構築（度数は bincount、ウィンドウの統計は numpy で計算）"""
+        engine = cls(**params)
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return engine
+        buckets = np.clip(np.rint(values / engine.bucket_width).astype(int), 0, engine.buckets - 1)
+        engine.fenwick = FenwickTree.from_counts(np.bincount(buckets, minlength=engine.buckets))
+        engine.total = len(values)
+
+        recent = values[-engine.window:]
+        engine.values = deque(recent.tolist())
+        engine.mean = float(recent.mean())
+        engine.m2 = float(((recent - engine.mean) ** 2).sum())
+        return engine
+
+    def to_dict(self):
+        return {
+            **self.params,
+            "first_date": self.first_date,
+            "last_date": self.last_date,
+            "total": self.total,
+            "tree": self.fenwick.tree,
+            "values": list(self.values),
+            "mean": self.mean,
+            "m2": self.m2,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        engine = cls(d["window"], d["bucket_width"], d["max_yield"])
+        if len(d["tree"]) != engine.buckets + 1:
+            raise ValueError("度数の刻み数が一致しません")
+        engine.fenwick.tree = d["tree"]
+        engine.total = d["total"]
+        engine.first_date = d["first_date"]
+        engine.last_date = d["last_date"]
+        engine.values = deque(d["values"])
+        engine.mean = d["mean"]
+        engine.m2 = d["m2"]
+        return engine
+
+
+def _daily_yields(frame, dividends, dates):
+    """指定日の日次TTM利回り（%）。分配金実績がまだない日（利回り0）は除外"""
+    close = frame.loc[dates, "Close"].to_numpy(dtype=float)
+    ttm = ttm_dividends(dates.to_numpy(), dividends)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = ttm / close * 100
+    return values[np.isfinite(values) & (values > 0)]
+
+
+def _load(ticker):
+    path = _state_path(ticker)
+    if fixtures.replaying() or not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            engine = YieldIndicators.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"  ⚠️ {ticker}: 指標の状態を読み込めません（再構築）: {e}")
+        return None
+    return engine if engine.params == YieldIndicators().params else None
+
+
+def _save(ticker, engine):
+    if fixtures.replaying():
+        return
+    path = _state_path(ticker)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(engine.to_dict(), f)
+
+
+def update_indicators(ticker, frame, dividends=None):
+    """
+    履歴キャッシュの新しい日を反映した指標を返す（状態は保存して次回に引き継ぐ）
+
+    Args:
+        frame: yield_history.load_history() の日次系列
+        dividends: dividend_series(frame)（計算済みなら渡す）
+
+    Returns:
+        YieldIndicators
+    """
+    if dividends is None:
+        dividends = dividend_series(frame)
+
+    engine = _load(ticker)
+    first_date = frame.index[0].date().isoformat()
+    if engine is None or engine.first_date != first_date:
+        health.count("indicator_cache_miss")
+        values = _daily_yields(frame, dividends, frame.index)
+        engine = YieldIndicators.build(values)
+        engine.first_date = first_date
+        print(f"  📐 {ticker}: 利回り指標を構築（{engine.total}日）")
+    else:
+        health.count("indicator_cache_hit")
+        new_dates = frame.index[frame.index > np.datetime64(engine.last_date)]
+        values = _daily_yields(frame, dividends, new_dates)
+        for value in values:
+            engine.push(float(value))
+
+    if len(frame.index):
+        engine.last_date = frame.index[-1].date().isoformat()
+    _save(ticker, engine)
+    return engine
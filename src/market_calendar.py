@@ -0,0 +1,196 @@
+"""
+NYSE取引カレンダー
+
+- 祝日ルール＋臨時休場日からオフラインで生成し data/nyse_calendar.json に保存（リポジトリ管理）
+- 読み込み時に「その日以前の直近取引日」表を作り、以降の参照はすべてO(1)
+    is_trading_day(d)            : 取引日か
+    last_session_on_or_before(d) : d以前の直近取引日
+    expected_last_session(now)   : 現在時刻で最新データが出ているはずの取引日
+- 範囲外の日付では None を返す（呼び出し側は従来どおりの判定にフォールバック）
+- 半日取引（短縮取引）は考慮しない（実行はUTC 22:00＝通常の引け後のため）
+
+使い方:
+    cd src
+    python market_calendar.py build --start 2000 --end 2035   # カレンダー再生成
+"""
+
+import argparse
+import json
+import sys
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import MARKET_CALENDAR_FILE, MARKET_DATA_DELAY_MINUTES
+from paths import resolve_path
+
+NEW_YORK = ZoneInfo("America/New_York")
+MARKET_CLOSE = time(16, 0)
+
+# 祝日ルール以外の臨時休場日
+SPECIAL_CLOSURES = [
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),  # 同時多発テロ
+    date(2004, 6, 11),    # レーガン元大統領国葬
+    date(2007, 1, 2),     # フォード元大統領国葬
+    date(2012, 10, 29), date(2012, 10, 30),  # ハリケーン・サンディ
+    date(2018, 12, 5),    # ブッシュ（父）元大統領国葬
+    date(2025, 1, 9),     # カーター元大統領国葬
+]
+
+
+def _nth_weekday(year, month, weekday, n):
+    """その月の第n weekday（n=-1 で最終）"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """復活祭の日付（グレゴリオ暦・匿名アルゴリズム）"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(d):
+    """土曜→金曜、日曜→月曜に振替"""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def nyse_holidays(year):
+    """NYSEの祝日（ルールベース）"""
+    holidays = set()
+
+    # 元日: 日曜なら月曜に振替。土曜の場合は前年12/31に振り替えない（NYSEルール）
+    new_year = date(year, 1, 1)
+    if new_year.weekday() == 6:
+        holidays.add(new_year + timedelta(days=1))
+    elif new_year.weekday() < 5:
+        holidays.add(new_year)
+
+    holidays.add(_nth_weekday(year, 1, 0, 3))            # キング牧師記念日（1月第3月曜）
+    holidays.add(_nth_weekday(year, 2, 0, 3))            # 大統領の日（2月第3月曜）
+    holidays.add(_easter(year) - timedelta(days=2))      # 聖金曜日
+    holidays.add(_nth_weekday(year, 5, 0, -1))           # メモリアルデー（5月最終月曜）
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))       # ジューンティーンス
+    holidays.add(_observed(date(year, 7, 4)))            # 独立記念日
+    holidays.add(_nth_weekday(year, 9, 0, 1))            # レイバーデー（9月第1月曜）
+    holidays.add(_nth_weekday(year, 11, 3, 4))           # 感謝祭（11月第4木曜）
+    holidays.add(_observed(date(year, 12, 25)))          # クリスマス
+    return holidays
+
+
+def build_calendar(start_year, end_year):
+    """取引日ビット列（1日1文字: '1'=取引日）を生成"""
+    start = date(start_year, 1, 1)
+    end = date(end_year, 12, 31)
+    closed = set(SPECIAL_CLOSURES)
+    for year in range(start_year, end_year + 1):
+        closed |= nyse_holidays(year)
+
+    days = []
+    d = start
+    while d <= end:
+        days.append("1" if d.weekday() < 5 and d not in closed else "0")
+        d += timedelta(days=1)
+    return {"exchange": "NYSE", "start": start.isoformat(), "end": end.isoformat(), "days": "".join(days)}
+
+
+class MarketCalendar:
+    """事前生成した取引日ビット列によるO(1)参照"""
+
+    def __init__(self, start, days):
+        self.start = start
+        self._is_open = [c == "1" for c in days]
+        # 各日について、その日以前の直近取引日のオフセット（なければ -1）
+        self._last_session = []
+        last = -1
+        for i, is_open in enumerate(self._is_open):
+            if is_open:
+                last = i
+            self._last_session.append(last)
+
+    @classmethod
+    def load(cls, path=MARKET_CALENDAR_FILE):
+        with open(resolve_path(path), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        return cls(date.fromisoformat(raw["start"]), raw["days"])
+
+    def _offset(self, d):
+        i = (d - self.start).days
+        return i if 0 <= i < len(self._is_open) else None
+
+    def is_trading_day(self, d):
+        """取引日か（範囲外は None）"""
+        i = self._offset(d)
+        return None if i is None else self._is_open[i]
+
+    def last_session_on_or_before(self, d):
+        """d以前の直近取引日（範囲外は None）"""
+        i = self._offset(d)
+        if i is None or self._last_session[i] < 0:
+            return None
+        return self.start + timedelta(days=self._last_session[i])
+
+    def expected_last_session(self, now=None):
+        """
+        現在時刻で日足データが出ているはずの最新取引日
+
+        引け（16:00 ET）＋ MARKET_DATA_DELAY_MINUTES を過ぎていれば当日、そうでなければ前営業日。
+        """
+        now_ny = (now or datetime.now(NEW_YORK)).astimezone(NEW_YORK)
+        today = now_ny.date()
+        ready = datetime.combine(today, MARKET_CLOSE, NEW_YORK) + timedelta(minutes=MARKET_DATA_DELAY_MINUTES)
+        if now_ny < ready:
+            today -= timedelta(days=1)
+        return self.last_session_on_or_before(today)
+
+
+def load_calendar():
+    """カレンダーを読み込み（ファイルがなければ None＝従来どおりの判定）"""
+    try:
+        return MarketCalendar.load()
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ 取引カレンダーを読み込めません（従来の判定を使用）: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NYSE取引カレンダーの生成")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="data/nyse_calendar.json を生成")
+    p_build.add_argument("--start", type=int, default=2000)
+    p_build.add_argument("--end", type=int, default=2035)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        calendar = build_calendar(args.start, args.end)
+        path = resolve_path(MARKET_CALENDAR_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(calendar, f)
+            f.write("\n")
+        print(f"✅ {path}: {calendar['start']} ～ {calendar['end']}（取引日 {calendar['days'].count('1')}日）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+通知先バックエンドと共通の送信キュー
+
+- Notifier: バックエンド共通インターフェース（convert → deliver、リトライ付き send）
+- DiscordNotifier / SlackNotifier / WebhookNotifier / EmailNotifier
+- DeliveryQueue: 全バックエンド共通の送信キュー
+  - Embedは投入時にバックエンドごとに1回だけ変換
+  - バックエンドごとに専用のワーカー（concurrency 本）で並行送信
+    （チャンネルを増やしても実行時間は足し算にならない。concurrency=1 なら送信順を保持）
+  - バックエンドごとに接続プール・タイムアウト・リトライ設定・表示通貨を持つ
+
+URL・SMTPホスト等は環境変数から取得するため、ローカルのスタブサーバー
+（例: http://127.0.0.1:8000/）を指定すればネットワークなしで動作確認できる。
+"""
+
+import os
+import smtplib
+from abc import ABC, abstractmethod
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from embeds import CURRENCY_FORMATS, localize
+import fixtures
+
+
+class DeliveryError(Exception):
+    """送信失敗（retryable=True ならリトライ対象）"""
+
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class Notifier(ABC):
+    """
+    通知バックエンドの基底クラス（convert / deliver が未実装のバックエンドは作成時に TypeError）
+
+    Args:
+        name: ログ表示用の名前
+        timeout: 1回の送信のタイムアウト（秒）
+        retries: 失敗時の最大リトライ回数
+        backoff: リトライ間隔の基準（秒、指数的に増加）
+        concurrency: 同時送信数（接続プールのサイズ）
+        currency: 価格の表示通貨
+    """
+    kind = "base"
+
+    def __init__(self, name=None, timeout=10, retries=3, backoff=2.0, concurrency=1, currency="JPY"):
+        self.name = name or self.kind
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.currency = currency
+
+    @abstractmethod
+    def convert(self, embed):
+        """Discord Embed → バックエンド固有の形式"""
+
+    @abstractmethod
+    def deliver(self, payload):
+        """1回送信（失敗時は DeliveryError）"""
+
+    def close(self):
+        pass
+
+    def send(self, payload):
+        """リトライ付き送信"""
+        for attempt in range(self.retries + 1):
+            try:
+                # 記録・再生モードでは fixtures を経由（再生時は実際には送信しない）
+                fixtures.deliver(self.name, self.deliver, payload)
+                return True
+            except DeliveryError as e:
+                if not e.retryable or attempt == self.retries:
+                    print(f"❌ {self.name} 通知送信失敗: {e}")
+                    return False
+                wait = e.retry_after if e.retry_after is not None else self.backoff * (2 ** attempt)
+                print(f"  ⏳ {self.name}: {wait:.1f}秒後にリトライ ({attempt + 1}/{self.retries}) - {e}")
+                time.sleep(wait)
+        return False
+
+
+class HttpNotifier(Notifier):
+    """HTTP POST系バックエンドの共通処理（セッション・接続プール・ステータス判定）"""
+    kind = "http"
+
+    def __init__(self, url, headers=None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def deliver(self, payload):
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise DeliveryError(str(e)) from e
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise DeliveryError("429 Too Many Requests",
+                                retry_after=float(retry_after) if retry_after else None)
+        if response.status_code >= 500:
+            raise DeliveryError(f"{response.status_code} {response.reason}")
+        if response.status_code >= 400:
+            raise DeliveryError(f"{response.status_code} {response.reason}", retryable=False)
+
+    def close(self):
+        self.session.close()
+
+
+class DiscordNotifier(HttpNotifier):
+    kind = "discord"
+
+    def convert(self, embed):
+        return {"embeds": [embed]}
+
+
+class WebhookNotifier(HttpNotifier):
+    """汎用HTTP Webhook（Embedの内容をそのままJSONで送信）"""
+    kind = "webhook"
+
+    def convert(self, embed):
+        return {
+            "title": embed.get("title"),
+            "description": embed.get("description"),
+            "color": embed.get("color"),
+            "fields": [{"name": f["name"], "value": f["value"]} for f in embed.get("fields", [])],
+            "timestamp": embed.get("timestamp"),
+            "source": (embed.get("footer") or {}).get("text"),
+        }
+
+
+def _to_mrkdwn(text):
+    """Discordの太字（**x**）をSlackの太字（*x*）に変換"""
+    return text.replace("**", "*")
+
+
+class SlackNotifier(HttpNotifier):
+    """Slack Incoming Webhook（attachments形式）"""
+    kind = "slack"
+
+    def convert(self, embed):
+        attachment = {
+            "color": f"#{embed.get('color', 0):06X}",
+            "title": embed.get("title"),
+            "text": _to_mrkdwn(embed.get("description", "")),
+            "fields": [
+                {"title": f["name"], "value": _to_mrkdwn(f["value"]), "short": f.get("inline", False)}
+                for f in embed.get("fields", [])
+            ],
+            "footer": (embed.get("footer") or {}).get("text"),
+            "mrkdwn_in": ["text", "fields"],
+        }
+        return {"text": embed.get("title", ""), "attachments": [attachment]}
+
+
+class EmailNotifier(Notifier):
+    """SMTPでメール送信（1回の実行中はSMTP接続を使い回す）"""
+    kind = "email"
+
+    def __init__(self, host, port, sender, recipients, user=None, password=None, starttls=True, **kwargs):
+        kwargs["concurrency"] = 1  # SMTP接続はスレッド間で共有できない
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def convert(self, embed):
+        msg = EmailMessage()
+        msg["Subject"] = embed.get("title", "ETF利回り監視Bot")
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(self.recipients)
+        lines = [embed.get("description", "").replace("**", ""), ""]
+        for f in embed.get("fields", []):
+            lines.append(f"{f['name']}: {f['value'].replace('**', '')}")
+        footer = (embed.get("footer") or {}).get("text")
+        if footer:
+            lines.extend(["", f"-- {footer}"])
+        msg.set_content("\n".join(lines))
+        return msg
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        return smtp
+
+    def deliver(self, payload):
+        with self._lock:
+            try:
+                if self._smtp is None:
+                    self._smtp = self._connect()
+                self._smtp.send_message(payload)
+            except smtplib.SMTPRecipientsRefused as e:
+                raise DeliveryError(str(e), retryable=False) from e
+            except (smtplib.SMTPException, OSError) as e:
+                self._close_connection()
+                raise DeliveryError(str(e)) from e
+
+    def _close_connection(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def close(self):
+        with self._lock:
+            self._close_connection()
+
+
+class DeliveryQueue:
+    """全バックエンド共通の送信キュー"""
+
+    def __init__(self, notifiers):
+        self.notifiers = notifiers
+        self._lanes = [
+            (n, ThreadPoolExecutor(max_workers=n.concurrency, thread_name_prefix=f"notify-{n.name}"))
+            for n in notifiers
+        ]
+        self._futures = []
+
+    @property
+    def currencies(self):
+        """通知先の表示通貨（重複なし・設定順）"""
+        return tuple(dict.fromkeys(n.currency for n in self.notifiers))
+
+    def submit(self, embed, currency=None):
+        """
+        Embedを全バックエンドの送信待ちに追加（変換はバックエンドごとに1回）
+
+        Args:
+            embed: Embed（または CurrencyEmbeds。通知先の表示通貨のものを送る）
+            currency: 指定した場合はその表示通貨の通知先にだけ送る
+        """
+        if not self._lanes:
+            print("⚠️ 通知先が設定されていません")
+            return False
+        for notifier, executor in self._lanes:
+            if currency is not None and notifier.currency != currency:
+                continue
+            try:
+                payload = notifier.convert(localize(embed, notifier.currency))
+            except Exception as e:
+                print(f"❌ {notifier.name} 形式変換失敗: {e}")
+                continue
+            self._futures.append((notifier, executor.submit(notifier.send, payload)))
+        return True
+
+    def flush(self):
+        """
+        送信待ちがすべて完了するまで待つ
+
+        Returns:
+            tuple: (成功数, 失敗数)
+        """
+        sent = failed = 0
+        for notifier, future in self._futures:
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"❌ {notifier.name} 通知送信エラー: {e}")
+                ok = False
+            if ok:
+                sent += 1
+            else:
+                failed += 1
+        self._futures = []
+        return sent, failed
+
+    def close(self):
+        self.flush()
+        for notifier, executor in self._lanes:
+            executor.shutdown(wait=True)
+            notifier.close()
+
+
+def _env(spec, key, placeholder=False):
+    """
+    設定値を取得（<key>_env があれば環境変数から）
+
+    placeholder=True の場合、環境変数が未設定なら仮の値を返す
+    （再生モードで記録時に有効だった通知先を、URL等なしで作成するため）
+    """
+    env_name = spec.get(f"{key}_env")
+    if env_name:
+        value = os.environ.get(env_name) or None
+        if value is None and placeholder:
+            value = f"replay:{env_name}"
+        return value
+    return spec.get(key)
+
+
+def build_notifier(spec, defaults):
+    """
+    config.NOTIFIERS の1エントリからバックエンドを作成
+
+    Returns:
+        Notifier or None: 必要な設定（URL等）がない場合は None
+    """
+    kind = spec["type"]
+    options = {**defaults, **{k: spec[k] for k in ("name", "timeout", "retries", "backoff", "concurrency", "currency") if k in spec}}
+    if options.get("currency", "JPY") not in CURRENCY_FORMATS:
+        raise ValueError(f"未知の表示通貨: {options['currency']}（{', '.join(CURRENCY_FORMATS)} のいずれか）")
+    placeholder = fixtures.recorded_notifier(options.get("name") or kind)
+
+    if kind in ("discord", "slack", "webhook"):
+        url = _env(spec, "url", placeholder)
+        if not url:
+            print(f"⚠️ {spec.get('name', kind)}: {spec.get('url_env', 'url')} が設定されていません")
+            return None
+        cls = {"discord": DiscordNotifier, "slack": SlackNotifier, "webhook": WebhookNotifier}[kind]
+        return cls(url, headers=spec.get("headers"), **options)
+
+    if kind == "email":
+        host = _env(spec, "host", placeholder)
+        recipients = _env(spec, "to", placeholder)
+        sender = _env(spec, "from", placeholder)
+        if not (host and recipients and sender):
+            print(f"⚠️ {spec.get('name', kind)}: SMTPホスト・送信元・宛先のいずれかが設定されていません")
+            return None
+        return EmailNotifier(
+            host, int(_env(spec, "port") or 587), sender,
+            [r.strip() for r in recipients.split(",") if r.strip()],
+            user=_env(spec, "user"), password=_env(spec, "password"),
+            starttls=spec.get("starttls", True), **options,
+        )
+
+    raise ValueError(f"未知の通知先タイプ: {kind}")
+
+
+def build_delivery_queue(specs, defaults):
+    """設定済みのバックエンドだけで送信キューを作成"""
+    notifiers = [n for n in (build_notifier(spec, defaults) for spec in specs) if n is not None]
+    return DeliveryQueue(notifiers)
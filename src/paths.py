@@ -0,0 +1,15 @@
+"""
+データファイルのパス解決（依存なし。どのモジュールからでも循環importにならない）
+"""
+
+from pathlib import Path
+
+# リポジトリルート（src/ の親）
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def resolve_path(path_str):
+    """相対パスはリポジトリルート基準で解決"""
+    if not str(path_str).startswith('/'):
+        return ROOT_DIR / path_str
+    return Path(path_str)
@@ -0,0 +1,137 @@
+"""
+分配金の支払いスケジュール（履歴キャッシュのex-dateから次回の時期を推定）
+
+- 支払い間隔: 直近 DIVIDEND_SCHEDULE_LOOKBACK 回のex-dateの間隔の中央値
+- いつもの月・日: 直近1年分（年間の支払い回数分）のex-dateの月と、日の中央値
+- 次回の想定ex-date: 前回ex-dateから間隔の半分以上あけた後の、いつもの月・日で最初に来る日
+  （月1回より頻繁な銘柄は 前回ex-date + 間隔）
+- 想定ex-dateの前後（DIVIDEND_WINDOW_BEFORE_DAYS / DIVIDEND_WINDOW_AFTER_DAYS、間隔の1/4まで）だけ
+  全期間の履歴（分配金込み）を再取得し、それ以外の実行は株価の取得だけで済ませる
+- 期間を過ぎても新しい分配金がなければ「遅延」（DIVIDEND_REFRESH_MAX_DAYS ごとに再確認）
+"""
+
+import sys
+from calendar import monthrange
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import (
+    CACHE_MAX_AGE_HOURS, DIVIDEND_SCHEDULE_MIN_PAYOUTS, DIVIDEND_SCHEDULE_LOOKBACK,
+    DIVIDEND_WINDOW_BEFORE_DAYS, DIVIDEND_WINDOW_AFTER_DAYS, DIVIDEND_REFRESH_MAX_DAYS,
+)
+
+# これより間隔が短い銘柄（週次など）は「いつもの月・日」を使わない
+MIN_MONTHLY_SPACING_DAYS = 25
+
+
+class PayoutSchedule:
+    """
+    1銘柄分の分配金スケジュール
+
+    Args:
+        ex_dates: 過去のex-date（date、昇順）
+    """
+
+    def __init__(self, ex_dates):
+        self.ex_dates = list(ex_dates)
+        self.last_ex_date = self.ex_dates[-1]
+
+        recent = self.ex_dates[-(DIVIDEND_SCHEDULE_LOOKBACK + 1):]
+        intervals = np.diff([d.toordinal() for d in recent])
+        self.spacing_days = float(np.median(intervals))
+        self.per_year = max(1, round(365.25 / self.spacing_days))
+
+        last_year = self.ex_dates[-self.per_year:]
+        self.months = sorted({d.month for d in last_year})
+        self.day = int(np.median([d.day for d in last_year]))
+
+    @classmethod
+    def from_dividends(cls, dividends):
+        """
+        分配金系列（dividend_series）から作成
+
+        Returns:
+            PayoutSchedule or None: 分配金履歴が DIVIDEND_SCHEDULE_MIN_PAYOUTS 回未満なら None
+        """
+        if len(dividends) < DIVIDEND_SCHEDULE_MIN_PAYOUTS:
+            return None
+        return cls([ts.date() for ts in dividends.index])
+
+    def next_expected(self):
+        """次回の想定ex-date"""
+        earliest = self.last_ex_date + timedelta(days=self.spacing_days / 2)
+        if self.spacing_days >= MIN_MONTHLY_SPACING_DAYS:
+            year, month = earliest.year, earliest.month
+            for _ in range(24):
+                if month in self.months:
+                    candidate = date(year, month, min(self.day, monthrange(year, month)[1]))
+                    if candidate >= earliest:
+                        return candidate
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return self.last_ex_date + timedelta(days=round(self.spacing_days))
+
+    def window(self):
+        """分配金を再取得する期間 (開始日, 終了日)"""
+        expected = self.next_expected()
+        margin = self.spacing_days / 4
+        before = timedelta(days=min(DIVIDEND_WINDOW_BEFORE_DAYS, margin))
+        after = timedelta(days=min(DIVIDEND_WINDOW_AFTER_DAYS, margin))
+        return expected - before, expected + after
+
+    def status(self, today):
+        """"idle"（想定時期の前）/ "window"（想定時期）/ "overdue"（想定時期を過ぎても分配金なし）"""
+        start, end = self.window()
+        if today < start:
+            return "idle"
+        if today <= end:
+            return "window"
+        return "overdue"
+
+    def summary(self, today):
+        """etf_data・状態ファイル・通知用の要約"""
+        start, end = self.window()
+        return {
+            "last_ex_date": self.last_ex_date.isoformat(),
+            "next_ex_date": self.next_expected().isoformat(),
+            "window": [start.isoformat(), end.isoformat()],
+            "spacing_days": round(self.spacing_days),
+            "months": self.months,
+            "status": self.status(today),
+        }
+
+
+def refresh_reason(schedule, today, fetched_at, now=None):
+    """
+    全期間の履歴（分配金込み）を再取得すべき理由
+
+    Args:
+        schedule: キャッシュの分配金から作った PayoutSchedule（None なら履歴不足）
+        today: 最新の取引日
+        fetched_at: 前回の全期間取得の日時（不明なら None）
+
+    Returns:
+        str or None: 再取得不要なら None
+    """
+    now = now or datetime.now(timezone.utc)
+    if fetched_at is None:
+        return "前回の全期間取得の日時が不明"
+    age = now - fetched_at
+    if age < timedelta(hours=CACHE_MAX_AGE_HOURS):
+        return None
+    if schedule is None:
+        return "分配金の履歴が少ないためスケジュールを推定できない"
+
+    status = schedule.status(today)
+    if status == "window":
+        return f"分配金の想定時期（想定ex-date {schedule.next_expected()}）"
+    if age >= timedelta(days=DIVIDEND_REFRESH_MAX_DAYS):
+        if status == "overdue":
+            return f"分配金の遅延を再確認（想定ex-date {schedule.next_expected()}）"
+        return f"前回の全期間取得から{age.days}日経過"
+    return None
@@ -0,0 +1,103 @@
+"""
+ポートフォリオ全体の集計（全銘柄の処理が終わった後に1回だけ実行）
+
+- 利回りスプレッド行列: spreads[i, j] = 利回り[i] − 利回り[j]（n×n をNumPyで一括計算）
+- 利回り順位: ユニバース内で利回りの高い順に1位
+- config.SPREAD_ALERTS のルールをスプレッド行列へのマスク演算で評価
+  （"*" を使うと全ペアが対象。数百銘柄でもPythonのループは使わない）
+"""
+
+import numpy as np
+
+RULE_KEYS = frozenset({"long", "short", "above", "below"})
+
+
+def validate_spread_rules(rules):
+    """
+    SPREAD_ALERTS を検証（問題があればまとめて ValueError）
+    """
+    problems = []
+    for i, rule in enumerate(rules):
+        unknown = rule.keys() - RULE_KEYS
+        if unknown:
+            problems.append(f"SPREAD_ALERTS[{i}]: 未知のキー {sorted(unknown)}")
+        if not rule.get("long") or not rule.get("short"):
+            problems.append(f"SPREAD_ALERTS[{i}]: long と short が必要です")
+        if ("above" in rule) == ("below" in rule):
+            problems.append(f"SPREAD_ALERTS[{i}]: above と below のどちらか一方を指定してください")
+        for key in ("above", "below"):
+            if key in rule and not isinstance(rule[key], (int, float)):
+                problems.append(f"SPREAD_ALERTS[{i}]: {key} は数値である必要があります（{rule[key]!r}）")
+    if problems:
+        raise ValueError("スプレッドアラート設定の検証エラー:\n  " + "\n  ".join(problems))
+
+
+class PortfolioSnapshot:
+    """
+    1回の実行終了時点の全銘柄の利回り
+
+    Args:
+        tickers: ティッカーのリスト
+        yields: 各ティッカーの利回り（%）
+    """
+
+    def __init__(self, tickers, yields):
+        self.tickers = list(tickers)
+        self.index = {t: i for i, t in enumerate(self.tickers)}
+        self.yields = np.asarray(yields, dtype=float)
+        self.spreads = self.yields[:, np.newaxis] - self.yields[np.newaxis, :]
+
+        order = np.argsort(-self.yields, kind="stable")
+        self.ranks = np.empty(len(self.tickers), dtype=int)
+        self.ranks[order] = np.arange(1, len(self.tickers) + 1)
+
+    def ranking(self):
+        """利回りの高い順の [(ticker, 利回り, 順位), ...]"""
+        order = np.argsort(self.ranks)
+        return [(self.tickers[i], float(self.yields[i]), int(self.ranks[i])) for i in order]
+
+    def _axis_mask(self, ticker):
+        """"*" なら全銘柄、それ以外はその銘柄だけ（ユニバースにない場合は None）"""
+        mask = np.zeros(len(self.tickers), dtype=bool)
+        if ticker == "*":
+            mask[:] = True
+        elif ticker in self.index:
+            mask[self.index[ticker]] = True
+        else:
+            return None
+        return mask
+
+    def evaluate(self, rules):
+        """
+        スプレッドアラートのルールを評価
+
+        Returns:
+            list: 成立中のアラート [{"key", "long", "short", "spread", "condition"}, ...]
+        """
+        alerts = []
+        off_diagonal = ~np.eye(len(self.tickers), dtype=bool)
+        for rule in rules:
+            rows = self._axis_mask(rule["long"])
+            cols = self._axis_mask(rule["short"])
+            if rows is None or cols is None:
+                continue
+            if "above" in rule:
+                op, limit = "above", rule["above"]
+                hit = self.spreads >= limit
+                condition = f"≥ {limit:+.2f}%"
+            else:
+                op, limit = "below", rule["below"]
+                hit = self.spreads <= limit
+                condition = f"≤ {limit:+.2f}%"
+            hit &= rows[:, np.newaxis] & cols[np.newaxis, :] & off_diagonal
+            for i, j in np.argwhere(hit):
+                long, short = self.tickers[i], self.tickers[j]
+                alerts.append({
+                    "key": f"{long}-{short}:{op}{limit}",
+                    "long": long,
+                    "short": short,
+                    "spread": round(float(self.spreads[i, j]), 2),
+                    "condition": condition,
+                })
+        # 複数のルールで同じペア・条件が成立した場合は1件にまとめる
+        return list({a["key"]: a for a in alerts}.values())
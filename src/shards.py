@@ -0,0 +1,219 @@
+"""
+シャード実行（監視対象を複数のジョブに分けて並行実行）
+
+- shard_of(ticker, count): ティッカーのSHA-1で担当シャードを決める
+  （Pythonのハッシュシード・実行環境・ユニバースの並び順に依存しない）
+- シャード（--shard I/N）は担当銘柄だけを処理し、結果を SHARD_DIR/shard-I-of-N.<拡張子> に書き出す
+  状態ファイル本体には書き込まないため、並行して実行しても互いの状態を上書きしない
+- シャードは通知を送信しない（ダイジェストに溜めた通知・per_event の個別通知を結果に書き出す）
+- マージ（--merge-shards）は全シャードの結果を読み込んで状態ファイルへ1回で反映し、
+  通知の送信と銘柄間のスプレッド・順位の集計を全銘柄まとめて1回だけ行う
+- データ取得失敗（ブレーカー）・為替の固定レート使用はシャードの結果に書き出し、
+  障害通知・固定レート通知はマージ時に全シャード分まとめて1回だけ送る
+- 結果が届かなかったシャードの担当銘柄は前回の状態を維持する
+
+使い方:
+    cd src
+    python etf_monitor.py --shard 0/2 & python etf_monitor.py --shard 1/2 & wait
+    python etf_monitor.py --merge-shards
+"""
+
+import hashlib
+import os
+import re
+import sys
+from datetime import date
+from pathlib import Path
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import SHARD_DIR, STATE_FORMAT
+from paths import resolve_path
+from ticker_state import StateTable
+import health
+import state_store
+
+SHARD_FILE_PATTERN = re.compile(r"^shard-(\d+)-of-(\d+)\.")
+
+
+def parse_shard(spec):
+    """
+    "I/N" 形式のシャード指定を (I, N) に変換
+
+    Raises:
+        ValueError: 形式が不正、または 0 <= I < N でない場合
+    """
+    try:
+        index, count = (int(x) for x in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"シャードは I/N 形式で指定してください（例: 0/4）: {spec}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"シャード番号は 0 以上 {count} 未満である必要があります: {spec}")
+    return index, count
+
+
+def shard_of(ticker, count):
+    """ティッカーの担当シャード番号"""
+    digest = hashlib.sha1(ticker.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def shard_tickers(tickers, index, count):
+    """担当銘柄（元の順序を維持）"""
+    return [t for t in tickers if shard_of(t, count) == index]
+
+
+def shard_path(index, count, fmt=STATE_FORMAT):
+    return resolve_path(SHARD_DIR) / f"shard-{index}-of-{count}{state_store.SERIALIZERS[fmt][0]}"
+
+
+def health_path(index, count):
+    """シャードのヘルス記録（マージ時に HEALTH_LOG_FILE へ移す）"""
+    return resolve_path(SHARD_DIR) / f"health-{index}-of-{count}.jsonl"
+
+
+def write_shard(index, count, tickers, state, digest_events=None, notifications=None, data_source=None,
+                fx_fallback=None, expected_session=None, fmt=STATE_FORMAT):
+    """
+    シャードの結果を書き出し（一時ファイル経由で置き換えるため、書きかけのファイルは残らない）
+
+    Args:
+        tickers: 担当銘柄
+        state: 実行後の StateTable（担当銘柄の行だけを書き出す）
+        digest_events: ダイジェストに溜めた通知（Digest.events()）
+        notifications: per_event で送るはずだった個別通知（表示通貨 → Embed の辞書のリスト）
+        data_source: データ取得の状況（DataSourceBreaker.to_dict()）
+        fx_fallback: 固定レートで補った通貨
+        expected_session: 取引カレンダー上の最新取引日（date）
+    """
+    table = StateTable()
+    for ticker in tickers:
+        row = state.get(ticker)
+        if row is not None:
+            table[ticker] = row
+    payload = {
+        "shard": index,
+        "count": count,
+        "tickers": list(tickers),
+        "state": table.to_dict(),
+        "digest": digest_events or [],
+        "notifications": notifications or [],
+        "data_source": data_source,
+        "fx_fallback": list(fx_fallback or []),
+        "expected_session": expected_session.isoformat() if expected_session else None,
+    }
+    path = shard_path(index, count, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(state_store.SERIALIZERS[fmt][1](payload))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _loads_for(path):
+    for suffix, _, loads in state_store.SERIALIZERS.values():
+        if path.suffix == suffix:
+            return loads
+    raise ValueError(f"未知のシャードファイル形式: {path.name}")
+
+
+def load_shards():
+    """
+    SHARD_DIR のシャード結果をすべて読み込む
+
+    Returns:
+        tuple: (シャード数, [payload, ...], [届かなかったシャード番号, ...], [読み込んだファイル, ...])
+               シャード結果がなければ (0, [], [], [])
+
+    Raises:
+        ValueError: シャード数の異なる結果が混在している・同じシャードの結果が複数ある場合
+    """
+    directory = resolve_path(SHARD_DIR)
+    if not directory.exists():
+        return 0, [], [], []
+
+    found = {}
+    counts = set()
+    for path in sorted(directory.iterdir()):
+        match = SHARD_FILE_PATTERN.match(path.name)
+        if not match or path.name.endswith(".tmp"):
+            continue
+        index, count = int(match.group(1)), int(match.group(2))
+        counts.add(count)
+        if index in found:
+            raise ValueError(f"シャード {index}/{count} の結果が複数あります: {found[index].name}, {path.name}")
+        found[index] = path
+
+    if not found:
+        return 0, [], [], []
+    if len(counts) > 1:
+        raise ValueError(f"シャード数の異なる結果が混在しています: {sorted(counts)}（{directory} を確認してください）")
+
+    count = counts.pop()
+    payloads = []
+    for index in sorted(found):
+        path = found[index]
+        payload = _loads_for(path)(path.read_bytes())
+        if payload.get("shard") != index or payload.get("count") != count:
+            raise ValueError(f"{path.name} の内容がファイル名と一致しません")
+        payloads.append(payload)
+    missing = [i for i in range(count) if i not in found]
+    return count, payloads, missing, [found[i] for i in sorted(found)]
+
+
+def merge_into(state, payloads):
+    """
+    シャードの担当銘柄の行を状態へ反映
+
+    Returns:
+        int: 反映した銘柄数
+    """
+    merged = 0
+    for payload in payloads:
+        table = StateTable.from_dict(payload["state"])
+        for ticker in payload["tickers"]:
+            row = table.get(ticker)
+            if row is not None:
+                state[ticker] = row
+                merged += 1
+    return merged
+
+
+def held_notifications(payloads):
+    """各シャードが溜めた個別通知（シャード番号順・各シャード内は発生順）"""
+    return [embed for p in payloads for embed in p.get("notifications", [])]
+
+
+def data_source_results(payloads):
+    """各シャードのデータ取得の状況（DataSourceBreaker.to_dict() のリスト）"""
+    return [p["data_source"] for p in payloads if p.get("data_source")]
+
+
+def fx_fallback(payloads):
+    """いずれかのシャードで固定レートを使った通貨（重複なし）"""
+    return list(dict.fromkeys(c for p in payloads for c in p.get("fx_fallback", [])))
+
+
+def expected_session(payloads):
+    """シャードが想定した最新取引日（最も新しい日）"""
+    sessions = [p["expected_session"] for p in payloads if p.get("expected_session")]
+    return date.fromisoformat(max(sessions)) if sessions else None
+
+
+def collect_health(count):
+    """シャードのヘルス記録を HEALTH_LOG_FILE に移す"""
+    for index in range(count):
+        path = health_path(index, count)
+        if not path.exists():
+            continue
+        for record in health.load_records(path):
+            health.append_record(record)
+        path.unlink()
+
+
+def clear(paths):
+    """マージ済みのシャード結果を削除"""
+    for path in paths:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,213 @@
+"""
+状態ファイルの保存形式（シリアライザ切り替え）
+
+形式は config.STATE_FORMAT で選択:
+- json:         従来どおり indent=2 の JSON（人が読める・差分が見やすい）
+- compact_json: 改行・インデントなしの JSON（orjson があれば使用）
+- msgpack:      バイナリ（要 pip install msgpack）
+
+ファイル名は STATE_FILE の拡張子を形式に合わせて差し替える（例: data/state.msgpack）。
+設定した形式のファイルがなければ他の形式のファイルを読み込み、次回保存時に移行する
+（保存後は他の形式の古いファイルを削除し、どちらを読むか曖昧にならないようにする）。
+
+使い方:
+    cd src
+    python state_store.py path                      # 現在の形式の状態ファイルパスを表示
+    python state_store.py migrate --to msgpack      # 形式を変換（元ファイルは --keep で残す）
+    python state_store.py view                      # 人が読むためのJSONビューを生成
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import STATE_FILE, STATE_FORMAT, STATE_VIEW_FILE
+from paths import resolve_path
+from ticker_state import StateTable
+
+try:
+    import orjson
+except ImportError:  # orjson は任意（未インストールなら標準json）
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack は STATE_FORMAT = "msgpack" の場合のみ必要
+    msgpack = None
+
+
+def _default(obj):
+    """NumPyのスカラー等（float/intのサブクラス以外）を標準の数値に、日付をISO形式の文字列に変換"""
+    if hasattr(obj, "item"):
+        return obj.item()
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"シリアライズできない型: {type(obj).__name__}")
+
+
+def _json_dumps(d):
+    return json.dumps(d, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+
+
+def _compact_json_dumps(d):
+    if orjson is not None:
+        return orjson.dumps(d, default=_default)
+    return json.dumps(d, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("STATE_FORMAT = \"msgpack\" には msgpack が必要です: pip install msgpack")
+
+
+def _msgpack_dumps(d):
+    _require_msgpack()
+    return msgpack.packb(d, use_bin_type=True, default=_default)
+
+
+def _msgpack_loads(data):
+    _require_msgpack()
+    return msgpack.unpackb(data, raw=False)
+
+
+# 形式名 → (拡張子, dumps, loads)
+SERIALIZERS = {
+    "json":         (".json",    _json_dumps,         _json_loads),
+    "compact_json": (".json",    _compact_json_dumps, _json_loads),
+    "msgpack":      (".msgpack", _msgpack_dumps,      _msgpack_loads),
+}
+
+
+def state_path(fmt=STATE_FORMAT):
+    """指定形式の状態ファイルパス"""
+    if fmt not in SERIALIZERS:
+        raise ValueError(f"未知のSTATE_FORMAT: {fmt}（{', '.join(SERIALIZERS)}）")
+    return resolve_path(STATE_FILE).with_suffix(SERIALIZERS[fmt][0])
+
+
+def find_state_file(fmt=STATE_FORMAT):
+    """
+    読み込むべき状態ファイルを探す（設定形式を優先し、なければ他の形式）
+
+    Returns:
+        tuple: (path, fmt) または (None, None)
+    """
+    path = state_path(fmt)
+    if path.exists():
+        return path, fmt
+    for other in SERIALIZERS:
+        if other == fmt or SERIALIZERS[other][0] == SERIALIZERS[fmt][0]:
+            continue
+        other_path = state_path(other)
+        if other_path.exists():
+            print(f"  ℹ️ {other_path.name} を読み込みます（次回保存時に {fmt} 形式へ移行）")
+            return other_path, other
+    return None, None
+
+
+class StateDecodeError(ValueError):
+    """状態ファイルを JSON / msgpack として読めない（壊れている）"""
+
+
+def read_state(path, fmt):
+    """
+    状態ファイルを読み込んで StateTable を返す
+
+    Raises:
+        StateDecodeError: ファイルが壊れていてデコードできない場合
+        StateSchemaError: スキーマが対応より新しい場合
+    """
+    loads = SERIALIZERS[fmt][2]
+    try:
+        raw = loads(path.read_bytes())
+    except ValueError as e:   # json / orjson / msgpack のデコードエラーはいずれも ValueError のサブクラス
+        raise StateDecodeError(str(e)) from e
+    if not isinstance(raw, dict):
+        raise StateDecodeError(f"最上位がオブジェクトではありません: {type(raw).__name__}")
+    return StateTable.from_dict(raw)
+
+
+def write_state(table, path, fmt):
+    """一時ファイル経由で書き込み（書き込み途中で壊れたファイルを残さない）"""
+    dumps = SERIALIZERS[fmt][1]
+    data = dumps(table.to_dict())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def remove_other_formats(fmt=STATE_FORMAT):
+    """指定形式以外の状態ファイルを削除（形式を切り替えた後の古いファイルを残さない）"""
+    keep = state_path(fmt)
+    for other in SERIALIZERS:
+        path = state_path(other)
+        if path != keep and path.exists():
+            path.unlink()
+            print(f"  🗑️ 移行済みの {path.name} を削除しました")
+
+
+def migrate(to_fmt, keep=False):
+    """既存の状態ファイルを指定形式に変換"""
+    src_path, src_fmt = find_state_file()
+    if src_path is None:
+        print("⚠️ 状態ファイルが見つかりません")
+        return False
+    dst_path = state_path(to_fmt)
+    table = read_state(src_path, src_fmt)
+    write_state(table, dst_path, to_fmt)
+    print(f"✅ {src_path.name} ({src_fmt}) → {dst_path.name} ({to_fmt}): {len(table)}銘柄")
+    if not keep and src_path != dst_path:
+        src_path.unlink()
+        print(f"   {src_path.name} を削除しました")
+    return True
+
+
+def write_view(out_path=None):
+    """人が読むための整形JSONビューを生成（保存形式に関係なく同じ内容）"""
+    src_path, src_fmt = find_state_file()
+    if src_path is None:
+        print("⚠️ 状態ファイルが見つかりません")
+        return None
+    out = resolve_path(out_path or STATE_VIEW_FILE)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(_json_dumps(read_state(src_path, src_fmt).to_dict()))
+    print(f"✅ JSONビュー: {out}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="状態ファイルの形式管理")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("path", help="現在の形式の状態ファイルパスを表示")
+    p_migrate = sub.add_parser("migrate", help="状態ファイルを別形式に変換")
+    p_migrate.add_argument("--to", choices=list(SERIALIZERS), default=STATE_FORMAT)
+    p_migrate.add_argument("--keep", action="store_true", help="変換元ファイルを残す")
+    p_view = sub.add_parser("view", help="人が読むためのJSONビューを生成")
+    p_view.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if args.command == "path":
+        path = state_path()
+        print(path.relative_to(script_dir.parent) if path.is_relative_to(script_dir.parent) else path)
+    elif args.command == "migrate":
+        sys.exit(0 if migrate(args.to, keep=args.keep) else 1)
+    elif args.command == "view":
+        sys.exit(0 if write_view(args.out) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+threshold_offset パラメータスイープ
+
+キャッシュ済みの日次TTM利回り系列に対して、offset × baseline算出方法 の
+グリッド全体を NumPy のブロードキャストで一括評価する。
+
+評価指標:
+- alerts:        上抜け（crossed_above）回数
+- time_above:    閾値以上だった日数の割合
+- fwd_return:    上抜け後 N営業日の平均価格リターン
+
+baseline算出方法:
+- monitor:   Botと同じ（configのbaselineから完了年ごとに加重平均で更新。baseline_year_end 以前の年は評価しない）
+- expanding: 前年までの全完了年の平均
+- rollingN:  前年までの直近N年の平均（例: rolling5）
+
+貼り付け用の設定は monitor の結果だけから出力する（Botの年度更新は加重平均のみのため、
+expanding / rollingN は比較用の参考値として表示するだけ）
+
+使い方:
+    cd src
+    python sweep.py                 # ユニバースの全銘柄
+    python sweep.py VYM SPYD --offsets -0.5 1.0 0.05 --forward 120
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import SWEEP_OFFSETS, SWEEP_BASELINE_METHODS, SWEEP_FORWARD_DAYS, SWEEP_MIN_ALERTS
+from universe import load_universe
+from yield_history import load_yield_series
+
+# Botの年度更新（update_baseline）と同じ算出方法（貼り付け用の設定はこの方法からのみ出力）
+MONITOR_METHOD = "monitor"
+
+
+def _window_of(method):
+    """baseline算出方法名 → 平均に使う年数（None = 全年）"""
+    if method in ("monitor", "expanding"):
+        return None
+    if method.startswith("rolling") and method[len("rolling"):].isdigit():
+        return int(method[len("rolling"):])
+    raise ValueError(f"未知のbaseline算出方法: {method}")
+
+
+def yearly_baselines(annual, years, method, config):
+    """
+    各年に適用されるbaselineを計算
+
+    Args:
+        annual: 完了年ごとの年次利回り（pd.Series, NaN = データなし）
+        years: 評価対象の年（np.ndarray[int]）
+        method: baseline算出方法
+        config: ユニバースの銘柄設定
+
+    Returns:
+        tuple: (baseline_yield: np.ndarray, baseline_years: np.ndarray) 年ごとの値
+    """
+    valid = annual.dropna()
+    valid_years = valid.index.to_numpy(dtype=int)
+    cumsum = np.concatenate(([0.0], np.cumsum(valid.to_numpy(dtype=float))))
+
+    # k = その年より前の有効な完了年の数
+    k = np.searchsorted(valid_years, years, side="left")
+
+    if method == "monitor":
+        # configのbaseline_year_end以降の完了年を加重平均で追加（update_baselineと同じ）
+        # configのbaselineは baseline_year_end までの平均なので、それ以前の年には適用しない（先読み防止）
+        start = np.searchsorted(valid_years, config["baseline_year_end"], side="right")
+        added = np.maximum(k - start, 0)
+        added_sum = cumsum[np.maximum(k, start)] - cumsum[start]
+        known = years > config["baseline_year_end"]
+        n = np.where(known, config["baseline_years"] + added, 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            baseline = np.where(known, (config["baseline_yield"] * config["baseline_years"] + added_sum) / n, np.nan)
+        return baseline, n
+
+    window = _window_of(method)
+    lo = np.zeros_like(k) if window is None else np.maximum(k - window, 0)
+    n = k - lo
+    with np.errstate(invalid="ignore", divide="ignore"):
+        baseline = np.where(n > 0, (cumsum[k] - cumsum[lo]) / n, np.nan)
+    return baseline, n
+
+
+def sweep_ticker(ticker, config, offsets, methods, forward_days, daily=None, annual=None):
+    """
+    1銘柄分のスイープ（全組み合わせをブロードキャストで評価）
+
+    Returns:
+        dict: 各指標の (len(methods), len(offsets)) 配列とメタ情報
+    """
+    if daily is None or annual is None:
+        daily, annual = load_yield_series(ticker)
+
+    yields = daily["Yield"].to_numpy(dtype=float)             # (T,)
+    prices = daily["Close"].to_numpy(dtype=float)             # (T,)
+    day_years = daily.index.year.to_numpy(dtype=int)          # (T,)
+
+    first_year = day_years[0]
+    years = np.arange(first_year, day_years[-1] + 1)
+    per_year = [yearly_baselines(annual, years, m, config) for m in methods]
+    baseline_by_year = np.stack([b for b, _ in per_year])     # (M, Y)
+    baseline_daily = baseline_by_year[:, day_years - first_year]   # (M, T)
+
+    # (M, K, T) の閾値・状態
+    thresholds = baseline_daily[:, None, :] + np.asarray(offsets)[None, :, None]
+    with np.errstate(invalid="ignore"):
+        above = yields[None, None, :] >= thresholds
+    evaluable = ~np.isnan(thresholds) & ~np.isnan(yields)[None, None, :]
+    crossed = above[..., 1:] & ~above[..., :-1] & evaluable[..., :-1]   # t+1日目の上抜け
+
+    # フォワードリターン（上抜け日の終値 → forward_days 営業日後）
+    fwd = np.full(prices.shape, np.nan)
+    if len(prices) > forward_days:
+        fwd[:-forward_days] = prices[forward_days:] / prices[:-forward_days] - 1
+    fwd_at_cross = fwd[1:]                                      # crossed と同じ位置合わせ
+    has_fwd = crossed & ~np.isnan(fwd_at_cross)
+
+    alerts = crossed.sum(axis=-1)
+    n_fwd = has_fwd.sum(axis=-1)
+    fwd_sum = np.where(has_fwd, fwd_at_cross, 0.0).sum(axis=-1)
+    n_eval = evaluable.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fwd_return = np.where(n_fwd > 0, fwd_sum / n_fwd * 100, np.nan)
+        time_above = np.where(n_eval > 0, (above & evaluable).sum(axis=-1) / n_eval * 100, np.nan)
+
+    return {
+        "methods": list(methods),
+        "offsets": np.asarray(offsets),
+        "alerts": alerts,
+        "fwd_return": fwd_return,
+        "time_above": time_above,
+        "next_baseline": [(b[-1], n[-1]) for b, n in per_year],
+        "last_complete_year": int(years[-1]) - 1,
+    }
+
+
+def pick_best(result, min_alerts, method=None):
+    """
+    最低上抜け回数を満たす組み合わせから平均フォワードリターン最大のものを選択
+
+    Args:
+        method: 指定した場合はその baseline算出方法の中だけから選ぶ
+    """
+    score = np.where(result["alerts"] >= min_alerts, result["fwd_return"], np.nan)
+    if method is not None:
+        if method not in result["methods"]:
+            return None
+        rows = np.array([m == method for m in result["methods"]])
+        score = np.where(rows[:, None], score, np.nan)
+    if np.all(np.isnan(score)):
+        return None
+    m, k = np.unravel_index(np.nanargmax(score), score.shape)
+    return int(m), int(k)
+
+
+def _summary(result, best, forward_days):
+    m, k = best
+    return (f"method={result['methods'][m]}, offset={float(result['offsets'][k]):+.2f}, "
+            f"alerts={result['alerts'][m, k]}, "
+            f"fwd{forward_days}d={result['fwd_return'][m, k]:+.2f}%, "
+            f"above={result['time_above'][m, k]:.0f}%")
+
+
+def format_universe_entry(ticker, config, result, best, forward_days):
+    """
+    ユニバースファイル（TOML）にそのまま貼り付けられる形式で出力
+
+    Raises:
+        ValueError: best が monitor 以外の算出方法の場合（Botの年度更新で別の方法に置き換わるため）
+    """
+    m, k = best
+    if result["methods"][m] != MONITOR_METHOD:
+        raise ValueError(f"貼り付け用の設定は {MONITOR_METHOD} のみ出力できます: {result['methods'][m]}")
+    baseline_yield, baseline_years = result["next_baseline"][m]
+    offset = float(result["offsets"][k])
+    summary = f"sweep: {_summary(result, best, forward_days)}"
+
+    lines = [
+        f'[etfs.{ticker}]',
+        f'name = "{config["name"]}"',
+        f'inception_date = "{config["inception_date"]}"',
+        f'baseline_years = {int(baseline_years)}',
+        f'baseline_yield = {baseline_yield:.2f}',
+        f'baseline_year_end = {result["last_complete_year"]}',
+        f'threshold_offset = {offset:.2f}      # {summary}',
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _print_table(ticker, result):
+    print(f"\n=== {ticker} ===")
+    print(f"{'method':<10} {'offset':>7} {'alerts':>7} {'above%':>7} {'fwd%':>8}")
+    for m, method in enumerate(result["methods"]):
+        for k, offset in enumerate(result["offsets"]):
+            fwd = result["fwd_return"][m, k]
+            fwd_str = "   -" if np.isnan(fwd) else f"{fwd:+8.2f}"
+            print(f"{method:<10} {offset:>+7.2f} {result['alerts'][m, k]:>7d} "
+                  f"{result['time_above'][m, k]:>7.1f} {fwd_str:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="threshold_offset パラメータスイープ")
+    parser.add_argument("tickers", nargs="*", help="対象ティッカー（省略時は全銘柄）")
+    parser.add_argument("--offsets", nargs=3, type=float, metavar=("START", "STOP", "STEP"),
+                        default=SWEEP_OFFSETS)
+    parser.add_argument("--methods", nargs="+", default=list(SWEEP_BASELINE_METHODS))
+    parser.add_argument("--forward", type=int, default=SWEEP_FORWARD_DAYS)
+    parser.add_argument("--min-alerts", type=int, default=SWEEP_MIN_ALERTS)
+    parser.add_argument("--quiet", action="store_true", help="グリッド全体の表を出力しない")
+    args = parser.parse_args()
+
+    start, stop, step = args.offsets
+    offsets = np.round(np.arange(start, stop + step / 2, step), 4)
+    etfs = load_universe()
+    tickers = args.tickers or list(etfs)
+
+    if MONITOR_METHOD not in args.methods:
+        print(f"⚠️ --methods に {MONITOR_METHOD} がないため、貼り付け用の設定は出力しません（比較のみ）")
+
+    entries = []
+    for ticker in tickers:
+        if ticker not in etfs:
+            print(f"⚠️ {ticker} はユニバースにありません - スキップ")
+            continue
+        result = sweep_ticker(ticker, etfs[ticker], offsets, args.methods, args.forward)
+        if not args.quiet:
+            _print_table(ticker, result)
+        overall = pick_best(result, args.min_alerts)
+        if overall is None:
+            print(f"⚠️ {ticker}: 上抜け{args.min_alerts}回以上の組み合わせなし")
+            continue
+        best = pick_best(result, args.min_alerts, MONITOR_METHOD)
+        if overall != best:
+            # Botは expanding / rollingN で baseline を更新しないため、貼り付け用には出力しない
+            print(f"ℹ️ {ticker}: 全算出方法での最良は {_summary(result, overall, args.forward)}（比較用・貼り付け不可）")
+        if best is None:
+            if MONITOR_METHOD in args.methods:
+                print(f"⚠️ {ticker}: {MONITOR_METHOD} で上抜け{args.min_alerts}回以上の組み合わせなし")
+            continue
+        entries.append(format_universe_entry(ticker, etfs[ticker], result, best, args.forward))
+
+    if entries:
+        print("\n# --- ユニバースファイル（data/universe.toml）貼り付け用 ---")
+        print("\n".join(entries))
+
+
+if __name__ == "__main__":
+    main()
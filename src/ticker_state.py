@@ -0,0 +1,205 @@
+"""
+銘柄ごとの監視状態（型付き・slots）
+
+- TickerState: 1銘柄分の状態。state.json の1エントリに対応
+- StateTable:  全銘柄分の状態表（行リスト + ティッカー索引）
+- 辞書形式は従来の state.json と同じ（ティッカー → 状態）。最上位に _schema_version を追加
+- 銘柄をまたぐ集計の状態（スプレッドアラート等）は最上位の _portfolio に保存
+- ファイルへの読み書き（シリアライザ選択）は state_store.py
+- 未知のキーは警告して extra に保持し、保存時にそのまま書き戻す（新しい版で追加されたキーを消さない）
+- 対応より新しい _schema_version のファイルは StateSchemaError（読み込まず、上書きもしない）
+"""
+
+from dataclasses import dataclass, field, fields, replace
+
+import numpy as np
+
+SCHEMA_VERSION = 3   # v2: 利回りパーセンタイル・Zスコアと成立中の統計シグナル / v3: _portfolio
+SCHEMA_KEY = "_schema_version"
+PORTFOLIO_KEY = "_portfolio"
+
+
+class StateSchemaError(Exception):
+    """状態ファイルのスキーマが対応より新しい（古い版で上書きすると新しいキーが失われる）"""
+
+
+@dataclass(slots=True)
+class TickerState:
+    """1銘柄分の監視状態"""
+    status: str = "below"
+    current_yield: float = 0.0
+    price_usd: float = 0.0
+    dividend_usd: float = 0.0
+    threshold: float = 0.0
+    last_trade_date: str | None = None
+    last_year: int | None = None
+    baseline_years: int | None = None
+    baseline_yield: float | None = None
+    last_checked: str | None = None
+    last_notified: str | None = None
+    last_reminded: str | None = None
+    crossed_above_date: str | None = None
+    crossed_above_yield: float | None = None
+    crossed_above_price_jpy: float | None = None
+    last_reminded_yield: float | None = None
+    last_reminded_price_jpy: float | None = None
+    yield_percentile: float | None = None
+    yield_zscore: float | None = None
+    active_signals: list[str] = field(default_factory=list)
+    next_ex_date: str | None = None
+    payout_overdue: str | None = None
+    extra: dict = field(default_factory=dict)   # 未知のキー（そのまま書き戻す）
+
+    @property
+    def has_baseline(self):
+        return self.baseline_years is not None
+
+    def mark_crossed_above(self, date_str, current_yield, price_jpy):
+        """上抜け（または初回above）を記録。リマインダー基準もここから開始"""
+        self.crossed_above_date = date_str
+        self.crossed_above_yield = current_yield
+        self.crossed_above_price_jpy = price_jpy
+        self.mark_reminded(date_str, current_yield, price_jpy)
+
+    def mark_reminded(self, date_str, current_yield, price_jpy):
+        """週次リマインダー送信を記録"""
+        self.last_reminded = date_str
+        self.last_reminded_yield = current_yield
+        self.last_reminded_price_jpy = price_jpy
+
+    def clear_crossing(self):
+        """下抜け時に上抜け関連の記録をリセット"""
+        self.crossed_above_date = None
+        self.crossed_above_yield = None
+        self.crossed_above_price_jpy = None
+        self.last_reminded = None
+        self.last_reminded_yield = None
+        self.last_reminded_price_jpy = None
+
+    def to_dict(self):
+        """state.json 形式の辞書に変換（baselineはネスト）"""
+        d = {}
+        for name in _FIELD_NAMES:
+            if name == "baseline_years":
+                if self.has_baseline:
+                    d["baseline"] = {"years": self.baseline_years, "yield": self.baseline_yield}
+            elif name not in ("baseline_yield", "extra"):
+                d[name] = getattr(self, name)
+        for key, value in self.extra.items():
+            d.setdefault(key, value)
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        """state.json の1エントリから復元（未知のキーは extra に保持）"""
+        kwargs = {k: v for k, v in d.items() if k in _SERIALIZED_KEYS and k != "baseline"}
+        unknown = d.keys() - _SERIALIZED_KEYS
+        if unknown:
+            kwargs["extra"] = {k: d[k] for k in sorted(unknown)}
+        baseline = d.get("baseline")
+        if baseline is not None:
+            kwargs["baseline_years"] = baseline["years"]
+            kwargs["baseline_yield"] = baseline["yield"]
+        return cls(**kwargs)
+
+    def updated(self, **changes):
+        """指定フィールドのみ差し替えたコピー（通知履歴はそのまま引き継ぐ）"""
+        return replace(self, **changes)
+
+
+_FIELD_NAMES = tuple(f.name for f in fields(TickerState))
+_SERIALIZED_KEYS = frozenset(_FIELD_NAMES) - {"baseline_years", "baseline_yield", "extra"} | {"baseline"}
+
+
+class StateTable:
+    """
+    全銘柄分の状態表
+
+    行（TickerState）をリストで保持し、ティッカー → 行番号の索引でO(1)参照する。
+    行は処理中にその場で更新される（通知履歴の記録など）ため列指向では持たず、
+    集計用の列は column() で NumPy 配列として一括で取り出す（ランキング・集計用）。
+    portfolio は銘柄をまたぐ集計の状態（portfolio.py）。
+    """
+    __slots__ = ("_index", "_rows", "_tickers", "portfolio")
+
+    def __init__(self):
+        self._index = {}
+        self._rows = []
+        self._tickers = []
+        self.portfolio = {}
+
+    def __contains__(self, ticker):
+        return ticker in self._index
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, ticker):
+        return self._rows[self._index[ticker]]
+
+    def __setitem__(self, ticker, ticker_state):
+        i = self._index.get(ticker)
+        if i is None:
+            self._index[ticker] = len(self._rows)
+            self._rows.append(ticker_state)
+            self._tickers.append(ticker)
+        else:
+            self._rows[i] = ticker_state
+
+    def get(self, ticker):
+        i = self._index.get(ticker)
+        return None if i is None else self._rows[i]
+
+    def tickers(self):
+        return list(self._tickers)
+
+    def items(self):
+        return zip(self._tickers, self._rows)
+
+    def column(self, name, dtype=None):
+        """
+        指定フィールドの列（ティッカー順の np.ndarray）
+
+        Args:
+            dtype: 配列の型（None の値は float なら NaN。省略時は object）
+        """
+        if name not in _FIELD_NAMES:
+            raise KeyError(name)
+        values = [getattr(row, name) for row in self._rows]
+        if dtype is None:
+            return np.array(values, dtype=object)
+        if np.dtype(dtype).kind == "f":
+            values = [np.nan if v is None else v for v in values]
+        return np.array(values, dtype=dtype)
+
+    def to_dict(self):
+        d = {SCHEMA_KEY: SCHEMA_VERSION}
+        if self.portfolio:
+            d[PORTFOLIO_KEY] = self.portfolio
+        for ticker, row in self.items():
+            d[ticker] = row.to_dict()
+        return d
+
+    @classmethod
+    def from_dict(cls, raw):
+        """
+        state.json の内容から復元（旧形式は _schema_version なしとして扱う）
+
+        Raises:
+            StateSchemaError: _schema_version が SCHEMA_VERSION より新しい場合
+        """
+        version = raw.get(SCHEMA_KEY, 0)
+        if version > SCHEMA_VERSION:
+            raise StateSchemaError(f"未対応のstateスキーマ: v{version}（対応: v{SCHEMA_VERSION}まで）")
+        table = cls()
+        table.portfolio = raw.get(PORTFOLIO_KEY, {})
+        unknown = set()
+        for ticker, entry in raw.items():
+            if ticker not in (SCHEMA_KEY, PORTFOLIO_KEY):
+                row = TickerState.from_dict(entry)
+                unknown.update(row.extra)
+                table[ticker] = row
+        if unknown:
+            print(f"⚠️ 未知の状態キー {sorted(unknown)} があります（そのまま保持して書き戻します）")
+        return table
+
@@ -0,0 +1,204 @@
+"""
+監視対象ETF一覧（ユニバース）の読み込み
+
+- config.UNIVERSE_FILE（TOML / YAML / CSV）から読み込む
+- 値の優先順位: 銘柄ごとの設定 > ファイルの [defaults] > config.UNIVERSE_DEFAULTS
+- 読み込み時に全銘柄を検証し、問題があればまとめて ValueError
+- Universe は dict と同じように使える（ETFS[ticker]["name"] などはO(1)参照）
+- デーモンモードでは reload_if_changed() でファイルのmtimeが変わった時だけ再読み込み
+"""
+
+import csv
+import sys
+import tomllib
+from datetime import date
+from pathlib import Path
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import UNIVERSE_FILE, UNIVERSE_DEFAULTS
+from paths import resolve_path
+
+# キー → 型（bool/None は不可）
+SCHEMA = {
+    "name": str,
+    "inception_date": str,
+    "baseline_years": int,
+    "baseline_yield": float,
+    "baseline_year_end": int,
+    "threshold_offset": float,
+    "percentile_alert": float,
+    "zscore_alert": float,
+}
+
+
+def _coerce(key, value):
+    """CSVなど文字列で来た値を SCHEMA の型に変換"""
+    expected = SCHEMA[key]
+    if isinstance(value, str) and expected is not str:
+        return expected(value.strip())
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _read_toml(path):
+    with open(path, "rb") as f:
+        raw = tomllib.load(f)
+    return raw.get("defaults", {}), raw.get("etfs", {})
+
+
+def _read_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("YAML形式のユニバースには PyYAML が必要です: pip install pyyaml")
+    with open(path, "r", encoding="utf-8") as f:
+        raw = yaml.safe_load(f) or {}
+    return raw.get("defaults", {}), raw.get("etfs", {})
+
+
+def _read_csv(path):
+    """1行1銘柄（ticker列必須）。空欄はデフォルト値を使用"""
+    entries = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            ticker = (row.pop("ticker", None) or "").strip()
+            if not ticker or ticker.startswith("#"):
+                continue
+            entries[ticker] = {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+    return {}, entries
+
+
+_READERS = {
+    ".toml": _read_toml,
+    ".yaml": _read_yaml,
+    ".yml": _read_yaml,
+    ".csv": _read_csv,
+}
+
+
+def _validate(ticker, entry):
+    """1銘柄分の設定を検証して問題点のリストを返す"""
+    problems = []
+    unknown = entry.keys() - SCHEMA.keys()
+    if unknown:
+        problems.append(f"{ticker}: 未知のキー {sorted(unknown)}")
+    for key, expected in SCHEMA.items():
+        if key not in entry:
+            problems.append(f"{ticker}: {key} がありません")
+            continue
+        try:
+            entry[key] = _coerce(key, entry[key])
+        except ValueError:
+            problems.append(f"{ticker}: {key} = {entry[key]!r} を{expected.__name__}に変換できません")
+            continue
+        if type(entry[key]) is not expected:
+            problems.append(f"{ticker}: {key} は{expected.__name__}である必要があります（{entry[key]!r}）")
+
+    if not problems:
+        try:
+            date.fromisoformat(entry["inception_date"])
+        except ValueError:
+            problems.append(f"{ticker}: inception_date が日付形式ではありません（{entry['inception_date']!r}）")
+        if entry["baseline_years"] <= 0:
+            problems.append(f"{ticker}: baseline_years は1以上である必要があります")
+        if entry["baseline_yield"] < 0:
+            problems.append(f"{ticker}: baseline_yield は0以上である必要があります")
+        if not 0 <= entry["percentile_alert"] <= 100:
+            problems.append(f"{ticker}: percentile_alert は0～100である必要があります")
+        if entry["zscore_alert"] < 0:
+            problems.append(f"{ticker}: zscore_alert は0以上である必要があります")
+    return problems
+
+
+def parse_universe(path):
+    """
+    ユニバースファイルを読み込んで検証済みの {ticker: config} を返す
+
+    Raises:
+        ValueError: 形式エラー・検証エラー（全銘柄分の問題をまとめて報告）
+    """
+    reader = _READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ValueError(f"未対応のユニバース形式: {path.suffix}（{', '.join(_READERS)}）")
+    defaults, raw_entries = reader(path)
+
+    entries = {}
+    problems = []
+    for ticker, overrides in raw_entries.items():
+        entry = {**UNIVERSE_DEFAULTS, **defaults, **overrides}
+        problems.extend(_validate(ticker, entry))
+        entries[ticker] = entry
+    if not entries:
+        problems.append("監視対象が1銘柄もありません")
+    if problems:
+        raise ValueError(f"{path.name} の検証エラー:\n  " + "\n  ".join(problems))
+    return entries
+
+
+class Universe:
+    """監視対象ETF一覧（読み取り専用のdictとして振る舞う）"""
+
+    def __init__(self, path):
+        self.path = resolve_path(path)
+        self._mtime = None
+        self._entries = {}
+
+    def load(self):
+        """ファイルを読み込む（検証エラー時は ValueError、現在の内容は変更しない）"""
+        mtime = self.path.stat().st_mtime
+        self._entries = parse_universe(self.path)
+        self._mtime = mtime
+        return self
+
+    def reload_if_changed(self):
+        """
+        mtimeが変わっていれば再読み込み
+
+        Returns:
+            bool: 再読み込みした場合 True（検証エラー時は前回の内容を維持して False）
+        """
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError as e:
+            print(f"⚠️ ユニバースファイルを参照できません: {e}（前回の設定で続行）")
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            self.load()
+        except (ValueError, OSError, tomllib.TOMLDecodeError) as e:
+            print(f"⚠️ ユニバース再読み込み失敗（前回の設定で続行）: {e}")
+            self._mtime = mtime  # 修正されるまで同じエラーを繰り返さない
+            return False
+        print(f"🔄 ユニバース再読み込み: {len(self._entries)}銘柄")
+        return True
+
+    def __getitem__(self, ticker):
+        return self._entries[ticker]
+
+    def __contains__(self, ticker):
+        return ticker in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, ticker, default=None):
+        return self._entries.get(ticker, default)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def items(self):
+        return self._entries.items()
+
+
+def load_universe(path=UNIVERSE_FILE):
+    """ユニバースを読み込んで返す（起動時用。エラーはそのまま送出）"""
+    return Universe(path).load()
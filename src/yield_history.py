@@ -0,0 +1,276 @@
+"""
+利回り履歴キャッシュ（株式分割・分配金を考慮した日次系列）
+
+- yfinanceから全期間の日足を「配当調整なし・アクション付き」で1回だけ取得し data/cache/ にCSV保存
+- 株式分割・分配金から以下の系列をベクトル演算で構築
+    Close:    分割調整済み・配当調整なしの終値（利回り計算用）
+    RawClose: 当時の実際の終値（分割調整もなし）
+    AdjClose: 分割・配当とも調整済みの終値（トータルリターン用）
+    Dividend: 分割調整済みの1口あたり分配金（ex-dateの行のみ、他は0）
+    RawDividend: 当時の実際の分配金
+    Split:    分割比率（分割日のみ、他は1）
+- 利回り = 分配金 ÷ 終値 はどちらも分割調整済みの値で計算する
+  （配当調整済みの終値で割ると過去の年ほど利回りが高く出るため）
+- TTM利回り（get_etf_data）と年次利回り（get_year_average_from_history）はどちらもこのキャッシュを参照
+- TTMの定義は get_etf_data と同じ（400日ウィンドウ内の直近4回分）
+- 分配金の想定時期以外（payout_schedule.py）は全期間を再取得せず、直近の日足をキャッシュの末尾に追加する
+  （全期間を取得した日時は {ticker}_daily.json に記録）
+- load_history の鮮度はCSVの更新日時ではなく、この全期間の取得日時で判定する
+  （末尾への追加でCSVは毎回更新されるため、更新日時では分配金が古いままでも新しく見える）
+"""
+
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# スクリプトのディレクトリをパスに追加
+script_dir = Path(__file__).parent
+sys.path.insert(0, str(script_dir))
+
+from config import CACHE_DIR, CACHE_MAX_AGE_HOURS
+from paths import resolve_path
+import fixtures
+import health
+
+TTM_WINDOW_DAYS = 400
+TTM_MAX_PAYOUTS = 4
+
+SERIES_COLUMNS = ["Close", "RawClose", "AdjClose", "Dividend", "RawDividend", "Split"]
+
+
+def _cache_path(ticker):
+    return resolve_path(CACHE_DIR) / f"{ticker}_daily.csv"
+
+
+def _meta_path(ticker):
+    return resolve_path(CACHE_DIR) / f"{ticker}_daily.json"
+
+
+def _fetched_at(ticker):
+    """前回の全期間取得の日時（記録がなければ None）"""
+    try:
+        with open(_meta_path(ticker), "r", encoding="utf-8") as f:
+            return datetime.fromisoformat(json.load(f)["fetched_at"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _is_fresh(ticker):
+    """前回の全期間取得から CACHE_MAX_AGE_HOURS 以内か（extend_history による追加は数えない）"""
+    fetched_at = _fetched_at(ticker)
+    if fetched_at is None or not _cache_path(ticker).exists():
+        return False
+    age_hours = (fixtures.now(timezone.utc) - fetched_at).total_seconds() / 3600
+    return age_hours < CACHE_MAX_AGE_HOURS
+
+
+def _to_naive_dates(index):
+    """タイムゾーン付きDatetimeIndexを日付のみ（tzなし）に正規化"""
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def _reverse_cumprod_after(values):
+    """各行について「その行より後」の値の累積積（最終行は1）"""
+    after = np.cumprod(values[::-1])[::-1]
+    return np.concatenate((after[1:], [1.0]))
+
+
+def build_series(history):
+    """
+    yfinanceの日足（auto_adjust=False, actions=True）から調整系列を構築
+
+    Args:
+        history: Close / Volume / Dividends / Stock Splits 列を持つDataFrame
+
+    Returns:
+        pd.DataFrame: SERIES_COLUMNS の列を持つ日次系列（tzなしの日付インデックス）
+    """
+    dividends = history["Dividends"] if "Dividends" in history else pd.Series(0.0, index=history.index)
+    splits = history["Stock Splits"] if "Stock Splits" in history else pd.Series(0.0, index=history.index)
+
+    # Volume=0の幽霊エントリを除外（ただし分配金・分割の行は残す）
+    keep = (history["Volume"] > 0) | (dividends > 0) | (splits > 0)
+    history, dividends, splits = history[keep], dividends[keep], splits[keep]
+
+    close = history["Close"].to_numpy(dtype=float)
+    div = dividends.fillna(0.0).to_numpy(dtype=float)
+    split = splits.fillna(0.0).to_numpy(dtype=float)
+    split = np.where(split > 0, split, 1.0)
+
+    # 分割: その日より後の分割の累積倍率を掛けると当時の実際の値に戻る
+    split_after = _reverse_cumprod_after(split)
+
+    # 配当調整: ex-dateごとの (1 - 分配金 ÷ 前日終値) を、それより前の日に累積で掛ける
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        div_ratio = np.where((div > 0) & (prev_close > 0), 1 - div / prev_close, 1.0)
+    div_after = _reverse_cumprod_after(div_ratio)
+
+    frame = pd.DataFrame({
+        "Close": close,
+        "RawClose": close * split_after,
+        "AdjClose": close * div_after,
+        "Dividend": div,
+        "RawDividend": div * split_after,
+        "Split": split,
+    }, index=_to_naive_dates(history.index))
+    frame.index.name = "Date"
+    return frame[~frame.index.duplicated(keep="last")]
+
+
+def _fetch_history(ticker):
+    """全期間の日足・分配金・株式分割を1回で取得してキャッシュに保存"""
+    print(f"  🌐 {ticker}: 全期間データ（分配金・株式分割込み）を取得中...")
+    history = fixtures.ticker(ticker).history(period="max", auto_adjust=False, actions=True)
+    if history.empty:
+        raise ValueError(f"{ticker}: 履歴データなし")
+
+    frame = build_series(history)
+    if fixtures.replaying():
+        return frame
+    path = _cache_path(ticker)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_csv(path)
+    with open(_meta_path(ticker), "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": fixtures.now(timezone.utc).isoformat()}, f)
+    return frame
+
+
+def load_cached_history(ticker):
+    """
+    キャッシュを鮮度に関係なく読み込み（記録・再生中、キャッシュがない場合は None）
+
+    Returns:
+        tuple or None: (日次系列, 前回の全期間取得の日時 or None)
+    """
+    path = _cache_path(ticker)
+    if fixtures.active() or not path.exists():
+        return None
+    frame = pd.read_csv(path, index_col="Date", parse_dates=["Date"])[SERIES_COLUMNS]
+    return frame, _fetched_at(ticker)
+
+
+def extend_history(ticker, frame, recent_history):
+    """
+    直近の日足（auto_adjust=False, actions=True）をキャッシュの末尾に追加して保存
+
+    直近の日足にキャッシュにない分配金・株式分割がある場合や、キャッシュの最終日と
+    直近の日足が重ならない（間の日が欠ける）場合は None（全期間の再取得が必要）。
+    追加する行には以降の分配金・分割がないため、調整系列は終値そのものになる。
+
+    Returns:
+        pd.DataFrame or None
+    """
+    recent = build_series(recent_history)
+    if recent.empty or recent.index[0] > frame.index[-1]:
+        return None
+    for column, is_action in (("Dividend", lambda c: c > 0), ("Split", lambda c: c != 1)):
+        known = frame.index[is_action(frame[column])]
+        if (~recent.index[is_action(recent[column])].isin(known)).any():
+            return None
+
+    new = recent[recent.index > frame.index[-1]]
+    if new.empty:
+        return frame
+    frame = pd.concat([frame, new[SERIES_COLUMNS]])
+    frame.index.name = "Date"
+    frame.to_csv(_cache_path(ticker))
+    return frame
+
+
+def load_history(ticker, refresh=False):
+    """
+    キャッシュから日次系列を読み込み（古い・存在しない場合は再取得）
+
+    Returns:
+        pd.DataFrame: build_series() の形式
+    """
+    if not refresh and not fixtures.active() and _is_fresh(ticker):
+        health.count("history_cache_hit")
+        return pd.read_csv(_cache_path(ticker), index_col="Date", parse_dates=["Date"])[SERIES_COLUMNS]
+    health.count("history_cache_miss")
+    return _fetch_history(ticker)
+
+
+def dividend_series(frame):
+    """分配金のある日だけの系列（分割調整済み、ex-date昇順）"""
+    return frame.loc[frame["Dividend"] > 0, "Dividend"]
+
+
+def ttm_dividends(dates, dividends):
+    """
+    各日付時点のTTM分配金（400日ウィンドウ内の直近4回分の合計）
+
+    Args:
+        dates: 評価日の配列（datetime64）
+        dividends: 分配金系列（ex-date昇順）
+
+    Returns:
+        np.ndarray: 各日付のTTM分配金
+    """
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    div_dates = dividends.index.to_numpy(dtype="datetime64[ns]")
+    cumsum = np.concatenate(([0.0], np.cumsum(dividends.to_numpy(dtype=float))))
+
+    hi = np.searchsorted(div_dates, dates, side="right")
+    lo = np.searchsorted(div_dates, dates - np.timedelta64(TTM_WINDOW_DAYS, "D"), side="right")
+    lo = np.maximum(lo, hi - TTM_MAX_PAYOUTS)
+    return cumsum[hi] - cumsum[lo]
+
+
+def daily_yield_series(frame):
+    """日次TTM利回り系列（%）"""
+    ttm = ttm_dividends(frame.index.to_numpy(), dividend_series(frame))
+    return pd.Series(ttm / frame["Close"].to_numpy(dtype=float) * 100, index=frame.index, name="Yield")
+
+
+def year_dividends_and_close(frame):
+    """
+    暦年ごとの分配金総額と年末終値（どちらも分割調整済み）
+
+    Returns:
+        tuple: (div_sum: pd.Series, year_end_close: pd.Series) 年インデックス
+    """
+    years = frame.index.year
+    year_end_close = frame["Close"].groupby(years).last()
+    div_sum = frame["Dividend"].groupby(years).sum()
+    return div_sum, year_end_close
+
+
+def annual_yields(frame):
+    """
+    完了年ごとの年次利回り（分配金総額 ÷ 年末株価）
+
+    get_year_average_from_history と同じ定義。上場年（1月開始でない年）と
+    進行中の年は除外し、分配金のない年は NaN とする。
+    """
+    div_sum, year_end_close = year_dividends_and_close(frame)
+
+    first_year = frame.index[0].year
+    complete = year_end_close.index < frame.index[-1].year
+    if frame.index[0].month > 1:
+        complete &= year_end_close.index > first_year
+
+    full_years = year_end_close.index[complete]
+    div = div_sum.reindex(full_years).to_numpy(dtype=float)
+    div = np.where(div > 0, div, np.nan)
+    values = div / year_end_close.loc[full_years].to_numpy(dtype=float) * 100
+    return pd.Series(values, index=full_years, name="AnnualYield")
+
+
+def load_yield_series(ticker, refresh=False):
+    """
+    ティッカーの日次データをまとめて取得
+
+    Returns:
+        tuple: (daily: pd.DataFrame[Close, Yield], annual: pd.Series)
+    """
+    frame = load_history(ticker, refresh=refresh)
+    daily = pd.DataFrame({"Close": frame["Close"], "Yield": daily_yield_series(frame)})
+    return daily, annual_yields(frame)
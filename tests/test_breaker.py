@@ -0,0 +1,68 @@
+"""
+データソースのサーキットブレーカー（銘柄単位で連続失敗を数える）
+
+上場廃止・シンボル誤りなどの個別銘柄の失敗で、健全な銘柄まで停止しないことを確認する。
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import etf_monitor  # noqa: E402
+
+BAD_SYMBOLS = {"DELISTED", "TYPO"}
+
+
+@pytest.fixture
+def monitor_breaker(monkeypatch):
+    breaker = etf_monitor.DataSourceBreaker(threshold=3)
+    monkeypatch.setattr(etf_monitor, "_breaker", breaker)
+    return breaker
+
+
+@pytest.fixture
+def fetched(monitor_breaker, monkeypatch):
+    """get_etf_data の呼び出し記録（BAD_SYMBOLS は常に取得失敗）"""
+    calls = []
+
+    def fake_get_etf_data(ticker, expected_session=None):
+        calls.append(ticker)
+        if ticker in BAD_SYMBOLS:
+            return None
+        return {"yield": 3.0, "last_trade_date": "2026-10-16"}
+
+    monkeypatch.setattr(etf_monitor, "get_etf_data", fake_get_etf_data)
+    monkeypatch.setattr(etf_monitor.time, "sleep", lambda seconds: None)
+    return calls
+
+
+def test_bad_symbols_do_not_open_breaker(monitor_breaker, fetched):
+    results = {t: etf_monitor.fetch_etf_data(t) for t in ["DELISTED", "TYPO", "VYM", "HDV"]}
+
+    assert results["DELISTED"] is None and results["TYPO"] is None
+    assert results["VYM"] and results["HDV"]
+    assert not monitor_breaker.is_open
+    assert monitor_breaker.consecutive_failures == 0
+    # 失敗した銘柄はリトライを使い切っても1回と数える
+    assert fetched.count("DELISTED") == 3 and fetched.count("TYPO") == 3
+
+
+def test_consecutive_ticker_failures_open_breaker(monitor_breaker, fetched):
+    for ticker in ["DELISTED", "TYPO", "DELISTED"]:
+        etf_monitor.fetch_etf_data(ticker)
+    assert monitor_breaker.is_open
+
+    # 開いた後は取得しない
+    calls_before = len(fetched)
+    assert etf_monitor.fetch_etf_data("VYM") is None
+    assert len(fetched) == calls_before
+
+
+def test_success_resets_consecutive_failures(monitor_breaker, fetched):
+    for ticker in ["DELISTED", "TYPO", "VYM", "DELISTED", "TYPO"]:
+        etf_monitor.fetch_etf_data(ticker)
+    assert not monitor_breaker.is_open
+    assert monitor_breaker.consecutive_failures == 2
@@ -0,0 +1,65 @@
+"""
+フィクスチャの保存形式（データソースの応答が JSON 経由で同じ値に戻る）
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import fixtures  # noqa: E402
+
+
+def _round_trip(value):
+    text = json.dumps(fixtures._encode_value(value), default=fixtures._jsonable)
+    return fixtures._decode_value(json.loads(text))
+
+
+def test_history_frame_keeps_timezone_and_dtypes():
+    # 夏時間をまたぐ期間（オフセットが -04:00 / -05:00 で混在）
+    index = pd.bdate_range("2026-10-26", "2026-11-06", tz="America/New_York", name="Date")
+    frame = pd.DataFrame({
+        "Close": np.linspace(40.0, 41.0, len(index)),
+        "Volume": np.arange(len(index), dtype="int64"),
+        "Dividends": [0.0] * (len(index) - 1) + [0.4],
+    }, index=index)
+
+    restored = _round_trip(frame)
+
+    pd.testing.assert_frame_equal(restored, frame, check_freq=False)
+    assert str(restored.index.tz) == "America/New_York"
+
+
+def test_download_frame_with_multiindex_columns_and_nan():
+    index = pd.date_range("2026-10-12", periods=3)
+    frame = pd.DataFrame({("Close", "USDJPY=X"): [150.0, np.nan, 151.0],
+                          ("Close", "USDEUR=X"): [0.92, 0.93, np.nan]}, index=index)
+
+    pd.testing.assert_frame_equal(_round_trip(frame), frame, check_freq=False, check_column_type=False)
+
+
+def test_series_and_plain_values():
+    dividends = pd.Series([0.4, 0.41], name="Dividends",
+                          index=pd.DatetimeIndex(["2026-03-20", "2026-06-20"]).tz_localize("America/New_York"))
+
+    pd.testing.assert_series_equal(_round_trip(dividends), dividends)
+    assert _round_trip({"currency": "USD", "yield": np.float64(0.031)}) == {"currency": "USD", "yield": 0.031}
+    assert _round_trip(None) is None
+
+
+@pytest.mark.parametrize("error, expected, message", [
+    (ValueError("bad value"), ValueError, "bad value"),
+    # 組み込み以外の例外は型を復元せず RuntimeError（元の型名はメッセージに残す）
+    (type("YFRateLimitError", (Exception,), {})("too many requests"), RuntimeError,
+     "YFRateLimitError: too many requests"),
+])
+def test_recorded_error_is_reraised(error, expected, message):
+    restored = fixtures._decode_error(json.loads(json.dumps(fixtures._encode_error(error))))
+
+    assert type(restored) is expected
+    assert str(restored) == message
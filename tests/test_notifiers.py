@@ -0,0 +1,180 @@
+"""
+通知先バックエンド（ローカルのスタブサーバーに対して送信・リトライを確認）
+"""
+
+import json
+import socketserver
+import sys
+import threading
+from email import message_from_bytes, policy
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from notifiers import build_delivery_queue  # noqa: E402
+
+EMBED = {
+    "title": "🚀 利回り閾値上抜け！ - VYM",
+    "description": "**現在利回り: 3.50%**",
+    "color": 0x00FF00,
+    "fields": [{"name": "💰 株価", "value": "**$95.00**", "inline": True}],
+    "footer": {"text": "ETF利回り監視Bot"},
+}
+DEFAULTS = {"timeout": 5, "retries": 2, "backoff": 0.0}
+
+
+class StubHttpServer(HTTPServer):
+    """受け取ったJSONを記録し、responses の順にステータスを返す（尽きたら 204）"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.requests = []
+        self.responses = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/hook"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append(json.loads(body))
+        status, headers = self.server.responses.pop(0) if self.server.responses else (204, {})
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSmtpServer(socketserver.ThreadingTCPServer):
+    """最小限のSMTPサーバー（受け取ったメッセージを記録）"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.messages = []
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 stub")
+            elif command == "DATA":
+                self._reply("354 end with .")
+                data = []
+                for raw in iter(self.rfile.readline, b""):
+                    if raw in (b".\r\n", b".\n"):
+                        break
+                    data.append(raw[1:] if raw.startswith(b"..") else raw)
+                self.server.messages.append(message_from_bytes(b"".join(data), policy=policy.default))
+                self._reply("250 queued")
+            elif command == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("250 ok")
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def http_stub():
+    server = _serve(StubHttpServer())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def smtp_stub():
+    server = _serve(StubSmtpServer())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _send(specs, monkeypatch, env):
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    queue = build_delivery_queue(specs, DEFAULTS)
+    queue.submit(EMBED)
+    result = queue.flush()
+    queue.close()
+    return result
+
+
+@pytest.mark.parametrize("kind", ["discord", "slack", "webhook"])
+def test_http_backends_post_converted_payload(kind, http_stub, monkeypatch):
+    sent, failed = _send([{"type": kind, "url_env": "STUB_URL"}], monkeypatch, {"STUB_URL": http_stub.url})
+
+    assert (sent, failed) == (1, 0)
+    [payload] = http_stub.requests
+    if kind == "discord":
+        assert payload["embeds"][0]["title"] == EMBED["title"]
+    elif kind == "slack":
+        attachment = payload["attachments"][0]
+        assert attachment["color"] == "#00FF00"
+        assert attachment["text"] == "*現在利回り: 3.50%*"
+    else:
+        assert payload["title"] == EMBED["title"]
+        assert payload["source"] == "ETF利回り監視Bot"
+
+
+def test_retries_on_429_and_5xx(http_stub, monkeypatch):
+    http_stub.responses = [(429, {"Retry-After": "0"}), (503, {})]
+    sent, failed = _send([{"type": "discord", "url_env": "STUB_URL"}], monkeypatch, {"STUB_URL": http_stub.url})
+
+    assert (sent, failed) == (1, 0)
+    assert len(http_stub.requests) == 3
+
+
+def test_gives_up_after_retries(http_stub, monkeypatch):
+    http_stub.responses = [(500, {})] * 3
+    sent, failed = _send([{"type": "discord", "url_env": "STUB_URL"}], monkeypatch, {"STUB_URL": http_stub.url})
+
+    assert (sent, failed) == (0, 1)
+    assert len(http_stub.requests) == DEFAULTS["retries"] + 1
+
+
+def test_client_error_is_not_retried(http_stub, monkeypatch):
+    http_stub.responses = [(404, {})]
+    sent, failed = _send([{"type": "discord", "url_env": "STUB_URL"}], monkeypatch, {"STUB_URL": http_stub.url})
+
+    assert (sent, failed) == (0, 1)
+    assert len(http_stub.requests) == 1
+
+
+def test_email_backend_sends_via_smtp(smtp_stub, monkeypatch):
+    spec = {"type": "email", "host_env": "STUB_SMTP_HOST", "port_env": "STUB_SMTP_PORT",
+            "from_env": "STUB_FROM", "to_env": "STUB_TO", "starttls": False}
+    env = {"STUB_SMTP_HOST": "127.0.0.1", "STUB_SMTP_PORT": str(smtp_stub.server_address[1]),
+           "STUB_FROM": "bot@example.com", "STUB_TO": "a@example.com, b@example.com"}
+    sent, failed = _send([spec], monkeypatch, env)
+
+    assert (sent, failed) == (1, 0)
+    [msg] = smtp_stub.messages
+    assert msg["Subject"] == EMBED["title"]
+    assert msg["To"] == "a@example.com, b@example.com"
+    assert "現在利回り: 3.50%" in msg.get_content()
@@ -0,0 +1,59 @@
+"""
+状態ファイルのシリアライザ（どの形式でも同じ状態が同じ内容で往復する）
+"""
+
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import state_store  # noqa: E402
+from ticker_state import StateTable, TickerState  # noqa: E402
+
+
+def _table():
+    table = StateTable()
+    table["VYM"] = TickerState(
+        status="above",
+        current_yield=np.float64(3.12),
+        price_usd=np.float32(95.5),
+        threshold=3.03,
+        last_year=np.int64(2026),
+        baseline_years=np.int64(19),
+        baseline_yield=np.float64(3.03),
+        last_trade_date=date(2026, 10, 16),
+        active_signals=["percentile"],
+    )
+    table["HDV"] = TickerState(current_yield=3.4, extra={"future_key": {"a": 1}})
+    table.portfolio = {"ranks": {"HDV": 1, "VYM": 2}}
+    return table
+
+
+def _expected():
+    """標準の型に揃えた内容（NumPyのスカラーは数値、日付はISO形式の文字列）"""
+    d = _table().to_dict()
+    d["VYM"].update(current_yield=3.12, price_usd=float(np.float32(95.5)), last_year=2026,
+                    baseline={"years": 19, "yield": 3.03}, last_trade_date="2026-10-16")
+    return d
+
+
+@pytest.mark.parametrize("fmt", list(state_store.SERIALIZERS))
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_round_trip(fmt, use_orjson, tmp_path, monkeypatch):
+    if fmt == "msgpack":
+        pytest.importorskip("msgpack")
+    if not use_orjson:
+        monkeypatch.setattr(state_store, "orjson", None)
+    elif state_store.orjson is None:
+        pytest.skip("orjson が未インストール")
+
+    path = tmp_path / f"state{state_store.SERIALIZERS[fmt][0]}"
+    state_store.write_state(_table(), path, fmt)
+    table = state_store.read_state(path, fmt)
+
+    assert table.to_dict() == _expected()
+    assert table["HDV"].extra == {"future_key": {"a": 1}}
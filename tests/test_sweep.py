@@ -0,0 +1,43 @@
+"""
+threshold_offset スイープの baseline（評価する年より後の年のデータを使わない）
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from sweep import yearly_baselines  # noqa: E402
+
+CONFIG = {"baseline_years": 3, "baseline_yield": 3.0, "baseline_year_end": 2017}
+YEARS = np.arange(2012, 2026)
+
+
+def _annual():
+    rng = np.random.default_rng(0)
+    return pd.Series(3 + rng.normal(0, 0.3, len(YEARS)), index=YEARS)
+
+
+@pytest.mark.parametrize("method", ["monitor", "expanding", "rolling5"])
+def test_baseline_ignores_current_and_later_years(method):
+    annual = _annual()
+    baseline, _ = yearly_baselines(annual, YEARS, method, CONFIG)
+    for i, year in enumerate(YEARS):
+        perturbed = annual.copy()
+        perturbed[perturbed.index >= year] += 10.0
+        changed, _ = yearly_baselines(perturbed, YEARS, method, CONFIG)
+        np.testing.assert_allclose(changed[i], baseline[i], equal_nan=True,
+                                   err_msg=f"{method}: {year}年のbaselineが{year}年以降のデータに依存")
+
+
+def test_monitor_skips_years_covered_by_config_baseline():
+    baseline, n = yearly_baselines(_annual(), YEARS, "monitor", CONFIG)
+    covered = YEARS <= CONFIG["baseline_year_end"]
+    assert np.isnan(baseline[covered]).all()
+    assert (n[covered] == 0).all()
+    # baseline_year_end の翌年は config の baseline そのまま
+    assert baseline[YEARS == CONFIG["baseline_year_end"] + 1][0] == pytest.approx(CONFIG["baseline_yield"])
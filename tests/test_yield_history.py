@@ -0,0 +1,42 @@
+"""
+履歴キャッシュの鮮度（CSVの更新日時ではなく全期間の取得日時で判定）
+"""
+
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import yield_history  # noqa: E402
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(yield_history, "CACHE_DIR", str(tmp_path))
+    (tmp_path / "VYM_daily.csv").write_text("Date,Close\n", encoding="utf-8")
+    return tmp_path
+
+
+def _write_meta(cache_dir, fetched_at):
+    (cache_dir / "VYM_daily.json").write_text(json.dumps({"fetched_at": fetched_at.isoformat()}), encoding="utf-8")
+
+
+def test_recent_full_fetch_is_fresh(cache_dir):
+    _write_meta(cache_dir, datetime.now(timezone.utc) - timedelta(hours=1))
+
+    assert yield_history._is_fresh("VYM")
+
+
+def test_appended_csv_with_old_full_fetch_is_stale(cache_dir):
+    # extend_history が直前にCSVを書き換えていても、全期間の取得が古ければ再取得する
+    _write_meta(cache_dir, datetime.now(timezone.utc) - timedelta(days=10))
+
+    assert not yield_history._is_fresh("VYM")
+
+
+def test_missing_meta_is_stale(cache_dir):
+    assert not yield_history._is_fresh("VYM")